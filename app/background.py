@@ -0,0 +1,53 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicTask:
+    """
+    Runs a coroutine function in the background every `interval` seconds.
+
+    A failing run is logged and retried on the next tick, so a temporarily unavailable database or Redis never
+    stops the loop.
+
+    Args:
+        name(str): Used in log messages.
+        interval(float): The number of seconds to wait between two runs.
+        func(Callable[[], Awaitable[None]]): The coroutine function to run.
+    """
+
+    def __init__(self, name: str, interval: float, func: Callable[[], Awaitable[None]]):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.func()
+            except Exception:  # pylint: disable=broad-except
+                logger.warning("Background task '%s' failed, retrying in %ss.", self.name, self.interval,
+                               exc_info=True)
+
+    def start(self) -> None:
+        """Starts the loop, if it is not running already."""
+        if not self.running:
+            self._task = asyncio.create_task(self._run(), name=self.name)
+
+    async def stop(self) -> None:
+        """Cancels the loop and waits for it to finish."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
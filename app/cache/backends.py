@@ -0,0 +1,188 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple, Union
+from fastapi_cache.backends import Backend
+from fastapi_cache.backends.redis import RedisBackend
+from redis.exceptions import RedisError
+from app.routers.config import LOCAL_CACHE_MAX_ENTRIES, LOCAL_CACHE_MAX_BYTES, LOCAL_CACHE_TTL, \
+    CACHE_INVALIDATION_CHANNEL
+
+logger = logging.getLogger(__name__)
+
+CacheValue = Union[str, bytes]
+
+
+@dataclass
+class LocalEntry:
+    value: CacheValue
+    # When the local copy is dropped, and when the value expires in Redis (None if it never does).
+    expires_at: float
+    ttl_deadline: Optional[float]
+    size: int
+
+
+class TwoTierBackend(Backend):
+    """
+    A fastapi-cache backend that keeps the hottest keys of a RedisBackend in worker memory.
+
+    Reads are answered from a bounded LRU first and only go to Redis on a local miss. A local copy never outlives
+    its Redis TTL nor `local_ttl` seconds. Writes and clears are published on a Redis channel, so every other
+    worker drops its local copy of the affected keys.
+
+    Args:
+        backend(RedisBackend): The shared backend the local layer sits in front of.
+        max_entries(int): The maximum number of keys held locally.
+        max_bytes(int): The maximum total size of the values held locally.
+        local_ttl(int): The maximum number of seconds a value is served from worker memory.
+        channel(str): The Redis pub/sub channel used for invalidation messages.
+    """
+
+    def __init__(self, backend: RedisBackend, max_entries: int = LOCAL_CACHE_MAX_ENTRIES,
+                 max_bytes: int = LOCAL_CACHE_MAX_BYTES, local_ttl: int = LOCAL_CACHE_TTL,
+                 channel: str = CACHE_INVALIDATION_CHANNEL):
+        self.backend = backend
+        self.redis = backend.redis
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.local_ttl = local_ttl
+        self.channel = channel
+        self._origin = uuid.uuid4().hex
+        self._entries: "OrderedDict[str, LocalEntry]" = OrderedDict()
+        self._bytes = 0
+        self._listener: Optional[asyncio.Task] = None
+
+    @property
+    def local_size(self) -> Tuple[int, int]:
+        """The number of entries and bytes currently held in worker memory."""
+        return len(self._entries), self._bytes
+
+    def _get_local(self, key: str) -> Optional[LocalEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._evict(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _set_local(self, key: str, value: CacheValue, ttl: Optional[int]) -> None:
+        self._evict(key)
+        size = len(value)
+        if size > self.max_bytes:
+            return
+
+        now = time.monotonic()
+        lifetime = self.local_ttl if not ttl or ttl < 0 else min(ttl, self.local_ttl)
+        ttl_deadline = now + ttl if ttl and ttl > 0 else None
+        self._entries[key] = LocalEntry(value, now + lifetime, ttl_deadline, size)
+        self._bytes += size
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._evict(oldest)
+
+    def _evict(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def _evict_namespace(self, namespace: str) -> None:
+        for key in [key for key in self._entries if key.startswith(namespace)]:
+            self._evict(key)
+
+    def clear_local(self) -> None:
+        """Drops every value held in worker memory."""
+        self._entries.clear()
+        self._bytes = 0
+
+    async def get_with_ttl(self, key: str) -> Tuple[int, Optional[CacheValue]]:
+        entry = self._get_local(key)
+        if entry is not None:
+            if entry.ttl_deadline is None:
+                return -1, entry.value
+            return max(int(entry.ttl_deadline - time.monotonic()), 0), entry.value
+
+        ttl, value = await self.backend.get_with_ttl(key)
+        if value is not None:
+            self._set_local(key, value, ttl)
+        return ttl, value
+
+    async def get(self, key: str) -> Optional[CacheValue]:
+        entry = self._get_local(key)
+        if entry is not None:
+            return entry.value
+
+        ttl, value = await self.backend.get_with_ttl(key)
+        if value is not None:
+            self._set_local(key, value, ttl)
+        return value
+
+    async def set(self, key: str, value: CacheValue, expire: Optional[int] = None) -> None:
+        await self.backend.set(key, value, expire)
+        self._set_local(key, value, expire)
+        await self._publish(key=key)
+
+    async def clear(self, namespace: Optional[str] = None, key: Optional[str] = None) -> int:
+        count = await self.backend.clear(namespace, key)
+        if namespace:
+            self._evict_namespace(namespace)
+        elif key:
+            self._evict(key)
+        await self._publish(namespace=namespace, key=key)
+        return count
+
+    async def _publish(self, namespace: Optional[str] = None, key: Optional[str] = None) -> None:
+        message = json.dumps({"origin": self._origin, "namespace": namespace, "key": key})
+        try:
+            await self.redis.publish(self.channel, message)
+        except RedisError:
+            logger.warning("Could not publish cache invalidation for %s.", key or namespace, exc_info=True)
+
+    def _handle_message(self, data: CacheValue) -> None:
+        try:
+            message = json.loads(data)
+        except ValueError:
+            return
+
+        if message.get("origin") == self._origin:
+            return
+        if message.get("namespace"):
+            self._evict_namespace(message["namespace"])
+        elif message.get("key"):
+            self._evict(message["key"])
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    # Messages may have been missed while unsubscribed, so start from an empty local layer.
+                    self.clear_local()
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self._handle_message(message["data"])
+            except (RedisError, OSError):
+                logger.warning("Cache invalidation listener lost its connection, retrying.", exc_info=True)
+                self.clear_local()
+                await asyncio.sleep(1)
+
+    def start(self) -> None:
+        """Starts listening for invalidation messages of the other workers."""
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen(), name="cache-invalidation-listener")
+
+    async def stop(self) -> None:
+        """Stops the invalidation listener."""
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
@@ -0,0 +1,27 @@
+from typing import Any, Union
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi_cache.coder import Coder
+from pydantic import BaseModel
+from starlette.responses import Response
+
+
+class ResponseCoder(Coder):
+    """
+    Stores the JSON body of an endpoint's response, so a cache hit is sent as it is.
+
+    Decoding returns the stored bytes untouched: hits skip JSON parsing, response model validation and encoding.
+    Values stored by fastapi-cache's JsonCoder are JSON documents as well, so they are served the same way.
+    """
+
+    @classmethod
+    def encode(cls, value: Any) -> bytes:
+        if isinstance(value, BaseModel):
+            return value.model_dump_json().encode()
+        if isinstance(value, Response):
+            return bytes(value.body)
+        return orjson.dumps(jsonable_encoder(value))
+
+    @classmethod
+    def decode(cls, value: Union[bytes, str]) -> bytes:
+        return value.encode() if isinstance(value, str) else value
@@ -0,0 +1,335 @@
+import asyncio
+import hashlib
+import inspect
+import logging
+import time
+import uuid
+from functools import wraps
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple, Type
+import orjson
+from fastapi import HTTPException
+from fastapi_cache import FastAPICache
+from fastapi_cache.coder import Coder
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.requests import Request
+from starlette.responses import Response
+from app.cache.coder import ResponseCoder
+from app.cache.keys import request_key_builder, surrogate_keys
+from app.metrics import cache_counters
+from app.timing import add_cache_time, add_render_time
+from app.routers.config import CACHE_LOCK_TIMEOUT, CACHE_STALE_WHILE_REVALIDATE, CACHE_NEGATIVE_TTL, \
+    HTTP_CACHE_MAX_AGE, HTTP_CACHE_STALE_WHILE_REVALIDATE
+
+logger = logging.getLogger(__name__)
+
+# Computations currently running in this worker, by cache key.
+_inflight: Dict[str, "asyncio.Task[Tuple[Any, Any]]"] = {}
+# Keeps a reference to stale-while-revalidate refreshes, so they are not garbage collected while running.
+_refreshes: Set[asyncio.Task] = set()
+
+# Starts the cached value of a 404, followed by its JSON encoded detail. Bodies are JSON documents, which never start
+# with it.
+NEGATIVE_MARKER = b"!404:"
+
+_RELEASE_LOCK = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+async def single_flight(key: str, compute: Callable[[], Awaitable[Tuple[Any, Any]]]) -> Tuple[Any, Any]:
+    """
+    Runs `compute` once for all concurrent callers asking for the same key within this worker.
+
+    The computation runs in its own task, so a caller that goes away does not cancel it for the others.
+
+    Args:
+        key(str): Identifies the computation, usually the cache key.
+        compute(Callable): Coroutine function producing the result.
+
+    Returns:
+        The result of the single computation, shared by every caller.
+    """
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(compute())
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    return await asyncio.shield(task)
+
+
+async def _acquire_lock(redis, key: str) -> Tuple[bool, Optional[str]]:
+    """Tries to take the cross-worker lock of a key, returns whether it was taken and the token to release it."""
+    token = uuid.uuid4().hex
+    try:
+        acquired = await redis.set(f"{key}:lock", token, nx=True, px=int(CACHE_LOCK_TIMEOUT * 1000))
+    except RedisError:
+        logger.warning("Could not take the cache lock of '%s', computing without it.", key, exc_info=True)
+        return True, None
+    return bool(acquired), token if acquired else None
+
+
+async def _release_lock(redis, key: str, token: str) -> None:
+    try:
+        await redis.eval(_RELEASE_LOCK, 1, f"{key}:lock", token)
+    except RedisError:
+        logger.warning("Could not release the cache lock of '%s'.", key, exc_info=True)
+
+
+async def _wait_for_value(backend, key: str) -> Optional[Any]:
+    """Polls the backend while another worker computes the value, for at most CACHE_LOCK_TIMEOUT seconds."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + CACHE_LOCK_TIMEOUT
+    while loop.time() < deadline:
+        await asyncio.sleep(0.05)
+        try:
+            value = await backend.get(key)
+        except Exception:  # pylint: disable=broad-except
+            return None
+        if value is not None:
+            return value
+    return None
+
+
+def _cached_404(value: Any, max_age: int) -> Optional[HTTPException]:
+    """Returns the 404 a cached value stands for, None if it is not a negative entry."""
+    if isinstance(value, str):
+        value = value.encode()
+    if not isinstance(value, bytes) or not value.startswith(NEGATIVE_MARKER):
+        return None
+    return HTTPException(status_code=404, detail=orjson.loads(value[len(NEGATIVE_MARKER):]),
+                         headers={"Cache-Control": f"max-age={max(max_age, 0)}"})
+
+
+async def _compute_and_store(backend, key: str, coder: Type[Coder], expire: Optional[int],
+                             call: Callable[[], Awaitable[Any]], negative_expire: int = 0) -> Tuple[Any, Any]:
+    """
+    Computes a missing value and stores it, letting a single worker at a time do so for a given key.
+
+    A worker that finds the key locked by another one waits for that worker's value instead of querying the
+    database as well. It only computes the value itself when the wait times out.
+
+    When the computation raises a 404 and `negative_expire` is set, the 404 is stored under the key for that many
+    seconds, so repeating the request does not compute it again.
+    """
+    redis = getattr(backend, "redis", None)
+    token = None
+
+    if redis is not None:
+        start = time.perf_counter()
+        acquired, token = await _acquire_lock(redis, key)
+        if not acquired:
+            cached = await _wait_for_value(backend, key)
+            if cached is not None:
+                add_cache_time(time.perf_counter() - start)
+                error = _cached_404(cached, negative_expire)
+                if error is not None:
+                    raise error
+                return coder.decode(cached), cached
+        add_cache_time(time.perf_counter() - start)
+
+    try:
+        try:
+            ret = await call()
+        except HTTPException as exc:
+            if exc.status_code == 404 and negative_expire:
+                start = time.perf_counter()
+                try:
+                    await backend.set(key, NEGATIVE_MARKER + orjson.dumps(exc.detail), negative_expire)
+                except Exception:  # pylint: disable=broad-except
+                    logger.warning("Error setting cache key '%s' in backend:", key, exc_info=True)
+                add_cache_time(time.perf_counter() - start)
+                exc.headers = {**(exc.headers or {}), "Cache-Control": f"max-age={negative_expire}"}
+            raise
+        start = time.perf_counter()
+        encoded = coder.encode(ret)
+        add_render_time(time.perf_counter() - start)
+        start = time.perf_counter()
+        try:
+            await backend.set(key, encoded, expire)
+        except Exception:  # pylint: disable=broad-except
+            logger.warning("Error setting cache key '%s' in backend:", key, exc_info=True)
+        add_cache_time(time.perf_counter() - start)
+        return ret, encoded
+    finally:
+        if token is not None:
+            start = time.perf_counter()
+            await _release_lock(redis, key, token)
+            add_cache_time(time.perf_counter() - start)
+
+
+def _etag(cache_key: str) -> str:
+    """
+    Returns the strong ETag of the responses cached under a key.
+
+    The key holds the version of the category and every parameter of the request, so the body only changes with
+    the key and the ETag can be checked without loading the body.
+    """
+    return f'"{hashlib.md5(cache_key.encode()).hexdigest()}"'  # nosec
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header matches an ETag, with the weak comparison RFC 9110 asks for."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+
+
+def _cache_control(max_age: int) -> str:
+    """The Cache-Control of a response still cached for `max_age` seconds, capped at HTTP_CACHE_MAX_AGE."""
+    cache_control = f"max-age={max(min(max_age, HTTP_CACHE_MAX_AGE), 0)}"
+    if HTTP_CACHE_STALE_WHILE_REVALIDATE:
+        cache_control += f", stale-while-revalidate={HTTP_CACHE_STALE_WHILE_REVALIDATE}"
+    return cache_control
+
+
+def _body_response(body: bytes, response: Optional[Response], max_age: int, http_headers: Dict[str, str]) -> Response:
+    """
+    Sends an encoded body as it is, with the headers set on the response injected into the endpoint and the HTTP
+    caching headers of the key.
+    """
+    headers = dict(response.headers) if response is not None else {}
+    headers.update(http_headers)
+    headers["Cache-Control"] = _cache_control(max_age)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+async def _call_with_own_sessions(func: Callable, args: tuple, kwargs: dict) -> Any:
+    """
+    Calls an endpoint outside of its request, replacing the request's database sessions by new ones.
+
+    The sessions injected into the request are closed once its response is sent, or its client disconnects, so a
+    background refresh or a computation shared by coalesced requests can not use them.
+    """
+    sessions = {name: AsyncSession(bind=value.bind, expire_on_commit=False)
+                for name, value in kwargs.items() if isinstance(value, AsyncSession)}
+    try:
+        return await func(*args, **{**kwargs, **sessions})
+    finally:
+        for session in sessions.values():
+            await session.close()
+
+
+def cache(expire: Optional[int] = None, coder: Optional[Type[Coder]] = None,
+          key_builder: Optional[Callable[..., Any]] = None, namespace: Optional[str] = "",
+          stale_while_revalidate: Optional[int] = None, negative_expire: Optional[int] = None) \
+        -> Callable[[Callable[..., Awaitable[Any]]], Callable[..., Awaitable[Any]]]:
+    """
+    Caches the result of an endpoint in the FastAPICache backend, like fastapi-cache's own decorator.
+
+    What is cached is the encoded JSON body. Hits and misses are both sent as that body, so the response model is
+    not validated and encoded again by FastAPI, and a hit never touches Pydantic.
+
+    Misses are coalesced: concurrent identical requests within a worker wait on one computation, and a Redis lock
+    does the same across workers, so an expiring popular key reaches the database once.
+
+    Responses carry a strong ETag derived from the cache key, a Cache-Control with stale-while-revalidate, and the
+    Surrogate-Key of their categories, so a CDN can serve and revalidate them. A request whose If-None-Match holds
+    the current ETag is answered with a 304 before the cache or the database is read.
+
+    Args:
+        expire(Optional[int]): The number of seconds a value stays fresh, defaults to the FastAPICache expire.
+        coder(Optional[Type[Coder]]): Encodes results into the response body, defaults to ResponseCoder.
+        key_builder(Optional[Callable]): Builds the cache key, defaults to request_key_builder.
+        namespace(Optional[str]): Namespace of the keys.
+        stale_while_revalidate(Optional[int]): The number of seconds an expired value is still served while a single
+            background task refreshes it, defaults to CACHE_STALE_WHILE_REVALIDATE. 0 disables it.
+        negative_expire(Optional[int]): The number of seconds a 404 raised by the endpoint is cached, under the key
+            of the request, defaults to CACHE_NEGATIVE_TTL. 0 disables it.
+    """
+
+    def wrapper(func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        signature = inspect.signature(func)
+        request_param = next((param for param in signature.parameters.values() if param.annotation is Request),
+                             None)
+        response_param = next((param for param in signature.parameters.values() if param.annotation is Response),
+                              None)
+
+        # The request and response are needed to build the key and set headers, so add them when missing.
+        parameters = [param for param in signature.parameters.values() if param.kind <= inspect.Parameter.KEYWORD_ONLY]
+        extra_params = [param for param in signature.parameters.values() if param.kind > inspect.Parameter.KEYWORD_ONLY]
+        if not request_param:
+            parameters.append(inspect.Parameter(name="request", annotation=Request,
+                                                kind=inspect.Parameter.KEYWORD_ONLY))
+        if not response_param:
+            parameters.append(inspect.Parameter(name="response", annotation=Response,
+                                                kind=inspect.Parameter.KEYWORD_ONLY))
+        func.__signature__ = signature.replace(parameters=parameters + extra_params)
+        hits, stale_hits, misses = cache_counters(func.__name__)
+
+        @wraps(func)
+        async def inner(*args, **kwargs):
+            copy_kwargs = kwargs.copy()
+            request: Optional[Request] = copy_kwargs.pop("request", None)
+            response: Optional[Response] = copy_kwargs.pop("response", None)
+
+            call_kwargs = kwargs.copy()
+            if not request_param:
+                call_kwargs.pop("request", None)
+            if not response_param:
+                call_kwargs.pop("response", None)
+
+            if not FastAPICache.get_enable() or (
+                    request and request.headers.get("Cache-Control") in ("no-store", "no-cache")):
+                return await func(*args, **call_kwargs)
+
+            value_coder = coder or ResponseCoder
+            fresh_for = expire or FastAPICache.get_expire()
+            stale_for = CACHE_STALE_WHILE_REVALIDATE if stale_while_revalidate is None else stale_while_revalidate
+            negative_for = CACHE_NEGATIVE_TTL if negative_expire is None else negative_expire
+            backend = FastAPICache.get_backend()
+
+            build_key = key_builder or request_key_builder
+            cache_key = build_key(func, namespace, request=request, response=response, args=args,
+                                  kwargs=copy_kwargs)
+            if inspect.isawaitable(cache_key):
+                cache_key = await cache_key
+
+            http_headers = {"ETag": _etag(cache_key), "Surrogate-Key": surrogate_keys(copy_kwargs.get("category"))}
+            if request is not None and _etag_matches(request.headers.get("If-None-Match"), http_headers["ETag"]):
+                return Response(status_code=304,
+                                headers={**http_headers, "Cache-Control": _cache_control(HTTP_CACHE_MAX_AGE)})
+
+            # With stale-while-revalidate the value is kept `stale_for` seconds longer than it is fresh.
+            stored_for = fresh_for + stale_for if fresh_for and stale_for else fresh_for
+
+            start = time.perf_counter()
+            try:
+                ttl, cached = await backend.get_with_ttl(cache_key)
+            except Exception:  # pylint: disable=broad-except
+                logger.warning("Error retrieving cache key '%s' from backend:", cache_key, exc_info=True)
+                ttl, cached = 0, None
+            add_cache_time(time.perf_counter() - start)
+
+            if cached is not None:
+                error = _cached_404(cached, ttl)
+                if error is not None:
+                    hits.inc()
+                    raise error
+                is_stale = stale_for and 0 <= ttl <= stale_for
+                (stale_hits if is_stale else hits).inc()
+                if is_stale and cache_key not in _inflight:
+                    refresh = asyncio.create_task(single_flight(cache_key, lambda: _compute_and_store(
+                        backend, cache_key, value_coder, stored_for,
+                        lambda: _call_with_own_sessions(func, args, call_kwargs), negative_for)))
+                    _refreshes.add(refresh)
+                    refresh.add_done_callback(_refreshes.discard)
+                    ttl = 0
+
+                return _body_response(value_coder.decode(cached), response, ttl - stale_for, http_headers)
+
+            misses.inc()
+            _, body = await single_flight(cache_key, lambda: _compute_and_store(
+                backend, cache_key, value_coder, stored_for,
+                lambda: _call_with_own_sessions(func, args, call_kwargs), negative_for))
+
+            return _body_response(value_coder.decode(body), response, fresh_for, http_headers)
+
+        return inner
+
+    return wrapper
@@ -0,0 +1,112 @@
+import random
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.sql.selectable import Select
+from app.background import PeriodicTask
+from app.database.connection import AsyncSessionLocal
+from app.models.greeting import Greeting
+from app.routers.greeting_types import GreetingType
+from app.routers.config import GREETING_POOL_MAX_SIZE, GREETING_POOL_REFRESH_SECONDS
+
+
+def pool_query(greeting_type: str, max_size: int) -> Select:
+    """Builds the query loading the newest `max_size` messages of a greeting type into the pool."""
+    return select(Greeting.greeting_id, Greeting.message) \
+        .filter(Greeting.type == greeting_type) \
+        .order_by(Greeting.greeting_id.desc()) \
+        .limit(max_size)
+
+
+class GreetingPool:
+    """
+    Keeps a process-local copy of greeting messages for every GreetingType.
+
+    The pool is filled once at startup and then rebuilt in the background every `refresh_interval` seconds, so
+    that a random greeting can be picked without a database round-trip. At most `max_size` messages are kept per
+    type, newest first.
+
+    Args:
+        max_size(int): The maximum number of messages held for a single greeting type.
+        refresh_interval(int): The number of seconds between two background refreshes.
+    """
+
+    def __init__(self, max_size: int = GREETING_POOL_MAX_SIZE,
+                 refresh_interval: int = GREETING_POOL_REFRESH_SECONDS):
+        self.max_size = max_size
+        self.refresh_interval = refresh_interval
+        self._messages: Dict[str, List[Tuple[int, str]]] = {}
+        self._loaded = False
+        self._refresher: Optional[PeriodicTask] = None
+
+    @property
+    def loaded(self) -> bool:
+        """True once the pool has been filled at least once and can be used instead of the database."""
+        return self._loaded
+
+    async def load(self, session_factory=AsyncSessionLocal) -> None:
+        """
+        Loads (or reloads) the messages of every greeting type from the database.
+
+        The new pool is built aside and swapped in at once, so readers never see a half filled pool.
+
+        Args:
+            session_factory: Factory used to open the database session, defaults to AsyncSessionLocal.
+        """
+        messages = {}
+
+        async with session_factory() as db:
+            for greeting_type in GreetingType:
+                result = await db.execute(pool_query(greeting_type.value, self.max_size))
+                messages[greeting_type.value] = [(greeting_id, message) for greeting_id, message in result.all()]
+
+        self._messages = messages
+        self._loaded = True
+
+    def choice(self, greeting_type: str) -> Optional[str]:
+        """
+        Picks a random message for the given greeting type.
+
+        Args:
+            greeting_type(str): The database value of the greeting type.
+
+        Returns:
+            Optional[str]: A random message, or None if the pool holds no messages for that type.
+        """
+        messages = self._messages.get(greeting_type)
+        if not messages:
+            return None
+        return random.choice(messages)[1]
+
+    def sample(self, greeting_type: str, count: int) -> List[str]:
+        """
+        Picks up to `count` distinct random messages for the given greeting type.
+
+        Args:
+            greeting_type(str): The database value of the greeting type.
+            count(int): The number of messages wanted, fewer are returned if the type has fewer messages.
+
+        Returns:
+            List[str]: The messages, in random order.
+        """
+        messages = self._messages.get(greeting_type, [])
+        return [message for _, message in random.sample(messages, min(count, len(messages)))]
+
+    def clear(self) -> None:
+        """Empties the pool, callers fall back to the database until it is loaded again."""
+        self._messages = {}
+        self._loaded = False
+
+    def start(self, session_factory=AsyncSessionLocal) -> None:
+        """Starts the background refresh task, if it is not running already."""
+        if self._refresher is None:
+            self._refresher = PeriodicTask("greeting-pool-refresh", self.refresh_interval,
+                                           lambda: self.load(session_factory))
+        self._refresher.start()
+
+    async def stop(self) -> None:
+        """Cancels the background refresh task."""
+        if self._refresher is not None:
+            await self._refresher.stop()
+
+
+greeting_pool = GreetingPool()
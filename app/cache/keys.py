@@ -0,0 +1,65 @@
+import hashlib
+from datetime import datetime
+from typing import Callable, Optional
+from fastapi_cache import FastAPICache
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.requests import Request
+from starlette.responses import Response
+from app.cache.versions import category_versions, GLOBAL_VERSION
+from app.routers.greeting_types import GreetingType
+
+
+def version_category(category: Optional[str]) -> str:
+    """Returns the version counter covering a request for the given category name, if any."""
+    greeting_type = GreetingType.__members__.get(category) if category else None
+    return greeting_type.value if greeting_type else GLOBAL_VERSION
+
+
+def surrogate_keys(category: Optional[str]) -> str:
+    """
+    Returns the Surrogate-Key header of a response for the given category name.
+
+    Every response gets the 'greetings' key, and the key of each greeting type it covers: the requested one, or all
+    of them when no category is given. A CDN purge of 'greetings:<name>' then drops every response a write to that
+    type changes.
+    """
+    names = [category] if category in GreetingType.__members__ else list(GreetingType.__members__)
+    return " ".join(["greetings"] + [f"greetings:{name}" for name in names])
+
+
+async def request_key_builder(func: Callable, namespace: Optional[str] = "", request: Optional[Request] = None,
+                              response: Optional[Response] = None, args: Optional[tuple] = None,
+                              kwargs: Optional[dict] = None) -> str:
+    """
+    Builds the cache key of an endpoint call from the endpoint, its query parameters and the category version.
+
+    Works like fastapi-cache's default key builder, but leaves out the injected database session, whose repr
+    differs for every request and would otherwise make every key unique. The version of the requested category,
+    or the global version when no category is given, is part of the key, so writing greetings replaces the keys
+    of the affected pages instead of deleting them.
+
+    Args:
+        func(Callable): The cached endpoint function.
+        namespace(Optional[str]): The namespace given to the cache decorator.
+        request(Optional[Request]): The incoming request.
+        response(Optional[Response]): The outgoing response.
+        args(Optional[tuple]): The positional arguments of the call.
+        kwargs(Optional[dict]): The keyword arguments of the call.
+
+    Returns:
+        str: The cache key.
+    """
+    arguments = sorted((name, value) for name, value in (kwargs or {}).items()
+                       if not isinstance(value, (AsyncSession, Request, Response)))
+    [version] = await category_versions.get([version_category((kwargs or {}).get("category"))])
+    digest = hashlib.md5(f"{func.__module__}:{func.__name__}:{args}:{arguments}".encode()).hexdigest()  # nosec
+    return f"{FastAPICache.get_prefix()}:{namespace}:v{version}:{digest}"
+
+
+async def monthly_key_builder(func: Callable, namespace: Optional[str] = "", request: Optional[Request] = None,
+                              response: Optional[Response] = None, args: Optional[tuple] = None,
+                              kwargs: Optional[dict] = None) -> str:
+    """Like request_key_builder, for endpoints whose result depends on the current month."""
+    month = datetime.now().strftime("%Y-%m")
+    return await request_key_builder(func, f"{namespace}:{month}", request=request, response=response, args=args,
+                                     kwargs=kwargs)
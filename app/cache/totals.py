@@ -0,0 +1,54 @@
+import hashlib
+import logging
+import time
+from typing import Awaitable, Callable, Optional
+from fastapi_cache import FastAPICache
+from app.cache.versions import category_versions, GLOBAL_VERSION
+from app.timing import add_cache_time
+
+logger = logging.getLogger(__name__)
+
+
+async def cached_total(name: str, greeting_type: Optional[str], compute: Callable[[], Awaitable[int]],
+                       expire: Optional[int] = None) -> int:
+    """
+    Returns the number of results of a paginated query from the cache, counting them on a miss.
+
+    The endpoints check the requested page against it before running the page query, so a page past the last one
+    costs a cache read. Like the page keys, the key holds the version of the category, so writing greetings to it
+    replaces the total instead of leaving a stale one.
+
+    Args:
+        name(str): Identifies the query and its parameters, pages of the same query share it.
+        greeting_type(Optional[str]): The database value of the counted greeting type, all types when None.
+        compute(Callable): Counts the results.
+        expire(Optional[int]): The number of seconds the total is kept, defaults to the FastAPICache expire.
+
+    Returns:
+        int: The number of results.
+    """
+    if not FastAPICache.get_enable():
+        return await compute()
+
+    backend = FastAPICache.get_backend()
+    start = time.perf_counter()
+    [version] = await category_versions.get([greeting_type or GLOBAL_VERSION])
+    digest = hashlib.md5(name.encode()).hexdigest()  # nosec
+    key = f"{FastAPICache.get_prefix()}:total:v{version}:{digest}"
+    try:
+        cached = await backend.get(key)
+    except Exception:  # pylint: disable=broad-except
+        logger.warning("Error retrieving cache key '%s' from backend:", key, exc_info=True)
+        cached = None
+    add_cache_time(time.perf_counter() - start)
+    if cached is not None:
+        return int(cached)
+
+    total = await compute()
+    start = time.perf_counter()
+    try:
+        await backend.set(key, str(total).encode(), expire or FastAPICache.get_expire())
+    except Exception:  # pylint: disable=broad-except
+        logger.warning("Error setting cache key '%s' in backend:", key, exc_info=True)
+    add_cache_time(time.perf_counter() - start)
+    return total
@@ -0,0 +1,146 @@
+import asyncio
+import json
+import logging
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+from redis.exceptions import RedisError
+from app.database.events import GreetingChanges, on_greetings_committed
+from app.routers.config import CACHE_VERSIONS_KEY, CACHE_VERSIONS_CHANNEL
+
+logger = logging.getLogger(__name__)
+
+# Version bumped on every change, it covers the endpoints that span all categories (/types, and the search and
+# recent endpoints without a category).
+GLOBAL_VERSION = "*"
+
+
+class CategoryVersions:
+    """
+    Version counters per greeting type, built into every cache key.
+
+    Writing greetings of a type bumps its counter (and the global one), so every cached page of that type gets a
+    new key at once, while the cached pages of other types stay valid. Entries under an old version are never
+    read again and simply expire.
+
+    The counters live in a Redis hash shared by every worker. Workers keep a local copy that a pub/sub listener
+    keeps up to date, so reading a version costs no round-trip once the listener is running. Without Redis the
+    counters are kept in the process only.
+
+    Args:
+        hash_key(str): The Redis hash holding the counters.
+        channel(str): The Redis pub/sub channel announcing new versions.
+    """
+
+    def __init__(self, hash_key: str = CACHE_VERSIONS_KEY, channel: str = CACHE_VERSIONS_CHANNEL):
+        self.hash_key = hash_key
+        self.channel = channel
+        self.redis = None
+        self._versions: Dict[str, int] = {}
+        self._synced = False
+        self._pending: Set[asyncio.Task] = set()
+        self._listener: Optional[asyncio.Task] = None
+
+    def init(self, redis) -> None:
+        """Shares the counters through the given Redis client."""
+        self.redis = redis
+        self._synced = False
+
+    def _update(self, versions: Dict[str, int]) -> None:
+        for category, version in versions.items():
+            if version > self._versions.get(category, 0):
+                self._versions[category] = version
+
+    async def get(self, categories: Sequence[str]) -> List[int]:
+        """
+        Returns the current version of each of the given categories.
+
+        Args:
+            categories(Sequence[str]): Database values of greeting types, or GLOBAL_VERSION.
+        """
+        # Bumps of this worker's own commits are applied first, so a worker always reads its own writes.
+        await self.flush()
+
+        if self.redis is not None and not self._synced:
+            try:
+                values = await self.redis.hmget(self.hash_key, list(categories))
+                self._update({category: int(value) for category, value in zip(categories, values) if value})
+            except RedisError:
+                logger.warning("Could not read the cache versions, using the local copy.", exc_info=True)
+
+        return [self._versions.get(category, 0) for category in categories]
+
+    async def bump(self, categories: Iterable[str]) -> None:
+        """Increments the versions of the given categories and the global version."""
+        categories = sorted(set(categories) | {GLOBAL_VERSION})
+
+        if self.redis is None:
+            self._update({category: self._versions.get(category, 0) + 1 for category in categories})
+            return
+
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                for category in categories:
+                    pipe.hincrby(self.hash_key, category, 1)
+                versions = dict(zip(categories, await pipe.execute()))
+            self._update(versions)
+            await self.redis.publish(self.channel, json.dumps(versions))
+        except RedisError:
+            logger.warning("Could not bump the cache versions of %s.", categories, exc_info=True)
+
+    def bump_later(self, categories: Iterable[str]) -> None:
+        """Schedules a bump from synchronous code, such as a SQLAlchemy event, that runs inside the event loop."""
+        categories = set(categories)
+        if self.redis is None:
+            self._update({category: self._versions.get(category, 0) + 1
+                          for category in categories | {GLOBAL_VERSION}})
+            return
+
+        task = asyncio.get_running_loop().create_task(self.bump(categories))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def flush(self) -> None:
+        """Waits for the bumps scheduled by bump_later."""
+        if self._pending:
+            await asyncio.gather(*list(self._pending), return_exceptions=True)
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    self._update({category.decode(): int(version)
+                                  for category, version in (await self.redis.hgetall(self.hash_key)).items()})
+                    self._synced = True
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self._update(json.loads(message["data"]))
+            except (RedisError, OSError, ValueError):
+                logger.warning("Cache version listener lost its connection, retrying.", exc_info=True)
+                self._synced = False
+                await asyncio.sleep(1)
+
+    def start(self) -> None:
+        """Starts following the versions bumped by the other workers, reading them from memory from then on."""
+        if self.redis is not None and (self._listener is None or self._listener.done()):
+            self._listener = asyncio.create_task(self._listen(), name="cache-version-listener")
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        self._synced = False
+
+
+category_versions = CategoryVersions()
+
+
+@on_greetings_committed
+def bump_category_versions(changes: GreetingChanges) -> None:
+    try:
+        category_versions.bump_later(changes.types)
+    except RuntimeError:
+        logger.warning("Greetings were committed outside of an event loop, cache versions were not bumped.")
@@ -0,0 +1,138 @@
+import asyncio
+import json
+import time
+from datetime import datetime
+from typing import AsyncIterator, Optional
+import click
+from decouple import config
+from redis import asyncio as aioredis
+from sqlalchemy.exc import SQLAlchemyError
+from app.cache.greeting_pool import pool_query
+from app.cache.versions import category_versions
+from app.database.connection import AsyncSessionLocal
+from app.database.explain import explain_query, full_scans
+from app.database.ingest import FORMATS, BulkIngester, IngestReport, parse_rows
+from app.routers.config import GREETING_POOL_MAX_SIZE, BULK_BATCH_SIZE, SEARCH_IDS_MAX
+from app.routers.greeting_routes import greetings_page_query, random_candidates_query, types_query, export_query, \
+    random_batch_candidates_query, recent_conditions, recent_page_query
+from app.search.backends import search_conditions, search_count_query, search_page_query, search_ids_query, \
+    greetings_by_id_query
+from app.routers.greeting_types import GreetingType
+from app.server import serve as serve_api
+
+
+@click.group()
+def cli() -> None:
+    """Maintenance commands of the greetings API, run with: python -m app.cli <command>"""
+
+
+def endpoint_queries(greeting_type: str, phrase: str, offset: int) -> dict:
+    """The queries run by each endpoint, with sample parameters."""
+    now = datetime.now()
+    return {
+        "list (GET /v1/greetings/)": greetings_page_query(greeting_type, 10, offset),
+        "list with cursor (GET /v1/greetings/?cursor=)": greetings_page_query(greeting_type, 10, after=[offset]),
+        "random, pool load": pool_query(greeting_type, GREETING_POOL_MAX_SIZE),
+        "random, database fallback": random_candidates_query(greeting_type),
+        "random batch, database fallback": random_batch_candidates_query([greeting_type,
+                                                                          GreetingType.Birthday_Dad.value]),
+        "types (GET /v1/greetings/types)": types_query(),
+        "export (GET /v1/greetings/export)": export_query(),
+        "export of a category": export_query(greeting_type),
+        "search ids (GET /v1/greetings/search)": search_ids_query(search_conditions(), phrase, SEARCH_IDS_MAX + 1),
+        "search ids in a category": search_ids_query(search_conditions(greeting_type), phrase, SEARCH_IDS_MAX + 1),
+        "search page by primary key": greetings_by_id_query(list(range(offset + 1, offset + 11))),
+        "search page past the cached ids": search_page_query(search_conditions(), phrase, 10, offset),
+        "search total past the cached ids": search_count_query(search_conditions(), phrase),
+        "recent (GET /v1/greetings/recent_greetings)": recent_page_query(recent_conditions(now), 10, offset),
+        "recent in a category": recent_page_query(recent_conditions(now, greeting_type), 10, offset),
+    }
+
+
+async def explain_endpoints(greeting_type: str, phrase: str, offset: int) -> list:
+    report = []
+    async with AsyncSessionLocal() as db:
+        for name, query in endpoint_queries(greeting_type, phrase, offset).items():
+            try:
+                plan = await explain_query(db, query)
+            except SQLAlchemyError as error:
+                await db.rollback()
+                report.append({"query": name, "error": str(error.orig if hasattr(error, "orig") else error)})
+                continue
+            report.append({"query": name, "plan": plan, "full_scans": full_scans(plan)})
+    return report
+
+
+@cli.command()
+@click.option("--category", default=GreetingType.Morning_Romantic.name, show_default=True,
+              type=click.Choice(list(GreetingType.__members__)), help="Category used in the sample queries.")
+@click.option("--query", "phrase", default="happy birthday", show_default=True, help="Sample search phrase.")
+@click.option("--offset", default=0, show_default=True, help="Sample offset, try a deep one.")
+@click.option("--as-json", is_flag=True, help="Print the report as JSON.")
+def explain(category: str, phrase: str, offset: int, as_json: bool) -> None:
+    """Reports the EXPLAIN plan of every endpoint query, flagging full table scans."""
+    report = asyncio.run(explain_endpoints(GreetingType[category].value, phrase, offset))
+
+    if as_json:
+        click.echo(json.dumps(report, indent=2, default=str))
+        return
+
+    for entry in report:
+        click.secho(entry["query"], bold=True)
+        if "error" in entry:
+            click.secho(f"  could not explain: {entry['error']}", fg="yellow")
+            continue
+        for row in entry["plan"]:
+            click.echo("  " + ", ".join(f"{key}={value}" for key, value in row.items() if value is not None))
+        if entry["full_scans"]:
+            click.secho(f"  full table scan of: {', '.join(entry['full_scans'])}", fg="red")
+        else:
+            click.secho("  uses indexes", fg="green")
+
+
+async def read_chunks(path: str, chunk_size: int = 1 << 20) -> AsyncIterator[bytes]:
+    with open(path, "rb") as file:
+        while chunk := file.read(chunk_size):
+            yield chunk
+
+
+async def ingest_file(path: str, data_format: str, batch_size: int) -> IngestReport:
+    # Bump the cache versions in Redis, so the API stops serving pages cached before the load.
+    async with aioredis.from_url(config('REDIS_URL')) as redis:
+        category_versions.init(redis)
+        async with AsyncSessionLocal() as db:
+            report = await BulkIngester(batch_size).ingest(db, parse_rows(read_chunks(path), data_format))
+        await category_versions.flush()
+    return report
+
+
+@cli.command()
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "data_format", type=click.Choice(FORMATS),
+              help="Format of the file, taken from its extension when omitted.")
+@click.option("--batch-size", default=BULK_BATCH_SIZE, show_default=True, help="Rows per INSERT and transaction.")
+def ingest(path: str, data_format: Optional[str], batch_size: int) -> None:
+    """Loads greetings from an NDJSON or CSV file, skipping the messages that are already stored."""
+    if data_format is None:
+        data_format = "csv" if path.lower().endswith(".csv") else "ndjson"
+
+    started = time.perf_counter()
+    report = asyncio.run(ingest_file(path, data_format, batch_size))
+    elapsed = time.perf_counter() - started
+
+    click.echo(f"{report.received} rows read in {elapsed:.1f}s: {report.inserted} inserted, "
+               f"{report.duplicates} duplicates, {report.rejected} rejected.")
+    for error in report.errors:
+        click.secho(f"  {error}", fg="yellow")
+
+
+@cli.command()
+@click.option("--host", default="127.0.0.1", show_default=True, help="Address to listen on.")
+@click.option("--port", default=8000, show_default=True, help="Port to listen on.")
+def serve(host: str, port: int) -> None:
+    """Serves the API, draining for SHUTDOWN_PRESTOP_SECONDS on SIGTERM before it stops accepting connections."""
+    serve_api(host, port)
+
+
+if __name__ == "__main__":
+    cli()
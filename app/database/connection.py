@@ -1,13 +1,41 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.orm import sessionmaker
 from decouple import config
+from app.metrics import TimedAsyncQueuePool, instrument_engine
+from app.routers.config import DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_RECYCLE, DB_POOL_PRE_PING, DB_POOL_TIMEOUT
 
 # Uses config to retrieve the database url from .env file
 DATABASE_URL = config('MAIN_DATABASE_URL')
 
+
+def create_engine(url: str) -> AsyncEngine:
+    """
+    Creates an engine with the connection pool sized and tuned by the DB_POOL_* settings.
+
+    Connections are recycled before the server drops them (MySQL's wait_timeout) and, with pre-ping, checked when
+    they are taken from the pool, so a restarted server or failed over replica does not surface as request errors.
+    SQLite engines do not use a sized pool, they only get the recycle and pre-ping options. Every statement is
+    counted and timed in the Prometheus metrics.
+
+    Args:
+        url(str): The database url.
+
+    Returns:
+        AsyncEngine: The engine.
+    """
+    options = {"pool_recycle": DB_POOL_RECYCLE, "pool_pre_ping": DB_POOL_PRE_PING}
+    if make_url(url).get_backend_name() != "sqlite":
+        options.update(poolclass=TimedAsyncQueuePool, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+                       pool_timeout=DB_POOL_TIMEOUT)
+    engine = create_async_engine(url, **options)
+    instrument_engine(engine)
+    return engine
+
+
 # Creates an engine to manage database connection to excute queries
-engine = create_async_engine(DATABASE_URL)
+engine = create_engine(DATABASE_URL)
 
 # Creates a factory for creating new databse sessions.
 AsyncSessionLocal = sessionmaker(
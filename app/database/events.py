@@ -0,0 +1,88 @@
+import logging
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Set, Tuple
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from app.models.greeting import Greeting
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class GreetingChanges:
+    """
+    The greetings written by a committed transaction.
+
+    Attributes:
+        types(Set[str]): Every greeting type whose greetings were added, changed or removed.
+        added(List[Tuple[int, Optional[str], Optional[str]]]): (greeting_id, type, message) of new or changed greetings.
+        removed(List[int]): greeting_id of removed or changed greetings.
+    """
+    types: Set[str] = field(default_factory=set)
+    added: List[Tuple[int, Optional[str], Optional[str]]] = field(default_factory=list)
+    removed: List[int] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.types or self.added or self.removed)
+
+
+_subscribers: List[Callable[[GreetingChanges], None]] = []
+
+
+def on_greetings_committed(callback: Callable[[GreetingChanges], None]) -> Callable[[GreetingChanges], None]:
+    """Registers a callback that is called with the GreetingChanges of every committed transaction."""
+    _subscribers.append(callback)
+    return callback
+
+
+def notify_greetings_committed(changes: GreetingChanges) -> None:
+    """
+    Passes committed changes on to every subscriber.
+
+    Called automatically for greetings written through the ORM, write paths using Core statements call it
+    themselves once their transaction is committed.
+    """
+    if not changes:
+        return
+    for callback in _subscribers:
+        try:
+            callback(changes)
+        except Exception:  # pylint: disable=broad-except
+            logger.warning("Greeting change subscriber %r failed.", callback, exc_info=True)
+
+
+@event.listens_for(Session, "after_flush")
+def collect_greeting_changes(session: Session, flush_context) -> None:
+    changes = session.info.setdefault("greeting_changes", GreetingChanges())
+
+    for greeting in session.new:
+        if isinstance(greeting, Greeting):
+            changes.types.add(greeting.type)
+            changes.added.append((greeting.greeting_id, greeting.type, greeting.message))
+
+    for greeting in session.deleted:
+        if isinstance(greeting, Greeting):
+            changes.types.add(greeting.type)
+            changes.removed.append(greeting.greeting_id)
+
+    for greeting in session.dirty:
+        if isinstance(greeting, Greeting) and session.is_modified(greeting):
+            type_history = inspect(greeting).attrs.type.history
+            changes.types.update(type_history.deleted)
+            changes.types.add(greeting.type)
+            changes.removed.append(greeting.greeting_id)
+            changes.added.append((greeting.greeting_id, greeting.type, greeting.message))
+
+    changes.types.discard(None)
+
+
+@event.listens_for(Session, "after_commit")
+def publish_greeting_changes(session: Session) -> None:
+    changes = session.info.pop("greeting_changes", None)
+    if changes:
+        notify_greetings_committed(changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_greeting_changes(session: Session) -> None:
+    session.info.pop("greeting_changes", None)
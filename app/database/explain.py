@@ -0,0 +1,58 @@
+from typing import Any, Dict, List
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+from sqlalchemy.sql.selectable import Select
+
+
+class Explain(Executable, ClauseElement):
+    """Wraps a statement into EXPLAIN (EXPLAIN QUERY PLAN on SQLite), keeping its bound parameters."""
+    inherit_cache = False
+
+    def __init__(self, statement: Select):
+        self.statement = statement
+
+
+@compiles(Explain)
+def compile_explain(element: Explain, compiler, **kw) -> str:
+    prefix = "EXPLAIN QUERY PLAN " if compiler.dialect.name == "sqlite" else "EXPLAIN "
+    sql = prefix + compiler.process(element.statement, **kw)
+    # The rows are the plan, not the columns of the statement, so they must not go through its result processors.
+    compiler._result_columns = []  # pylint: disable=protected-access
+    return sql
+
+
+async def explain_query(db: AsyncSession, query: Select) -> List[Dict[str, Any]]:
+    """
+    Runs EXPLAIN for a query.
+
+    Args:
+        db (AsyncSession): The database session.
+        query(Select): The query to explain, with its parameters bound.
+
+    Returns:
+        List[Dict[str, Any]]: The rows of the plan, as returned by the database.
+    """
+    result = await db.execute(Explain(query))
+    return [dict(row) for row in result.mappings().all()]
+
+
+def full_scans(plan: List[Dict[str, Any]]) -> List[str]:
+    """
+    Lists the tables a plan reads without the help of an index.
+
+    Args:
+        plan(List[Dict[str, Any]]): Rows returned by explain_query, from MySQL or SQLite.
+
+    Returns:
+        List[str]: The tables that are scanned in full.
+    """
+    scans = []
+    for row in plan:
+        # MySQL reports access type ALL, SQLite a SCAN step that does not mention an index.
+        if row.get("type") == "ALL":
+            scans.append(str(row.get("table")))
+        detail = str(row.get("detail", ""))
+        if detail.startswith("SCAN") and "INDEX" not in detail:
+            scans.append(detail.split()[1])
+    return scans
@@ -0,0 +1,337 @@
+import asyncio
+import codecs
+import csv
+import hashlib
+import json
+import math
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import AsyncIterable, AsyncIterator, Dict, Iterator, List, Optional, Tuple, Union
+from sqlalchemy import func, select, insert
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql.dml import Insert
+from app.database.events import GreetingChanges, notify_greetings_committed
+from app.database.stats import StatsDelta, apply_stats_delta
+from app.metrics import instrument_queries
+from app.models.greeting import Greeting
+from app.routers.config import BULK_BATCH_SIZE, BULK_BLOOM_CAPACITY, BULK_BLOOM_ERROR_RATE
+from app.routers.greeting_types import GreetingType
+
+FORMATS = ("ndjson", "csv")
+
+GREETING_TYPE_VALUES = {member.value for member in GreetingType}
+
+# Only the first rejected rows are described in the report, the others are only counted.
+MAX_REPORTED_ERRORS = 20
+
+# A parsed input row: its line number, and its fields or the reason it could not be parsed.
+ParsedRow = Tuple[int, Union[Dict[str, object], str]]
+
+
+def hash_message(message: str) -> str:
+    """Returns the message_hash of a message: the hex SHA-256 of its UTF-8 encoding, as MySQL's SHA2(message, 256)."""
+    return hashlib.sha256(message.encode("utf-8")).hexdigest()
+
+
+class BloomFilter:
+    """
+    Set of message hashes, answering "possibly present" or "not added", with false positives but no false negatives.
+
+    A fixed size bit array, sized for `capacity` hashes at the given false positive rate, so its memory stays
+    bounded however many rows are loaded (about 1.2 bytes per hash at 1%).
+
+    Args:
+        capacity(int): The number of hashes the filter is sized for.
+        error_rate(float): The false positive rate once `capacity` hashes are added.
+    """
+
+    def __init__(self, capacity: int = BULK_BLOOM_CAPACITY, error_rate: float = BULK_BLOOM_ERROR_RATE):
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, message_hash: str) -> Iterator[int]:
+        # The hash is already uniformly distributed, two slices of it drive the double hashing.
+        first = int(message_hash[:16], 16)
+        second = int(message_hash[16:32], 16) | 1
+        return ((first + i * second) % self.size for i in range(self.hash_count))
+
+    def add(self, message_hash: str) -> None:
+        for position in self._positions(message_hash):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, message_hash: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(message_hash))
+
+
+async def iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    """Splits a stream of UTF-8 encoded chunks into lines, without holding more than one line and chunk in memory."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer.rstrip("\r")
+
+
+async def parse_ndjson(lines: AsyncIterable[str]) -> AsyncIterator[ParsedRow]:
+    """Parses one JSON object per line, blank lines are skipped."""
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            fields = json.loads(line)
+        except ValueError:
+            yield line_number, "invalid JSON"
+            continue
+        yield line_number, fields if isinstance(fields, dict) else "expected a JSON object"
+
+
+async def parse_csv(lines: AsyncIterable[str]) -> AsyncIterator[ParsedRow]:
+    """Parses CSV with a header row, quoted fields may span several lines."""
+    header: Optional[List[str]] = None
+    record, record_line, line_number = None, 0, 0
+
+    async for line in lines:
+        line_number += 1
+        if record is None:
+            record, record_line = line, line_number
+        else:
+            record += "\n" + line
+
+        # An odd number of quotes means a quoted field continues on the next line.
+        if record.count('"') % 2:
+            continue
+
+        values, record = next(csv.reader([record]), []), None
+        if not values:
+            continue
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        if len(values) != len(header):
+            yield record_line, f"expected {len(header)} fields, got {len(values)}"
+            continue
+        yield record_line, dict(zip(header, values))
+
+    if record is not None:
+        yield record_line, "unterminated quoted field"
+
+
+def parse_rows(chunks: AsyncIterable[bytes], data_format: str) -> AsyncIterator[ParsedRow]:
+    """Parses a stream of NDJSON or CSV encoded greetings."""
+    if data_format not in FORMATS:
+        raise ValueError(f"Unknown format {data_format!r}, expected one of {', '.join(FORMATS)}.")
+    lines = iter_lines(chunks)
+    return parse_csv(lines) if data_format == "csv" else parse_ndjson(lines)
+
+
+def validate_row(fields: Dict[str, object]) -> Union[Dict[str, object], str]:
+    """
+    Turns the fields of an input row into the values of a greetings row.
+
+    Args:
+        fields(Dict[str, object]): 'message', 'type' (a GreetingType name or value) and optionally 'created_at'
+            (ISO 8601, defaults to now).
+
+    Returns:
+        Union[Dict[str, object], str]: The column values, or the reason the row is rejected.
+    """
+    message = fields.get("message")
+    if not isinstance(message, str) or not message.strip():
+        return "missing message"
+
+    greeting_type = fields.get("type")
+    if not isinstance(greeting_type, str):
+        return "missing type"
+    if greeting_type in GreetingType.__members__:
+        greeting_type = GreetingType[greeting_type].value
+    elif greeting_type not in GREETING_TYPE_VALUES:
+        return f"unknown type {greeting_type!r}"
+
+    created_at = fields.get("created_at") or datetime.now()
+    if isinstance(created_at, str):
+        try:
+            created_at = datetime.fromisoformat(created_at)
+        except ValueError:
+            return f"invalid created_at {created_at!r}"
+    if not isinstance(created_at, datetime):
+        return f"invalid created_at {created_at!r}"
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone().replace(tzinfo=None)
+
+    return {"message": message, "type": greeting_type, "created_at": created_at,
+            "message_hash": hash_message(message)}
+
+
+def insert_ignoring_duplicates(dialect_name: str, rows: List[Dict[str, object]]) -> Insert:
+    """
+    Builds a single multi-row INSERT of `rows` that skips the rows whose message_hash is already stored.
+
+    Duplicates that slipped past the lookup, e.g. loaded at the same time by another worker, are left to the unique
+    message_hash index: INSERT ... ON DUPLICATE KEY UPDATE on MySQL, ON CONFLICT DO NOTHING on SQLite.
+    """
+    if dialect_name == "mysql":
+        statement = mysql.insert(Greeting).values(rows)
+        return statement.on_duplicate_key_update(message_hash=statement.inserted.message_hash)
+    if dialect_name == "sqlite":
+        return sqlite.insert(Greeting).values(rows).on_conflict_do_nothing(index_elements=[Greeting.message_hash])
+    return insert(Greeting).values(rows)
+
+
+@dataclass
+class IngestReport:
+    """
+    Outcome of a bulk load.
+
+    Attributes:
+        received(int): The number of rows read from the input.
+        inserted(int): The number of new greetings.
+        duplicates(int): The number of rows skipped because their message is already stored, or repeated in the input.
+        rejected(int): The number of rows that could not be parsed or validated.
+        errors(List[str]): Why the first MAX_REPORTED_ERRORS rows were rejected.
+    """
+    received: int = 0
+    inserted: int = 0
+    duplicates: int = 0
+    rejected: int = 0
+    errors: List[str] = field(default_factory=list)
+
+    def reject(self, line_number: int, reason: str) -> None:
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"line {line_number}: {reason}")
+
+
+class BulkIngester:
+    """
+    Loads streams of greetings in batches, skipping the messages that are already stored.
+
+    Every batch is written by one multi-row INSERT and committed on its own, so memory use and lock times stay
+    bounded by `batch_size` whatever the size of the input. Message hashes are first checked against a Bloom
+    filter of the hashes this worker has seen, and only those possibly seen are looked up in the database, with one
+    IN query per batch. The filter only saves lookups: messages stored by other workers since it was filled are not
+    in it, and are left to the unique message_hash index. The filter is created and filled from the database on
+    first use, so workers that never ingest do not hold it.
+
+    Args:
+        batch_size(int): The number of rows per INSERT and transaction.
+        bloom_filter(Optional[BloomFilter]): Filter of known hashes, a new one sized by the settings by default.
+    """
+
+    def __init__(self, batch_size: int = BULK_BATCH_SIZE, bloom_filter: Optional[BloomFilter] = None):
+        self.batch_size = batch_size
+        self.bloom_filter = bloom_filter
+        self._bloom_loaded = False
+        self._lock = asyncio.Lock()
+
+    async def _load_bloom_filter(self, db: AsyncSession) -> None:
+        if self.bloom_filter is None:
+            self.bloom_filter = BloomFilter()
+        result = await db.stream(select(Greeting.message_hash)
+                                 .filter(Greeting.message_hash.isnot(None))
+                                 .execution_options(yield_per=10_000))
+        async for message_hash in result.scalars():
+            self.bloom_filter.add(message_hash)
+        await db.commit()
+        self._bloom_loaded = True
+
+    async def _write_batch(self, db: AsyncSession, batch: Dict[str, Dict[str, object]], report: IngestReport) -> None:
+        maybe_known = [message_hash for message_hash in batch if message_hash in self.bloom_filter]
+        changes = GreetingChanges()
+
+        try:
+            known = set()
+            if maybe_known:
+                result = await db.execute(select(Greeting.message_hash)
+                                          .filter(Greeting.message_hash.in_(maybe_known)))
+                known = set(result.scalars().all())
+
+            rows = [row for message_hash, row in batch.items() if message_hash not in known]
+            report.duplicates += len(known)
+
+            if rows:
+                connection = await db.connection()
+                last_id = (await db.execute(select(func.max(Greeting.greeting_id)))).scalar_one() or 0
+                await db.execute(insert_ignoring_duplicates(connection.dialect.name, rows))
+
+                # Read back the ids of the greetings this INSERT stored, for the stats and the change subscribers.
+                # Rows skipped by the unique index, because another worker stored the same message meanwhile, are
+                # left out: the other worker's greeting was either committed before this transaction's snapshot,
+                # and so got an id up to last_id, or is not visible to it.
+                result = await db.execute(select(Greeting.message_hash, Greeting.greeting_id)
+                                          .filter(Greeting.message_hash.in_([row["message_hash"] for row in rows]),
+                                                  Greeting.greeting_id > last_id))
+                ids = dict(result.all())
+
+                delta = StatsDelta()
+                for row in rows:
+                    if row["message_hash"] not in ids:
+                        continue
+                    delta.add(row["type"], row["created_at"])
+                    changes.types.add(row["type"])
+                    changes.added.append((ids[row["message_hash"]], row["type"], row["message"]))
+                await connection.run_sync(apply_stats_delta, delta)
+                report.inserted += len(ids)
+                report.duplicates += len(rows) - len(ids)
+
+            await db.commit()
+        except BaseException:
+            await db.rollback()
+            raise
+
+        for message_hash in batch:
+            self.bloom_filter.add(message_hash)
+        notify_greetings_committed(changes)
+
+    @instrument_queries
+    async def ingest(self, db: AsyncSession, rows: AsyncIterable[ParsedRow]) -> IngestReport:
+        """
+        Loads parsed rows into the greetings table.
+
+        Args:
+            db (AsyncSession): The database session, committed after every batch.
+            rows(AsyncIterable[ParsedRow]): The rows, as produced by parse_rows.
+
+        Returns:
+            IngestReport: What was loaded, skipped and rejected.
+        """
+        report = IngestReport()
+
+        async with self._lock:
+            if not self._bloom_loaded:
+                await self._load_bloom_filter(db)
+
+        batch: Dict[str, Dict[str, object]] = {}
+        async for line_number, fields in rows:
+            report.received += 1
+            row = validate_row(fields) if isinstance(fields, dict) else fields
+            if isinstance(row, str):
+                report.reject(line_number, row)
+                continue
+
+            if row["message_hash"] in batch:
+                report.duplicates += 1
+                continue
+            batch[row["message_hash"]] = row
+
+            if len(batch) >= self.batch_size:
+                await self._write_batch(db, batch, report)
+                batch = {}
+
+        if batch:
+            await self._write_batch(db, batch, report)
+
+        return report
+
+
+bulk_ingester = BulkIngester()
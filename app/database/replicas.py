@@ -0,0 +1,127 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import AsyncIterator, List, Optional
+from sqlalchemy import event, text
+from sqlalchemy.engine import ExceptionContext
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from app.background import PeriodicTask
+from app.database.connection import AsyncSessionLocal, create_engine
+from app.routers.config import READ_REPLICA_URLS, READ_REPLICA_CHECK_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class Replica:
+    """
+    A read replica: its engine, a session factory bound to it and whether it is currently considered up.
+
+    Args:
+        url(str): The database url of the replica.
+    """
+
+    def __init__(self, url: str):
+        self.engine: AsyncEngine = create_engine(url)
+        self.sessions = sessionmaker(bind=self.engine, expire_on_commit=False, class_=AsyncSession)
+        self.healthy = True
+
+    @property
+    def name(self) -> str:
+        """The url of the replica without its password, for log messages."""
+        return self.engine.url.render_as_string(hide_password=True)
+
+
+class ReplicaSet:
+    """
+    Spreads read-only sessions over the read replicas, round-robin, and sends them to the primary when there are no
+    replicas or none of them is up.
+
+    A replica is taken out of the rotation as soon as a query fails to reach it, and by the periodic health check,
+    which also puts it back once it answers again.
+
+    Args:
+        urls(List[str]): The database urls of the replicas, may be empty.
+        check_interval(float): The number of seconds between two health checks.
+        primary(sessionmaker): Session factory of the primary, used when no replica is available.
+    """
+
+    def __init__(self, urls: List[str], check_interval: float = READ_REPLICA_CHECK_SECONDS,
+                 primary: sessionmaker = AsyncSessionLocal):
+        self.replicas = [Replica(url) for url in urls]
+        for replica in self.replicas:
+            event.listen(replica.engine.sync_engine, "handle_error", partial(self._on_error, replica))
+        self.check_interval = check_interval
+        self.primary = primary
+        self._next = 0
+        self._checker: Optional[PeriodicTask] = None
+
+    def choose(self) -> Optional[Replica]:
+        """Returns the next healthy replica in the rotation, or None when reads should go to the primary."""
+        for _ in range(len(self.replicas)):
+            replica = self.replicas[self._next % len(self.replicas)]
+            self._next += 1
+            if replica.healthy:
+                return replica
+        return None
+
+    def mark_down(self, replica: Replica) -> None:
+        """Takes a replica out of the rotation until the health check finds it up again."""
+        if replica.healthy:
+            logger.warning("Read replica %s is down, taking it out of the rotation.", replica.name)
+        replica.healthy = False
+
+    def _on_error(self, replica: Replica, context: ExceptionContext) -> None:
+        """Takes a replica out of the rotation as soon as a query on it fails to connect or loses its connection."""
+        if context.is_disconnect or context.connection is None:
+            self.mark_down(replica)
+
+    @asynccontextmanager
+    async def session(self) -> AsyncIterator[AsyncSession]:
+        """
+        Opens a read-only session on the next healthy replica, or on the primary when none is available.
+
+        Yields:
+            AsyncSession: The session, closed on exit.
+        """
+        replica = self.choose()
+        if replica is None:
+            async with self.primary() as session:
+                yield session
+            return
+
+        async with replica.sessions() as session:
+            yield session
+
+    async def check(self) -> None:
+        """Runs `SELECT 1` on every replica, taking the failing ones out of the rotation and putting back the others."""
+        for replica in self.replicas:
+            try:
+                async with replica.engine.connect() as connection:
+                    await asyncio.wait_for(connection.execute(text("SELECT 1")), timeout=self.check_interval)
+            except (OSError, asyncio.TimeoutError, DBAPIError):
+                self.mark_down(replica)
+            else:
+                if not replica.healthy:
+                    logger.info("Read replica %s is up again.", replica.name)
+                replica.healthy = True
+
+    def start(self) -> None:
+        """Starts the periodic health check, if there are replicas to check."""
+        if not self.replicas:
+            return
+        if self._checker is None:
+            self._checker = PeriodicTask("read-replica-check", self.check_interval, self.check)
+        self._checker.start()
+
+    async def stop(self) -> None:
+        """Cancels the health check and closes the connections of every replica."""
+        if self._checker is not None:
+            await self._checker.stop()
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+
+read_replicas = ReplicaSet(READ_REPLICA_URLS)
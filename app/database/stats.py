@@ -0,0 +1,320 @@
+import logging
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Any
+from redis.exceptions import RedisError
+from sqlalchemy import select, update, case, or_, func, extract, event, inspect, tuple_
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import History
+from app.background import PeriodicTask
+from app.cache.versions import category_versions
+from app.database.connection import AsyncSessionLocal
+from app.metrics import instrument_queries
+from app.models.greeting import Greeting
+from app.models.greeting_stats import GreetingStats, ALL_TIME
+from app.routers.config import STATS_RECONCILE_SECONDS, STATS_RECONCILE_LOCK_KEY
+
+logger = logging.getLogger(__name__)
+
+
+def as_datetime(created_at: Any) -> Optional[datetime]:
+    """Returns created_at as a datetime, also accepting the ISO formatted strings the column can be assigned."""
+    if isinstance(created_at, str):
+        return datetime.fromisoformat(created_at)
+    return created_at
+
+
+def month_key(created_at: datetime) -> str:
+    """Returns the value of the greeting_stats 'month' column for the given date, e.g. '2023-11'."""
+    return f"{created_at.year:04d}-{created_at.month:02d}"
+
+
+class StatsDelta:
+    """
+    Collects the changes to greeting_stats caused by a batch of inserted or deleted greetings.
+
+    Every greeting counts towards the all-time row of its type and, when it has a created_at, towards the row of
+    its month.
+    """
+
+    def __init__(self):
+        self.totals: Dict[Tuple[str, str], int] = defaultdict(int)
+        self.newest: Dict[Tuple[str, str], datetime] = {}
+
+    def add(self, greeting_type: Optional[str], created_at: Any, count: int = 1) -> None:
+        """
+        Records `count` greetings (negative for deletes) of the given type and creation date.
+
+        Args:
+            greeting_type(Optional[str]): The database value of the greeting type, greetings without one are ignored.
+            created_at(Any): The creation date of the greetings, if any.
+            count(int): The number of greetings added, or removed when negative.
+        """
+        if greeting_type is None:
+            return
+
+        created_at = as_datetime(created_at)
+        keys = [(greeting_type, ALL_TIME)]
+        if created_at is not None:
+            keys.append((greeting_type, month_key(created_at)))
+
+        for key in keys:
+            self.totals[key] += count
+            if count > 0 and created_at is not None and (key not in self.newest or self.newest[key] < created_at):
+                self.newest[key] = created_at
+
+    def __bool__(self) -> bool:
+        return any(self.totals.values()) or bool(self.newest)
+
+
+def upsert_greeting_stats(dialect_name: str, update: Callable[[Any], Dict[str, Any]]) -> Any:
+    """
+    Builds an INSERT into greeting_stats that updates the row of the same type and month when there is one.
+
+    A single statement, so two transactions creating the same row at once can not fail on its primary key: INSERT ...
+    ON DUPLICATE KEY UPDATE on MySQL, ON CONFLICT DO UPDATE on SQLite.
+
+    Args:
+        dialect_name(str): The name of the database dialect.
+        update(Callable): Returns the values set on an existing row, given the proposed row (MySQL's `inserted`,
+            SQLite's `excluded`).
+
+    Raises:
+        NotImplementedError: on databases without an upsert.
+    """
+    if dialect_name == "mysql":
+        statement = mysql.insert(GreetingStats)
+        return statement.on_duplicate_key_update(**update(statement.inserted))
+    if dialect_name == "sqlite":
+        statement = sqlite.insert(GreetingStats)
+        return statement.on_conflict_do_update(index_elements=[GreetingStats.type, GreetingStats.month],
+                                               set_=update(statement.excluded))
+    raise NotImplementedError(f"greeting_stats can not be upserted on {dialect_name}.")
+
+
+def apply_stats_delta(connection: Connection, delta: StatsDelta) -> None:
+    """
+    Writes a StatsDelta to the greeting_stats table, within the transaction of the given connection.
+
+    Args:
+        connection(Connection): A synchronous connection, use AsyncConnection.run_sync from async code.
+        delta(StatsDelta): The changes to apply.
+    """
+    for (greeting_type, month), count in delta.totals.items():
+        newest = delta.newest.get((greeting_type, month))
+        if not count and newest is None:
+            continue
+
+        values = {"total": GreetingStats.total + count}
+        if newest is not None:
+            values["newest_created_at"] = case(
+                (or_(GreetingStats.newest_created_at.is_(None), GreetingStats.newest_created_at < newest), newest),
+                else_=GreetingStats.newest_created_at)
+
+        statement = upsert_greeting_stats(connection.dialect.name, lambda _: values)
+        connection.execute(statement.values(type=greeting_type, month=month, total=max(count, 0),
+                                            newest_created_at=newest))
+
+
+# Session.info key of the stored type and created_at of updated greetings, read by read_replaced_greeting_values.
+_STORED_VALUES = "greeting_stats_stored_values"
+
+
+def _moved_greetings(session: Session) -> Iterator[Tuple[Greeting, History, History]]:
+    """Yields the dirty greetings of a session whose type or created_at changed, with the history of both."""
+    for greeting in session.dirty:
+        if not isinstance(greeting, Greeting):
+            continue
+        state = inspect(greeting)
+        type_history = state.attrs.type.history
+        created_at_history = state.attrs.created_at.history
+        if type_history.has_changes() or created_at_history.has_changes():
+            yield greeting, type_history, created_at_history
+
+
+@event.listens_for(Session, "before_flush")
+def read_replaced_greeting_values(session: Session, flush_context, instances) -> None:
+    """
+    Reads the stored type and created_at of the updated greetings whose replaced value was never loaded.
+
+    The history of an attribute assigned before it was loaded holds no previous value, and once flushed the row
+    holds the new one, so track_greeting_stats could not take the greeting off the counts it was in.
+    """
+    session.info.pop(_STORED_VALUES, None)
+    ids = [greeting.greeting_id for greeting, type_history, created_at_history in _moved_greetings(session)
+           if (type_history.has_changes() and not type_history.deleted)
+           or (created_at_history.has_changes() and not created_at_history.deleted)]
+    if ids:
+        result = session.connection().execute(select(Greeting.greeting_id, Greeting.type, Greeting.created_at)
+                                              .filter(Greeting.greeting_id.in_(ids)))
+        session.info[_STORED_VALUES] = {greeting_id: (type_, created_at) for greeting_id, type_, created_at in result}
+
+
+@event.listens_for(Session, "after_flush")
+def track_greeting_stats(session: Session, flush_context) -> None:
+    """Keeps greeting_stats in step with greetings inserted, updated or deleted through the ORM."""
+    delta = StatsDelta()
+    stored = session.info.pop(_STORED_VALUES, {})
+
+    for greeting in session.new:
+        if isinstance(greeting, Greeting):
+            delta.add(greeting.type, greeting.created_at)
+
+    for greeting in session.deleted:
+        if isinstance(greeting, Greeting):
+            delta.add(greeting.type, greeting.created_at, -1)
+
+    for greeting, type_history, created_at_history in _moved_greetings(session):
+        stored_type, stored_created_at = stored.get(greeting.greeting_id, (greeting.type, greeting.created_at))
+        old_type = type_history.deleted[0] if type_history.deleted else stored_type
+        old_created_at = created_at_history.deleted[0] if created_at_history.deleted else stored_created_at
+        delta.add(old_type, old_created_at, -1)
+        delta.add(greeting.type, greeting.created_at)
+
+    if delta:
+        apply_stats_delta(session.connection(), delta)
+
+
+@instrument_queries
+async def get_greeting_total(db: AsyncSession, greeting_type: Optional[str] = None, month: str = ALL_TIME) -> int:
+    """
+    Reads the number of greetings from the greeting_stats table.
+
+    Args:
+        db (AsyncSession): The database session.
+        greeting_type(Optional[str]): The greeting type to count, all types when None.
+        month(str): The month to count ("YYYY-MM"), defaults to all time.
+
+    Returns:
+        int: The number of greetings.
+    """
+    query = select(func.coalesce(func.sum(GreetingStats.total), 0)).filter(GreetingStats.month == month)
+
+    if greeting_type:
+        query = query.filter(GreetingStats.type == greeting_type)
+
+    result = await db.execute(query)
+    return int(result.scalar_one())
+
+
+@instrument_queries
+async def fetch_greeting_stats(db: AsyncSession) -> List[GreetingStats]:
+    """Returns every greeting_stats row, ordered by type and month."""
+    result = await db.execute(select(GreetingStats).order_by(GreetingStats.type, GreetingStats.month))
+    return list(result.scalars().all())
+
+
+async def reconcile_greeting_stats(db: AsyncSession) -> None:
+    """
+    Rebuilds the greeting_stats table from the greetings table.
+
+    Catches up with greetings written outside the application and repairs any drift of the maintained counts.
+    Every count is written by an upsert and rows whose greetings are all gone are set to 0, in the transaction
+    that computed the counts, so the table is never emptied while it is rebuilt.
+
+    The rows of greeting_stats are locked before the greetings are counted. Writers apply their deltas in the
+    transaction storing their greetings, so a delta is either committed before the counts are read, and part of
+    them, or waits for the rebuild to commit, and is applied to the new counts. None is overwritten.
+
+    The cache versions of the types whose totals changed are bumped once the rebuild is committed, so the cached
+    totals and ETags derived from them are replaced.
+
+    Args:
+        db (AsyncSession): The database session, the rebuild is committed in a single transaction.
+    """
+    year = extract('year', Greeting.created_at)
+    month = extract('month', Greeting.created_at)
+
+    stored = await db.execute(select(GreetingStats.type, GreetingStats.month, GreetingStats.total).with_for_update())
+    stored_totals = {(greeting_type, month_): total for greeting_type, month_, total in stored.all()}
+    totals = await db.execute(select(Greeting.type, func.count(), func.max(Greeting.created_at))
+                              .filter(Greeting.type.isnot(None))
+                              .group_by(Greeting.type))
+    monthly = await db.execute(select(Greeting.type, year, month, func.count(), func.max(Greeting.created_at))
+                               .filter(Greeting.type.isnot(None), Greeting.created_at.isnot(None))
+                               .group_by(Greeting.type, year, month))
+
+    rows = [{"type": greeting_type, "month": ALL_TIME, "total": total, "newest_created_at": newest}
+            for greeting_type, total, newest in totals.all()]
+    rows += [{"type": greeting_type, "month": f"{int(year_):04d}-{int(month_):02d}", "total": total,
+              "newest_created_at": newest}
+             for greeting_type, year_, month_, total, newest in monthly.all()]
+
+    connection = await db.connection()
+    if rows:
+        statement = upsert_greeting_stats(connection.dialect.name, lambda proposed: {
+            "total": proposed.total, "newest_created_at": proposed.newest_created_at})
+        await db.execute(statement, rows)
+
+    counted = {(row["type"], row["month"]): row["total"] for row in rows}
+    await db.execute(update(GreetingStats)
+                     .where(GreetingStats.total != 0,
+                            tuple_(GreetingStats.type, GreetingStats.month).notin_(list(counted)))
+                     .values(total=0))
+    await db.commit()
+
+    changed = {greeting_type for (greeting_type, month_), total in counted.items()
+               if stored_totals.get((greeting_type, month_)) != total}
+    changed |= {greeting_type for (greeting_type, month_), total in stored_totals.items()
+                if total and (greeting_type, month_) not in counted}
+    if changed:
+        category_versions.bump_later(changed)
+
+
+async def prepare_greeting_stats(session_factory=AsyncSessionLocal) -> None:
+    """Fills the greeting_stats table when it is still empty, the table itself is created by the migrations."""
+    async with session_factory() as db:
+        result = await db.execute(select(func.count()).select_from(GreetingStats))
+        if result.scalar_one() == 0:
+            await reconcile_greeting_stats(db)
+
+
+async def reconcile(session_factory=AsyncSessionLocal) -> None:
+    async with session_factory() as db:
+        await reconcile_greeting_stats(db)
+
+
+class StatsReconciler(PeriodicTask):
+    """
+    Rebuilds greeting_stats every `interval` seconds, in a single worker of the deployment at a time.
+
+    Before a run, a worker takes a Redis lock that it leaves to expire shortly before its next run, so the workers
+    that tick during that time skip theirs and the rebuild runs about once per interval, whatever the number of
+    workers. Without Redis the worker runs the rebuild on its own, which the upserts keep safe.
+
+    Args:
+        interval(float): The number of seconds between two runs.
+        lock_key(str): The Redis key of the lock.
+    """
+
+    def __init__(self, interval: float = STATS_RECONCILE_SECONDS, lock_key: str = STATS_RECONCILE_LOCK_KEY):
+        super().__init__("greeting-stats-reconcile", interval, self.run_once)
+        self.lock_key = lock_key
+        self.redis = None
+
+    def init(self, redis) -> None:
+        """Sets the Redis client holding the lock."""
+        self.redis = redis
+
+    async def run_once(self, session_factory=AsyncSessionLocal) -> bool:
+        """Rebuilds greeting_stats unless another worker did within the interval, returns whether it did."""
+        if self.redis is not None:
+            try:
+                acquired = await self.redis.set(self.lock_key, uuid.uuid4().hex, nx=True,
+                                                px=max(int(self.interval * 900), 1))
+            except RedisError:
+                logger.warning("Could not take the greeting_stats reconcile lock, reconciling without it.",
+                               exc_info=True)
+                acquired = True
+            if not acquired:
+                return False
+
+        await reconcile(session_factory)
+        return True
+
+
+stats_reconciler = StatsReconciler()
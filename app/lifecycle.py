@@ -0,0 +1,145 @@
+import asyncio
+import logging
+from typing import Optional
+import httpx
+from fastapi.responses import ORJSONResponse
+from redis.exceptions import RedisError
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import QueuePool
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp
+from app.database.connection import engine
+from app.routers.config import READINESS_TIMEOUT, limiter
+from app.routers.greeting_types import GreetingType
+
+logger = logging.getLogger(__name__)
+
+
+class Lifecycle:
+    """
+    Whether the worker is ready to serve.
+
+    A worker is ready once its startup warm-up is over, until it starts draining when the shutdown signal arrives
+    (see app.server). It keeps serving while draining, so load balancers take it out of rotation on its 503s before it
+    stops accepting connections.
+
+    Attributes:
+        ready(bool): The warm-up is over and the worker is not draining.
+        draining(bool): The worker is shutting down.
+        redis: The Redis client of the cache, checked by /healthz/ready.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self.draining = False
+        self.redis = None
+
+    def start_draining(self) -> None:
+        """Stops reporting the worker as ready, /healthz/ready answers 503 "draining" from now on."""
+        self.ready = False
+        self.draining = True
+
+
+lifecycle = Lifecycle()
+
+
+async def warm_pool(pool_engine: AsyncEngine, connections: int) -> int:
+    """
+    Opens connections of an engine at once and returns them to its pool, so the first requests find them open.
+
+    Only pools keeping connections open are warmed, and with no more connections than they keep.
+
+    Args:
+        pool_engine(AsyncEngine): The engine to warm.
+        connections(int): The number of connections to open.
+
+    Returns:
+        int: The number of connections opened.
+
+    Raises:
+        OSError, SQLAlchemyError: if a connection could not be opened, the others are returned to the pool.
+    """
+    if not isinstance(pool_engine.pool, QueuePool):
+        return 0
+    connections = min(connections, pool_engine.pool.size())
+    if connections <= 0:
+        return 0
+
+    opened = await asyncio.gather(*(pool_engine.connect().start() for _ in range(connections)),
+                                  return_exceptions=True)
+    await asyncio.gather(*(connection.close() for connection in opened if not isinstance(connection, BaseException)))
+    for result in opened:
+        if isinstance(result, BaseException):
+            raise result
+    return connections
+
+
+async def ping_redis(redis) -> bool:
+    """Returns whether Redis answers a PING within READINESS_TIMEOUT seconds."""
+    try:
+        return bool(await asyncio.wait_for(redis.ping(), READINESS_TIMEOUT))
+    except (OSError, RedisError, asyncio.TimeoutError):
+        return False
+
+
+async def ping_database() -> bool:
+    """Returns whether the primary database answers `SELECT 1` within READINESS_TIMEOUT seconds."""
+    async def select_one() -> None:
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+    try:
+        await asyncio.wait_for(select_one(), READINESS_TIMEOUT)
+    except (OSError, SQLAlchemyError, asyncio.TimeoutError):
+        return False
+    return True
+
+
+async def prime_cache(app: ASGIApp) -> int:
+    """
+    Requests /types and the first page of every greeting type through the app, so they are cached before the first
+    client asks for them.
+
+    The requests go through the routes, the same cache keys and encoded bodies as client requests are stored. The
+    rate limiter is disabled meanwhile, the app does not serve clients yet.
+
+    Args:
+        app(ASGIApp): The app to send the requests to.
+
+    Returns:
+        int: The number of pages cached.
+    """
+    paths = ["/v1/greetings/types"] + [f"/v1/greetings/?category={name}" for name in GreetingType.__members__]
+
+    enabled = limiter.enabled
+    limiter.enabled = False
+    primed = 0
+    try:
+        async with httpx.AsyncClient(app=app, base_url="http://warmup") as client:
+            for path in paths:
+                response = await client.get(path)
+                primed += response.status_code == 200
+    finally:
+        limiter.enabled = enabled
+    return primed
+
+
+async def readiness(request: Request) -> Response:
+    """
+    Answers 200 while the worker is warmed up, not draining and its database answers, 503 otherwise.
+
+    Redis is reported but does not fail the check, without it the app serves from its local cache and rate limits.
+    """
+    if not lifecycle.ready:
+        status = "draining" if lifecycle.draining else "starting"
+        return ORJSONResponse({"status": status}, status_code=503)
+
+    database = await ping_database()
+    redis: Optional[bool] = None if lifecycle.redis is None else await ping_redis(lifecycle.redis)
+    checks = {"database": "ok" if database else "failed",
+              "redis": "not configured" if redis is None else "ok" if redis else "failed"}
+    return ORJSONResponse({"status": "ready" if database else "unavailable", "checks": checks},
+                          status_code=200 if database else 503)
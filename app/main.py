@@ -1,26 +1,53 @@
 import os
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse
 from slowapi.errors import RateLimitExceeded
 from slowapi.middleware import SlowAPIMiddleware
 from fastapi_cache import FastAPICache
 from fastapi_cache.backends.redis import RedisBackend
 from fastapi.staticfiles import StaticFiles
 from redis import asyncio as aioredis
+from sqlalchemy.exc import SQLAlchemyError
 from decouple import config
+from httpx import HTTPError
 from app.routers import greeting_routes, greetings_home
-from app.routers.config import limiter
+from app.routers.config import limiter, WARMUP_DB_CONNECTIONS, WARMUP_CACHE
 from app.exceptions.custom_exceptions import custom_http_exception_handler, ratelimit_exception
 from fastapi import Response
 from fastapi.openapi.docs import get_swagger_ui_html
+from app.cache.backends import TwoTierBackend
+from app.cache.greeting_pool import greeting_pool
+from app.search.backends import get_search_backend
+from app.search.suggest import suggestions
+from app.cache.coder import ResponseCoder
+from app.cache.keys import request_key_builder
+from app.cache.versions import category_versions
+from app.database.stats import prepare_greeting_stats, stats_reconciler
+from app.database.connection import engine
+from app.database.replicas import read_replicas
+from app.lifecycle import lifecycle, ping_redis, prime_cache, readiness, warm_pool
+from app.metrics import MetricsMiddleware, metrics
+from app.timing import ServerTimingMiddleware
+
+logger = logging.getLogger(__name__)
 
 
 def configure_routes(app: FastAPI) -> None:
     app.include_router(greeting_routes.router, prefix="/v1/greetings")
     app.include_router(greetings_home.routers)
+    app.add_route("/metrics", limiter.exempt(metrics), include_in_schema=False)
+    app.add_route("/healthz/ready", limiter.exempt(readiness), include_in_schema=False)
 
 
 def configure_middleware(app: FastAPI) -> None:
     app.add_middleware(SlowAPIMiddleware)
+    app.add_middleware(ServerTimingMiddleware)
+    # Added last so it is the outermost middleware and times the rate limiter as well.
+    app.add_middleware(MetricsMiddleware)
 
 
 def configure_mounts(app: FastAPI) -> None:
@@ -34,19 +61,106 @@ def configure_exception_handler(app: FastAPI) -> None:
     app.add_exception_handler(RateLimitExceeded, ratelimit_exception)
 
 
-app = FastAPI()
+async def startup(app: FastAPI):
+    """
+    Connects the cache and warms the worker up before it reports ready: opens the database connections of the pool,
+    checks Redis, loads the in-process indexes and, with WARMUP_CACHE, caches the most requested pages.
+
+    Returns:
+        The Redis client, closed by shutdown.
+    """
+    started = time.perf_counter()
+    redis = aioredis.from_url(config('REDIS_URL'))
+    cache_backend = TwoTierBackend(RedisBackend(redis))
+    FastAPICache.init(cache_backend, prefix="fastapi-cache", coder=ResponseCoder, key_builder=request_key_builder)
+    cache_backend.start()
+    category_versions.init(redis)
+    stats_reconciler.init(redis)
+    category_versions.start()
+    lifecycle.redis = redis
+    if not await ping_redis(redis):
+        logger.warning("Redis does not answer, the cache and rate limits are local to this worker until it does.")
+
+    try:
+        await warm_pool(engine, WARMUP_DB_CONNECTIONS)
+    except (OSError, SQLAlchemyError):
+        logger.warning("Could not open the database connections of the pool.", exc_info=True)
+
+    await read_replicas.check()
+    read_replicas.start()
+
+    try:
+        await greeting_pool.load()
+    except (OSError, SQLAlchemyError):
+        logger.warning("Could not load the greeting pool, /random falls back to the database.", exc_info=True)
+    greeting_pool.start()
+
+    search_backend = get_search_backend()
+    try:
+        await search_backend.load()
+    except (OSError, SQLAlchemyError):
+        logger.warning("Could not build the search index, /search falls back to the database.", exc_info=True)
+    search_backend.start()
+
+    try:
+        await suggestions.load()
+    except (OSError, SQLAlchemyError):
+        logger.warning("Could not build the suggestion index, /suggest is unavailable until it is.", exc_info=True)
+    suggestions.start()
+
+    try:
+        await prepare_greeting_stats()
+    except (OSError, SQLAlchemyError):
+        logger.warning("Could not prepare the greeting_stats table.", exc_info=True)
+    stats_reconciler.start()
+
+    if WARMUP_CACHE:
+        try:
+            logger.info("Cached %d pages at startup.", await prime_cache(app))
+        except (OSError, SQLAlchemyError, HTTPError):
+            logger.warning("Could not cache the pages requested at startup.", exc_info=True)
+
+    lifecycle.ready = True
+    logger.info("Ready to serve after %.2fs of warm-up.", time.perf_counter() - started)
+    return redis
+
+
+async def shutdown(redis) -> None:
+    """
+    Stops the background tasks and closes the cache and database pools.
+
+    The server has stopped accepting connections and waited for the in-flight requests by then, see app.server.
+    """
+    lifecycle.start_draining()
+    await greeting_pool.stop()
+    await get_search_backend().stop()
+    await suggestions.stop()
+    await stats_reconciler.stop()
+    await category_versions.stop()
+    await read_replicas.stop()
+
+    cache_backend = FastAPICache.get_backend()
+    if isinstance(cache_backend, TwoTierBackend):
+        await cache_backend.stop()
+    lifecycle.redis = None
+    await redis.aclose()
+    await engine.dispose()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    redis = await startup(app)
+    yield
+    await shutdown(redis)
+
+
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
 app.state.limiter = limiter
 configure_routes(app)
 configure_mounts(app)
 configure_middleware(app)
 configure_exception_handler(app)
 
-
-@app.on_event("startup")
-async def startup() -> None:
-    redis = aioredis.from_url(config('REDIS_URL'))
-    FastAPICache.init(RedisBackend(redis), prefix="fastapi-cache")
-
 # TODO:
 
 # Documentation:
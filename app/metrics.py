@@ -0,0 +1,177 @@
+import os
+import time
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client.multiprocess import MultiProcessCollector
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.timing import record_query
+
+# Buckets of the database timings, most queries take well under the 5ms first bucket of the default ones.
+DB_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0)
+
+REQUEST_DURATION = Histogram("http_request_duration_seconds", "Time spent serving HTTP requests.",
+                             ["method", "route", "status"])
+DB_QUERIES = Counter("db_queries_total", "SQL statements executed.", ["function"])
+DB_QUERY_DURATION = Histogram("db_query_duration_seconds", "Time spent executing SQL statements.", ["function"],
+                              buckets=DB_BUCKETS)
+DB_POOL_CHECKOUT = Histogram("db_pool_checkout_seconds", "Time spent waiting for a connection from the pool.",
+                             buckets=DB_BUCKETS)
+CACHE_REQUESTS = Counter("cache_requests_total", "Lookups of cached endpoints, by result: hit, stale or miss.",
+                         ["function", "result"])
+RATE_LIMIT_REJECTIONS = Counter("rate_limit_rejections_total", "Requests refused by the rate limiter.", ["route"])
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+# The ASGI scope of the request being served, used to label the queries run outside of an instrumented function.
+_request_scope: ContextVar[Optional[Scope]] = ContextVar("request_scope", default=None)
+# Name of the instrumented function running the current queries.
+_db_function: ContextVar[Optional[str]] = ContextVar("db_function", default=None)
+
+F = TypeVar("F", bound=Callable[..., Awaitable[Any]])
+
+
+def route_path(scope: Scope) -> str:
+    """
+    Returns the path template of the route serving a request, such as /v1/greetings/search.
+
+    Templates are used instead of the requested path, so the number of series stays bounded. Requests answered
+    before routing, by the rate limiter for instance, are matched against the routes of the app.
+    """
+    route = scope.get("route")
+    if route is None:
+        app = scope.get("app")
+        for candidate in getattr(app, "routes", ()):
+            match, _ = candidate.matches(scope)
+            if match == Match.FULL:
+                route = candidate
+                break
+    return getattr(route, "path", UNMATCHED_ROUTE)
+
+
+def endpoint_name(scope: Optional[Scope]) -> str:
+    """Returns the name of the endpoint function serving a request, 'background' outside of requests."""
+    if scope is None:
+        return "background"
+    endpoint = scope.get("endpoint")
+    return getattr(endpoint, "__name__", UNMATCHED_ROUTE)
+
+
+class MetricsMiddleware:
+    """
+    Times every HTTP request and counts rate limit rejections, by route template and status.
+
+    A raw ASGI middleware, a BaseHTTPMiddleware would add a task and a response copy to every request.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+        token = _request_scope.set(scope)
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _request_scope.reset(token)
+            route = route_path(scope)
+            REQUEST_DURATION.labels(scope["method"], route, str(status)).observe(time.perf_counter() - start)
+            if status == 429:
+                RATE_LIMIT_REJECTIONS.labels(route).inc()
+
+
+def instrument_queries(func: F) -> F:
+    """
+    Labels the queries run by an async function with its name in db_queries_total and db_query_duration_seconds.
+
+    Queries of nested instrumented functions keep the label of the outermost one. Queries run outside of any are
+    labelled with the endpoint serving the request.
+    """
+    name = func.__name__
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        if _db_function.get() is not None:
+            return await func(*args, **kwargs)
+        token = _db_function.set(name)
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            _db_function.reset(token)
+
+    return wrapper  # type: ignore[return-value]
+
+
+# The start time is kept on the execution context, not on the pooled connection: after_cursor_execute is not called
+# for a statement that raises, and the context of a failed statement is dropped with it.
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    if context is not None:
+        context._query_start = time.perf_counter()  # pylint: disable=protected-access
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    start = getattr(context, "_query_start", None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    function = _db_function.get() or endpoint_name(_request_scope.get())
+    DB_QUERIES.labels(function).inc()
+    DB_QUERY_DURATION.labels(function).observe(elapsed)
+    record_query(statement, parameters, executemany, elapsed, function)
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """
+    Counts and times every statement executed by an engine, adding it to the Server-Timing header of the request
+    and to the slow-query log.
+    """
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """The default pool of async engines, recording how long each checkout waits in db_pool_checkout_seconds."""
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            DB_POOL_CHECKOUT.observe(time.perf_counter() - start)
+
+
+def cache_counters(function: str):
+    """Returns the hit, stale and miss counters of a cached function, bound once instead of on every lookup."""
+    return tuple(CACHE_REQUESTS.labels(function, result) for result in ("hit", "stale", "miss"))
+
+
+async def metrics(request: Request) -> Response:
+    """
+    Exposes the metrics in the Prometheus text format.
+
+    With several worker processes, PROMETHEUS_MULTIPROC_DIR must be set and the metrics of every worker are merged.
+    """
+    registry = REGISTRY
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
@@ -1,5 +1,7 @@
-from sqlalchemy import Column, Integer, Text, VARCHAR, TIMESTAMP, CHAR, DDL, event
+from datetime import datetime
+from sqlalchemy import Column, Integer, Text, VARCHAR, TIMESTAMP, CHAR, DDL, Index, event
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import validates
 from app.database.connection import Base
 
 
@@ -9,10 +11,23 @@ class Greeting(Base):
 
     # Existing names column names to reflect the columns in my table
     greeting_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    message = Column(Text(collation="utf8mb4_0900_ai_ci"))
+    # SQLite, used by the benchmarks and the hermetic tests, has no MySQL collations.
+    message = Column(Text(collation="utf8mb4_0900_ai_ci").with_variant(Text(), "sqlite"))
     type = Column(VARCHAR(255), index=True)
     created_at = Column(TIMESTAMP)
-    message_hash = Column(CHAR(64), index=True)
+    message_hash = Column(CHAR(64), index=True, unique=True)
+
+    # Serve /recent_greetings as a range scan, with and without a type. Indexes are added to existing databases
+    # by the migrations in migrations/versions.
+    __table_args__ = (
+        Index("ix_greetings_type_created_at_id", "type", "created_at", "greeting_id"),
+        Index("ix_greetings_created_at_id", "created_at", "greeting_id"),
+    )
+
+    # MySQL parses ISO formatted strings assigned to created_at, SQLite only binds datetime values.
+    @validates("created_at")
+    def parse_created_at(self, key, created_at):
+        return datetime.fromisoformat(created_at) if isinstance(created_at, str) else created_at
 
     def __repr__(self):
         return f"Greeting message {self.message} and the type is {self.type}"
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, VARCHAR, TIMESTAMP, CHAR
+from app.database.connection import Base
+
+# Value of the 'month' column for the row that holds the all-time totals of a greeting type.
+ALL_TIME = "all"
+
+
+class GreetingStats(Base):
+    # Pre-computed counts of the greetings table, so pages can be numbered without a COUNT over the matching rows.
+    __tablename__ = "greeting_stats"
+
+    # One row per greeting type and month ("YYYY-MM"), plus one row per greeting type with month set to ALL_TIME.
+    type = Column(VARCHAR(255), primary_key=True)
+    month = Column(CHAR(7), primary_key=True)
+    total = Column(Integer, nullable=False, default=0)
+    newest_created_at = Column(TIMESTAMP, nullable=True)
+
+    def __repr__(self):
+        return f"Greeting stats for {self.type} in {self.month}: {self.total}"
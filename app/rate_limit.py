@@ -0,0 +1,181 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Optional, Tuple
+from limits import RateLimitItem
+from limits.storage import RedisStorage, Storage
+from limits.strategies import RateLimiter
+from limits.util import WindowStats
+from slowapi import Limiter
+
+# Takes `cost` tokens from the bucket in KEYS[1], refilled continuously at ARGV[2] tokens per second up to ARGV[1].
+# A cost of 0 only reads the bucket. Redis' own clock is used, so every worker sees the same time. Needs Redis 5 or
+# newer, where scripts calling TIME may write.
+TOKEN_BUCKET = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+
+local allowed = 0
+if tokens >= math.max(cost, 1) then
+    tokens = tokens - cost
+    allowed = 1
+end
+if cost > 0 then
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+    redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1000)
+end
+return {allowed, tostring(tokens), tostring(now)}
+"""
+
+
+class TokenBucketRateLimiter(RateLimiter, ABC):
+    """
+    Token bucket strategy for the `limits` library.
+
+    A limit such as "5/minute" refills its bucket at 5 tokens a minute. The bucket holds at most the burst of the
+    limit's scope, the endpoint, or the limit's amount when it has no burst. A request takes one token, and is
+    refused when the bucket is empty.
+
+    Args:
+        storage(Storage): The storage of the limiter.
+        burst_for(Callable[[str], int]): Returns the burst of a scope, 0 for the limit's amount.
+    """
+
+    def __init__(self, storage: Storage, burst_for: Callable[[str], int]):
+        super().__init__(storage)
+        self.burst_for = burst_for
+
+    def _bucket(self, item: RateLimitItem, identifiers: Tuple[str, ...]) -> Tuple[str, int, float]:
+        """Returns the key, capacity and refill rate in tokens per second of the bucket of a limit."""
+        capacity = (self.burst_for(identifiers[-1]) if identifiers else 0) or item.amount
+        return item.key_for(*identifiers), capacity, item.amount / item.get_expiry()
+
+    @abstractmethod
+    def _take(self, key: str, capacity: int, rate: float, cost: int) -> Tuple[bool, float, float]:
+        """Takes `cost` tokens if there are enough, returns whether they were taken, the tokens left and the time."""
+
+    def hit(self, item: RateLimitItem, *identifiers: str, cost: int = 1) -> bool:
+        key, capacity, rate = self._bucket(item, identifiers)
+        return self._take(key, capacity, rate, cost)[0]
+
+    def test(self, item: RateLimitItem, *identifiers: str) -> bool:
+        key, capacity, rate = self._bucket(item, identifiers)
+        return self._take(key, capacity, rate, 0)[0]
+
+    def get_window_stats(self, item: RateLimitItem, *identifiers: str) -> WindowStats:
+        key, capacity, rate = self._bucket(item, identifiers)
+        _, tokens, now = self._take(key, capacity, rate, 0)
+        return WindowStats(int(now + (capacity - tokens) / rate), int(tokens))
+
+
+class RedisTokenBucket(TokenBucketRateLimiter):
+    """Keeps the buckets in Redis, shared by every worker, updating them in a single round-trip."""
+
+    def __init__(self, storage: RedisStorage, burst_for: Callable[[str], int]):
+        super().__init__(storage, burst_for)
+        self._script = storage.storage.register_script(TOKEN_BUCKET)
+
+    def _take(self, key: str, capacity: int, rate: float, cost: int) -> Tuple[bool, float, float]:
+        allowed, tokens, now = self._script([key], [capacity, rate, cost])
+        return bool(allowed), float(tokens), float(now)
+
+
+class MemoryTokenBucket(TokenBucketRateLimiter):
+    """Keeps the buckets in this process, used without Redis and while Redis is unreachable."""
+
+    def __init__(self, storage: Storage, burst_for: Callable[[str], int]):
+        super().__init__(storage, burst_for)
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def _take(self, key: str, capacity: int, rate: float, cost: int) -> Tuple[bool, float, float]:
+        with self._lock:
+            now = time.time()
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+            allowed = tokens >= max(cost, 1)
+            if allowed:
+                tokens -= cost
+            if cost > 0:
+                self._buckets[key] = (tokens, now)
+            return allowed, tokens, now
+
+    def clear(self, item: RateLimitItem, *identifiers: str) -> None:
+        with self._lock:
+            self._buckets.pop(item.key_for(*identifiers), None)
+
+    def reset(self) -> None:
+        """Empties every bucket."""
+        with self._lock:
+            self._buckets.clear()
+
+
+class TokenBucketLimiter(Limiter):
+    """
+    slowapi's Limiter with token buckets instead of fixed windows, and bursts set per endpoint.
+
+    With a Redis storage_uri the buckets are shared by every worker, so a limit holds for the whole deployment and
+    not once per process. When Redis can not be reached, the limits are applied by in-process buckets until it
+    answers again.
+
+    slowapi and limits call Redis synchronously, on the event loop, so a Redis that stops answering stalls the whole
+    worker on every limited request, and on every recovery check, for as long as its socket waits.
+
+    Args:
+        default_burst(int): Burst of the endpoints limited by the default limits, 0 for the limit's amount.
+        storage_timeout(Optional[float]): The number of seconds Redis may take to connect or answer before the
+            in-process buckets are used, no timeout when None.
+        All other arguments are those of slowapi's Limiter.
+    """
+
+    def __init__(self, *args: Any, default_burst: int = 0, storage_timeout: Optional[float] = None, **kwargs: Any):
+        kwargs.setdefault("key_style", "endpoint")
+        kwargs.setdefault("in_memory_fallback_enabled", True)
+        if storage_timeout is not None:
+            kwargs["storage_options"] = {"socket_connect_timeout": storage_timeout, "socket_timeout": storage_timeout,
+                                         **kwargs.get("storage_options", {})}
+        super().__init__(*args, **kwargs)
+        self.default_burst = default_burst
+        self.bursts: Dict[str, int] = {}
+
+        if isinstance(self._storage, RedisStorage):
+            self._limiter = RedisTokenBucket(self._storage, self.burst_for)
+        else:
+            self._limiter = MemoryTokenBucket(self._storage, self.burst_for)
+        self._fallback_limiter = MemoryTokenBucket(self._fallback_storage, self.burst_for)
+
+    def burst_for(self, scope: str) -> int:
+        """Returns the burst of an endpoint, as given to `limit`, or the default burst."""
+        return self.bursts.get(scope, self.default_burst)
+
+    def limit(self, limit_value: Any, *args: Any, burst: int = 0, **kwargs: Any) -> Callable[..., Any]:
+        """
+        Limits an endpoint, like slowapi's Limiter.limit.
+
+        Args:
+            limit_value: The limit, such as "5/minute".
+            burst(int): The number of requests a client may send at once before being held to the limit's rate,
+                0 for the limit's amount.
+        """
+        decorator = super().limit(limit_value, *args, **kwargs)
+
+        def wrapper(func: Callable[..., Any]) -> Callable[..., Any]:
+            self.bursts[f"{func.__module__}.{func.__name__}"] = burst
+            return decorator(func)
+
+        return wrapper
+
+    def reset(self) -> None:
+        super().reset()
+        # The in-process buckets are not kept in the slowapi storage reset above.
+        if isinstance(self._limiter, MemoryTokenBucket):
+            self._limiter.reset()
+        self._fallback_limiter.reset()
@@ -1,7 +1,113 @@
-from slowapi import Limiter
 from slowapi.util import get_remote_address
 from fastapi.templating import Jinja2Templates
+from decouple import config, Csv
+from app.rate_limit import TokenBucketLimiter
 
-limiter = Limiter(key_func=get_remote_address, default_limits=["5/minute"])
+# Rate limits are token buckets kept in RATE_LIMIT_STORAGE_URI, the Redis of the cache by default, so they hold across
+# workers. A limit such as "5/minute" refills at that rate, its burst is the number of requests a client may send at
+# once (0 for the limit's amount). Endpoints without a limit of their own use the default one. The limiter calls Redis
+# synchronously, RATE_LIMIT_STORAGE_TIMEOUT is the number of seconds it may take before the in-process buckets are used.
+RATE_LIMIT_STORAGE_URI = config('RATE_LIMIT_STORAGE_URI', default=config('REDIS_URL', default='memory://'))
+RATE_LIMIT_STORAGE_TIMEOUT = config('RATE_LIMIT_STORAGE_TIMEOUT', default=0.25, cast=float)
+DEFAULT_RATE_LIMIT = config('DEFAULT_RATE_LIMIT', default='5/minute')
+DEFAULT_RATE_BURST = config('DEFAULT_RATE_BURST', default=0, cast=int)
+RANDOM_RATE_LIMIT = config('RANDOM_RATE_LIMIT', default='5/minute')
+RANDOM_RATE_BURST = config('RANDOM_RATE_BURST', default=0, cast=int)
+SEARCH_RATE_LIMIT = config('SEARCH_RATE_LIMIT', default='5/minute')
+SEARCH_RATE_BURST = config('SEARCH_RATE_BURST', default=0, cast=int)
+EXPORT_RATE_LIMIT = config('EXPORT_RATE_LIMIT', default='5/minute')
+EXPORT_RATE_BURST = config('EXPORT_RATE_BURST', default=0, cast=int)
+BULK_RATE_LIMIT = config('BULK_RATE_LIMIT', default='5/minute')
+BULK_RATE_BURST = config('BULK_RATE_BURST', default=0, cast=int)
+
+limiter = TokenBucketLimiter(key_func=get_remote_address, default_limits=[DEFAULT_RATE_LIMIT],
+                             default_burst=DEFAULT_RATE_BURST, storage_uri=RATE_LIMIT_STORAGE_URI,
+                             storage_timeout=RATE_LIMIT_STORAGE_TIMEOUT)
 EXPIRATION_TIME = 2_160_000
-templates = Jinja2Templates(directory="app/templates")
\ No newline at end of file
+templates = Jinja2Templates(directory="app/templates")
+
+# Connection pool of every database engine: connections kept open, extra connections allowed under load, seconds
+# before a connection is replaced (keep it under MySQL's wait_timeout), whether connections are checked before use,
+# and seconds to wait for a free connection.
+DB_POOL_SIZE = config('DB_POOL_SIZE', default=10, cast=int)
+DB_MAX_OVERFLOW = config('DB_MAX_OVERFLOW', default=20, cast=int)
+DB_POOL_RECYCLE = config('DB_POOL_RECYCLE', default=1800, cast=int)
+DB_POOL_PRE_PING = config('DB_POOL_PRE_PING', default=True, cast=bool)
+DB_POOL_TIMEOUT = config('DB_POOL_TIMEOUT', default=30, cast=float)
+
+# Comma separated urls of read replicas serving the read-only endpoints, and the interval of their health checks.
+# Reads go to the primary while the list is empty or every replica is down.
+READ_REPLICA_URLS = config('READ_REPLICA_URLS', default='', cast=Csv())
+READ_REPLICA_CHECK_SECONDS = config('READ_REPLICA_CHECK_SECONDS', default=10, cast=float)
+
+# Process-local pool of messages used by the /random endpoint.
+GREETING_POOL_REFRESH_SECONDS = config('GREETING_POOL_REFRESH_SECONDS', default=300, cast=int)
+GREETING_POOL_MAX_SIZE = config('GREETING_POOL_MAX_SIZE', default=10_000, cast=int)
+# Maximum number of greetings per category returned by /random/batch.
+RANDOM_BATCH_MAX_COUNT = config('RANDOM_BATCH_MAX_COUNT', default=20, cast=int)
+
+# Interval of the job that rebuilds the greeting_stats table from the greetings table, and the Redis key of the lock
+# letting a single worker run it per interval.
+STATS_RECONCILE_SECONDS = config('STATS_RECONCILE_SECONDS', default=3600, cast=int)
+STATS_RECONCILE_LOCK_KEY = config('STATS_RECONCILE_LOCK_KEY', default='greeting-stats:reconcile-lock')
+
+# In-process layer of the two-tier cache, in front of the shared Redis cache.
+LOCAL_CACHE_MAX_ENTRIES = config('LOCAL_CACHE_MAX_ENTRIES', default=10_000, cast=int)
+LOCAL_CACHE_MAX_BYTES = config('LOCAL_CACHE_MAX_BYTES', default=64 * 1024 * 1024, cast=int)
+LOCAL_CACHE_TTL = config('LOCAL_CACHE_TTL', default=60, cast=int)
+CACHE_INVALIDATION_CHANNEL = config('CACHE_INVALIDATION_CHANNEL', default='fastapi-cache:invalidate')
+
+# Cache stampede protection: how long a worker holds the lock of a key it is computing, and for how many seconds
+# an expired value may still be served while it is refreshed in the background (0 disables it).
+CACHE_LOCK_TIMEOUT = config('CACHE_LOCK_TIMEOUT', default=10, cast=float)
+CACHE_STALE_WHILE_REVALIDATE = config('CACHE_STALE_WHILE_REVALIDATE', default=0, cast=int)
+
+# Seconds a 404 of a cached endpoint (no search results, a page past the last one) is cached, 0 disables it.
+CACHE_NEGATIVE_TTL = config('CACHE_NEGATIVE_TTL', default=30, cast=int)
+
+# Cache-Control of the cached endpoints, for browsers and CDNs: seconds a response is fresh (never longer than its
+# cached copy), and seconds a stale one may still be served while the CDN revalidates it with its ETag.
+HTTP_CACHE_MAX_AGE = config('HTTP_CACHE_MAX_AGE', default=60, cast=int)
+HTTP_CACHE_STALE_WHILE_REVALIDATE = config('HTTP_CACHE_STALE_WHILE_REVALIDATE', default=300, cast=int)
+
+# Redis hash and pub/sub channel of the per-category cache versions.
+CACHE_VERSIONS_KEY = config('CACHE_VERSIONS_KEY', default='fastapi-cache:versions')
+CACHE_VERSIONS_CHANNEL = config('CACHE_VERSIONS_CHANNEL', default='fastapi-cache:versions')
+
+# Search backend of the /search endpoint: 'mysql' for the FULLTEXT index, 'memory' for an in-process BM25 index.
+# In-process indexes, including the one of /suggest, are rebuilt from the database every SEARCH_INDEX_REFRESH_SECONDS.
+SEARCH_BACKEND = config('SEARCH_BACKEND', default='mysql')
+SEARCH_INDEX_REFRESH_SECONDS = config('SEARCH_INDEX_REFRESH_SECONDS', default=3600, cast=int)
+
+# The 'mysql' backend caches the ids of the greetings matching a search, so its pages and total are sliced from them:
+# seconds the ids are kept, and the number of ids kept per search (pages past them run the full-text query).
+SEARCH_IDS_TTL = config('SEARCH_IDS_TTL', default=3600, cast=int)
+SEARCH_IDS_MAX = config('SEARCH_IDS_MAX', default=100_000, cast=int)
+
+# Autocomplete of the /suggest endpoint, called on every keystroke so it gets a rate limit of its own.
+SUGGEST_MAX_RESULTS = config('SUGGEST_MAX_RESULTS', default=20, cast=int)
+SUGGEST_RATE_LIMIT = config('SUGGEST_RATE_LIMIT', default='120/minute')
+SUGGEST_RATE_BURST = config('SUGGEST_RATE_BURST', default=0, cast=int)
+
+# Bulk loading of greetings: rows per INSERT and transaction, sizing of the Bloom filter of known message hashes, and
+# the key expected in the X-API-Key header of POST /bulk (the endpoint is disabled while it is empty).
+BULK_BATCH_SIZE = config('BULK_BATCH_SIZE', default=1000, cast=int)
+BULK_BLOOM_CAPACITY = config('BULK_BLOOM_CAPACITY', default=10_000_000, cast=int)
+BULK_BLOOM_ERROR_RATE = config('BULK_BLOOM_ERROR_RATE', default=0.01, cast=float)
+BULK_API_KEY = config('BULK_API_KEY', default='')
+
+# Rows fetched at a time from the server-side cursor of /export.
+EXPORT_YIELD_PER = config('EXPORT_YIELD_PER', default=1000, cast=int)
+
+# Statements taking this many seconds or more are written to the 'app.slow_queries' log, 0 disables the log.
+SLOW_QUERY_SECONDS = config('SLOW_QUERY_SECONDS', default=0.5, cast=float)
+
+# Startup and shutdown: database connections opened before the first request (capped at DB_POOL_SIZE, 0 to skip),
+# whether /types and the first page of every category are cached at startup, seconds the checks of /healthz/ready may
+# take, seconds a worker keeps serving after the shutdown signal while /healthz/ready answers 503, so load balancers
+# stop sending it requests, and seconds the in-flight requests are then given to finish.
+WARMUP_DB_CONNECTIONS = config('WARMUP_DB_CONNECTIONS', default=DB_POOL_SIZE, cast=int)
+WARMUP_CACHE = config('WARMUP_CACHE', default=False, cast=bool)
+READINESS_TIMEOUT = config('READINESS_TIMEOUT', default=2, cast=float)
+SHUTDOWN_PRESTOP_SECONDS = config('SHUTDOWN_PRESTOP_SECONDS', default=10, cast=float)
+SHUTDOWN_DRAIN_SECONDS = config('SHUTDOWN_DRAIN_SECONDS', default=30, cast=int)
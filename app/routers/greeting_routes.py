@@ -1,21 +1,49 @@
+import base64
+import json
+import logging
 import random
-from datetime import datetime
+import secrets
+from collections import defaultdict
+from dataclasses import asdict
+from datetime import datetime, timedelta
 from typing import Optional, Tuple, AsyncGenerator, List, Any, Sequence
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException, Header
 from fastapi import Request
-from fastapi_cache.decorator import cache
-from sqlalchemy import text, extract, select, func, Row, RowMapping
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, and_, or_, Row, RowMapping
 from sqlalchemy.engine.result import _TP
 from sqlalchemy.sql.selectable import Select
 from sqlalchemy.exc import OperationalError, SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.database.connection import AsyncSessionLocal
+from app.database.replicas import read_replicas
 from app.models.greeting import Greeting
 from app.routers.greeting_types import GreetingType
-from app.schemas.greeting_schema import GreetingResponseModel, GreetingResponse, TypeResponse
-from app.routers.config import EXPIRATION_TIME
-
-router = APIRouter()
+from app.schemas.greeting_schema import GreetingResponseModel, GreetingResponse, TypeResponse, StatsResponse, \
+    CategoryStats, SuggestResponse, BulkIngestResponse, RecentGreetingResponseModel
+from app.database.stats import get_greeting_total, fetch_greeting_stats, month_key
+from app.database.ingest import FORMATS, bulk_ingester, parse_rows
+from app.models.greeting_stats import ALL_TIME
+from app.routers.config import EXPIRATION_TIME, SUGGEST_MAX_RESULTS, SUGGEST_RATE_LIMIT, SUGGEST_RATE_BURST, \
+    BULK_API_KEY, EXPORT_YIELD_PER, RANDOM_BATCH_MAX_COUNT, RANDOM_RATE_LIMIT, RANDOM_RATE_BURST, SEARCH_RATE_LIMIT, \
+    SEARCH_RATE_BURST, EXPORT_RATE_LIMIT, EXPORT_RATE_BURST, BULK_RATE_LIMIT, BULK_RATE_BURST, limiter
+from app.cache.decorator import cache
+from app.metrics import instrument_queries
+from app.timing import TimedRoute
+from app.cache.greeting_pool import greeting_pool
+from app.cache.keys import monthly_key_builder
+from app.cache.totals import cached_total
+from app.search.backends import get_search_backend
+from app.search.suggest import suggestions
+
+router = APIRouter(route_class=TimedRoute)
+
+logger = logging.getLogger(__name__)
+
+CURSOR_DESCRIPTION = "Opaque cursor taken from the 'next_cursor' of the previous page. Use it instead of 'offset' to " \
+                     "keep deep pages as fast as the first one."
+SEARCH_CURSOR_DESCRIPTION = "Opaque cursor taken from the 'next_cursor' of the previous page. Search results are " \
+                            "ordered by relevance, the cursor holds the position of the next page."
 
 
 # TODO continue to refactor code, where doc strings are added and abstracting some functionality from the endpoint
@@ -38,6 +66,20 @@ async def get_db() -> AsyncGenerator[AsyncSessionLocal, None]:
         yield session
 
 
+async def get_read_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Provides a database session for the read-only endpoints.
+
+    The session is opened on one of the READ_REPLICA_URLS, chosen round-robin among the healthy ones, and on the
+    primary when there are none. Endpoints writing to the database use get_db.
+
+    Yields:
+        session: An instance of the database session.
+    """
+    async with read_replicas.session() as session:
+        yield session
+
+
 def validate_type(greeting_type: str) -> GreetingType:
     """
     Used to validate the given greeting type value.
@@ -80,45 +122,225 @@ def calculateGreetingPagination(total_greetings: int, limit: int, offset: int) -
     return total_pages, offset_limit, current_page
 
 
-async def count_greetings_by_type(db: AsyncSession, validated_greeting_type: GreetingType) -> int:
+def month_range(moment: datetime) -> Tuple[datetime, datetime]:
     """
-        Count the number of greetings of a specific type.
+    Returns the start of the month of the given moment and the start of the following month.
 
-        Args:
-            db (AsyncSession): The database session.
-            validated_greeting_type(GreetingType): The type of greeting to count.
+    Args:
+        moment(datetime): Any moment within the month.
 
-        Returns:
-            int: The total count of greetings for specified type.
-        """
-    total_greetings_query = select(func.count()).select_from(Greeting).filter(Greeting.type == validated_greeting_type)
-    total_greetings_result = await db.execute(total_greetings_query)
-    total_greetings = total_greetings_result.scalar_one()
-    return total_greetings
+    Returns:
+        month_start(datetime): Midnight of the first day of the month.
+        next_month_start(datetime): Midnight of the first day of the following month.
+    """
+    month_start = moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    next_month_start = (month_start + timedelta(days=32)).replace(day=1)
+    return month_start, next_month_start
+
+
+def encode_cursor(keys: List[Any], offset: int) -> str:
+    """
+    Builds the opaque cursor pointing just after the last row of a page.
+
+    Args:
+        keys(List[Any]): The sort key values of the last row returned, e.g. [greeting_id].
+        offset(int): The number of rows that come before the next page, used to report the current page.
+
+    Returns:
+        str: A url safe cursor that can be passed back as the 'cursor' query parameter.
+    """
+    payload = json.dumps({"after": keys, "offset": offset}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
 
 
-async def count_greetings_with_conditions(db: AsyncSession, conditions: List, query: Optional[str] = None) -> int:
+def decode_cursor(cursor: str, key_count: int) -> Tuple[List[Any], int]:
     """
-    Count the number of greetings based on specified conditions, with an optional query.
+    Reads a cursor created by encode_cursor.
 
     Args:
-        db (AsyncSession): The database session.
-        conditions (List): A list of SQLAlchemy conditions to filter the query.
-        query (Optional[str]): An optional query parameter to be used in the query.
+        cursor(str): The cursor given by the client.
+        key_count(int): The number of sort keys the endpoint expects in the cursor.
 
     Returns:
-        int: The count of greetings that meet the specified conditions and optional query.
+        keys(List[Any]): The sort key values of the last row of the previous page.
+        offset(int): The number of rows that come before the requested page.
+
+    Raises:
+        HTTPException: if the cursor can not be decoded.
     """
-    total_greetings_query = select(func.count(Greeting.message)).select_from(Greeting).filter(*conditions)
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        keys, offset = payload["after"], payload["offset"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="The given cursor is invalid.")
+
+    # The greeting_id is always the last sort key.
+    if not isinstance(keys, list) or len(keys) != key_count or not isinstance(keys[-1], int) \
+            or not isinstance(offset, int) or offset < 0:
+        raise HTTPException(status_code=400, detail="The given cursor is invalid.")
+
+    return keys, offset
 
-    if query:
-        total_greetings_query = total_greetings_query.params(query=query)
 
-    total_greetings_result = await db.execute(total_greetings_query)
-    total_greetings = total_greetings_result.scalar_one()
-    return total_greetings
+def resolve_page_start(cursor: Optional[str], offset: int, key_count: int = 1) -> Tuple[Optional[List[Any]], int]:
+    """
+    Works out where the requested page starts, for either offset or cursor pagination.
+
+    Args:
+        cursor(Optional[str]): The cursor given by the client, if any.
+        offset(int): The offset given by the client.
+        key_count(int): The number of sort keys the endpoint expects in the cursor.
+
+    Returns:
+        keys(Optional[List[Any]]): The sort keys to seek past, None when paging by offset.
+        offset(int): The number of rows that come before the requested page.
+
+    Raises:
+        HTTPException: if both a cursor and an offset are given, or the cursor is invalid.
+    """
+    if cursor is None:
+        return None, offset
+
+    if offset:
+        raise HTTPException(status_code=400, detail="Use either 'offset' or 'cursor' to paginate, not both.")
+
+    return decode_cursor(cursor, key_count)
+
+
+def next_page_cursor(last_keys: Optional[List[Any]], offset: int, page_size: int, total_greetings: int) \
+        -> Optional[str]:
+    """
+    Returns the cursor of the page following the current one, or None when the current page is the last.
+
+    Args:
+        last_keys(Optional[List[Any]]): The sort key values of the last row of the current page.
+        offset(int): The number of rows that come before the current page.
+        page_size(int): The number of rows in the current page.
+        total_greetings(int): total greetings for a given query.
+    """
+    if last_keys is None or offset + page_size >= total_greetings:
+        return None
+    return encode_cursor(last_keys, offset + page_size)
+
 
+# The queries run by the endpoints, kept apart so the explain command reports the exact same statements.
+def greetings_page_query(greeting_type: str, limit: int, offset: int = 0, after: Optional[List[Any]] = None) \
+        -> Select:
+    """
+    Builds the query of a page of greetings of one type, ordered by greeting_id.
+
+    Args:
+        greeting_type(str): The database value of the greeting type.
+        limit(int): The number of greetings in the page.
+        offset(int): The number of greetings to skip, ignored when `after` is given.
+        after(Optional[List[Any]]): The cursor keys of the previous page, [greeting_id].
+
+    Returns:
+        Select: The page query.
+    """
+    query = select(Greeting).filter(Greeting.type == greeting_type).order_by(Greeting.greeting_id)
+
+    # Seeking past the last seen id costs the same for every page, unlike an OFFSET that scans the skipped rows.
+    if after is not None:
+        query = query.filter(Greeting.greeting_id > after[0])
+    else:
+        query = query.offset(offset)
+    return query.limit(limit)
+
+
+def random_candidates_query(greeting_type: str) -> Select:
+    """Builds the query loading every message of a greeting type, used by /random before the pool is loaded."""
+    return select(Greeting.message).select_from(Greeting).filter(Greeting.type == greeting_type)
+
+
+def random_batch_candidates_query(greeting_types: List[str]) -> Select:
+    """Builds the query loading the messages of several greeting types at once, used by /random/batch."""
+    return select(Greeting.type, Greeting.message).select_from(Greeting).filter(Greeting.type.in_(greeting_types))
+
+
+def types_query() -> Select:
+    """Builds the query of the distinct greeting types in the greetings table."""
+    return select(Greeting.type).select_from(Greeting).distinct()
+
+
+def export_query(greeting_type: Optional[str] = None) -> Select:
+    """Builds the query of a full export, of one greeting type or of every greeting, ordered by greeting_id."""
+    query = select(Greeting.greeting_id, Greeting.message, Greeting.type, Greeting.created_at) \
+        .order_by(Greeting.greeting_id)
+
+    if greeting_type:
+        query = query.filter(Greeting.type == greeting_type)
+    return query
+
+
+def recent_conditions(now: datetime, greeting_type: Optional[str] = None) -> List:
+    """
+    Builds the conditions selecting the greetings created in the month of `now`.
+
+    The month is compared as a half-open range, so the created_at index can be used.
+
+    Args:
+        now(datetime): The current time, read once per request.
+        greeting_type(Optional[str]): The database value of the greeting type, all types when None.
+    """
+    month_start, next_month_start = month_range(now)
+
+    conditions = [
+        Greeting.created_at >= month_start,
+        Greeting.created_at < next_month_start
+    ]
+
+    if greeting_type:
+        conditions.append(Greeting.type == greeting_type)
+    return conditions
+
+
+def recent_page_query(conditions: List, limit: int, offset: int = 0,
+                      after: Optional[Tuple[datetime, int]] = None) -> Select:
+    """
+    Builds the query of a page of recent greetings, newest first.
+
+    Args:
+        conditions(List): The conditions built by recent_conditions.
+        limit(int): The number of greetings in the page.
+        offset(int): The number of greetings to skip, ignored when `after` is given.
+        after(Optional[Tuple[datetime, int]]): The created_at and greeting_id of the last greeting of the previous page.
+
+    Returns:
+        Select: The page query.
+    """
+    query = select(Greeting.message, Greeting.type, Greeting.created_at, Greeting.greeting_id) \
+        .filter(*conditions) \
+        .order_by(Greeting.created_at.desc(), Greeting.greeting_id.desc())
+
+    if after is not None:
+        after_created_at, after_id = after
+        query = query.filter(or_(Greeting.created_at < after_created_at,
+                                 and_(Greeting.created_at == after_created_at, Greeting.greeting_id < after_id)))
+    else:
+        query = query.offset(offset)
+    return query.limit(limit)
+
+
+@instrument_queries
+async def count_greetings_by_type(db: AsyncSession, validated_greeting_type: GreetingType) -> int:
+    """
+        Count the number of greetings of a specific type.
+
+        The count is read from the greeting_stats table, which the write path and the reconcile job keep up to
+        date, instead of counting the matching rows on every request.
+
+        Args:
+            db (AsyncSession): The database session.
+            validated_greeting_type(GreetingType): The type of greeting to count.
 
+        Returns:
+            int: The total count of greetings for specified type.
+        """
+    return await get_greeting_total(db, validated_greeting_type)
+
+
+@instrument_queries
 async def fetch_greetings(db: AsyncSession, query: Select, fetch_scalar: Optional[bool] = False) -> Sequence[Row[_TP]] | \
                                                                                                     Sequence[
                                                                                                         Row | RowMapping | Any]:
@@ -150,14 +372,16 @@ async def get_greetings(request: Request,
                         limit: int = Query(10, description="Limit the number of greetings returned", ge=1, le=100),
                         offset: int = Query(0, description="The starting point from which to retrieve the set of "
                                                            "records.", ge=0),
-                        db: AsyncSession = Depends(get_db)):
+                        cursor: Optional[str] = Query(None, description=CURSOR_DESCRIPTION),
+                        db: AsyncSession = Depends(get_read_db)):
     validated_greeting_type = validate_type(category)
-    query = select(Greeting).filter(Greeting.type == validated_greeting_type).offset(offset).limit(limit)
+    after, offset = resolve_page_start(cursor, offset)
 
+    # The page is checked against the cached total first, so a page past the last one is not queried.
     try:
-        greetings = await fetch_greetings(db, query)
-        total_greetings = await count_greetings_by_type(db, validated_greeting_type)
-
+        total_greetings = await cached_total(f"greetings:{validated_greeting_type}", validated_greeting_type,
+                                             lambda: count_greetings_by_type(db, validated_greeting_type),
+                                             EXPIRATION_TIME)
     except (OperationalError, SQLAlchemyError):
         raise HTTPException(status_code=500, detail='Internal Server Error')
 
@@ -169,47 +393,96 @@ async def get_greetings(request: Request,
                                    f"pages ({total_pages}). Please request a page number between"
                                    f" 1 and {total_pages}.")
 
+    query = greetings_page_query(validated_greeting_type, limit, offset, after)
+
+    try:
+        greetings = await fetch_greetings(db, query)
+
+    except (OperationalError, SQLAlchemyError):
+        raise HTTPException(status_code=500, detail='Internal Server Error')
+
+    last_keys = [greetings[-1].greeting_id] if greetings else None
+
     response = GreetingResponseModel(total_greetings=total_greetings,
                                      total_pages=total_pages,
                                      current_page=current_page,
-                                     greetings=[{"message": greeting.message,
-                                                 "type": greeting.type} for greeting in greetings])
+                                     next_cursor=next_page_cursor(last_keys, offset, len(greetings), total_greetings),
+                                     greetings=[{"message": greeting.message, "type": greeting.type}
+                                                for greeting in greetings])
 
     return response
 
 
 @router.get('/random', response_model=GreetingResponse)
+@limiter.limit(RANDOM_RATE_LIMIT, burst=RANDOM_RATE_BURST)
 async def get_random_greeting(request: Request
                               , category: str = Query(..., description="Type of greeting",
                                                       enum=list(GreetingType.__members__))
-                              , db: AsyncSession = Depends(get_db)):
+                              , db: AsyncSession = Depends(get_read_db)):
     greeting_type = validate_type(category)
-    query = select(Greeting.message).select_from(Greeting).filter(
-        Greeting.type == greeting_type)
-    try:
-        greetings = await fetch_greetings(db, query)
 
-    except (OperationalError, SQLAlchemyError):
-        raise HTTPException(status_code=500, detail='Internal Server Error')
+    # Served from the in-memory pool once it is loaded, the database is only queried before the first load.
+    if greeting_pool.loaded:
+        message = greeting_pool.choice(greeting_type)
+    else:
+        query = random_candidates_query(greeting_type)
+        try:
+            greetings = await fetch_greetings(db, query)
 
-    if not greetings:
-        raise HTTPException(status_code=404, detail="No greetings found")
+        except (OperationalError, SQLAlchemyError):
+            raise HTTPException(status_code=500, detail='Internal Server Error')
 
-    message = random.choice(greetings)
+        message = random.choice(greetings) if greetings else None
 
-    response = GreetingResponse(greeting=[{
-        "message": message,
-        "type": category,
-    }]).model_dump()
+    if message is None:
+        raise HTTPException(status_code=404, detail="No greetings found")
+
+    response = GreetingResponse(greeting=[{"message": message, "type": category}])
 
     return response
 
 
+# Distinct random greetings of several categories in one call,
+# e.g. /random/batch?category=Birthday_Dad&category=Birthday_Mom&count=3
+@router.get('/random/batch', response_model=GreetingResponse)
+@limiter.limit(RANDOM_RATE_LIMIT, burst=RANDOM_RATE_BURST)
+async def get_random_greetings_batch(request: Request,
+                                     category: List[str] = Query(..., description="Types of greeting, repeat the "
+                                                                                  "parameter for each type",
+                                                                 enum=list(GreetingType.__members__)),
+                                     count: int = Query(1, description="Number of greetings per type", ge=1,
+                                                        le=RANDOM_BATCH_MAX_COUNT),
+                                     db: AsyncSession = Depends(get_read_db)):
+    categories = {name: validate_type(name) for name in dict.fromkeys(category)}
+
+    if greeting_pool.loaded:
+        samples = {name: greeting_pool.sample(greeting_type, count) for name, greeting_type in categories.items()}
+    else:
+        try:
+            candidates = await fetch_greetings(db, random_batch_candidates_query(list(categories.values())), True)
+
+        except (OperationalError, SQLAlchemyError):
+            raise HTTPException(status_code=500, detail='Internal Server Error')
+
+        messages = defaultdict(list)
+        for greeting_type, message in candidates:
+            messages[greeting_type].append(message)
+        samples = {name: random.sample(messages[greeting_type], min(count, len(messages[greeting_type])))
+                   for name, greeting_type in categories.items()}
+
+    greetings = [{"message": message, "type": name} for name, messages in samples.items() for message in messages]
+
+    if not greetings:
+        raise HTTPException(status_code=404, detail="No greetings found")
+
+    return GreetingResponse(greeting=greetings)
+
+
 # An endpoint that simply retrieves all types, and returns all unique user-friendly types to the user.
 @router.get('/types', response_model=TypeResponse)
 @cache(expire=EXPIRATION_TIME)
-async def get_greeting_types(request: Request, db: AsyncSession = Depends(get_db)):
-    query = select(Greeting.type).select_from(Greeting).distinct()
+async def get_greeting_types(request: Request, db: AsyncSession = Depends(get_read_db)):
+    query = types_query()
 
     try:
         greeting_types = await fetch_greetings(db, query)
@@ -227,7 +500,38 @@ async def get_greeting_types(request: Request, db: AsyncSession = Depends(get_db
         return response
 
 
+# Per category totals, monthly counts and the date of the newest greeting, read from the greeting_stats table.
+@router.get('/stats', response_model=StatsResponse)
+async def get_greeting_stats(request: Request, db: AsyncSession = Depends(get_read_db)):
+    try:
+        rows = await fetch_greeting_stats(db)
+
+    except (OperationalError, SQLAlchemyError):
+        raise HTTPException(status_code=500, detail='Internal Server Error')
+
+    categories = {}
+    for member in GreetingType:
+        categories[member.value] = CategoryStats(category=member.name, total_greetings=0, monthly_greetings={})
+
+    for row in rows:
+        category_stats = categories.get(row.type)
+        if category_stats is None:
+            continue
+
+        if row.month == ALL_TIME:
+            category_stats.total_greetings = row.total
+            category_stats.newest_created_at = row.newest_created_at
+        elif row.total:
+            category_stats.monthly_greetings[row.month] = row.total
+
+    response = StatsResponse(total_greetings=sum(stats.total_greetings for stats in categories.values()),
+                             categories=list(categories.values()))
+
+    return response
+
+
 @router.get('/search', response_model=GreetingResponseModel)
+@limiter.limit(SEARCH_RATE_LIMIT, burst=SEARCH_RATE_BURST)
 @cache(expire=EXPIRATION_TIME)
 async def get_greeting_by_search(request: Request,
                                  category: Optional[str] = Query(None, description="Type of greeting",
@@ -237,28 +541,30 @@ async def get_greeting_by_search(request: Request,
                                                     le=100),
                                  offset: int = Query(0, description='The starting point from which to retrieve the '
                                                                     'set of records.', ge=0),
-                                 db: AsyncSession = Depends(get_db)):
-    conditions = [text("MATCH (message) AGAINST (:query IN NATURAL LANGUAGE MODE)")]
-
+                                 cursor: Optional[str] = Query(None, description=SEARCH_CURSOR_DESCRIPTION),
+                                 db: AsyncSession = Depends(get_read_db)):
     if category:
         category = validate_type(category)
-        conditions.append(Greeting.type == category)
 
-    db_query = select(Greeting.message, Greeting.type) \
-        .select_from(Greeting) \
-        .filter(*conditions) \
-        .params(query=query) \
-        .offset(offset) \
-        .limit(limit)
+    after, offset = resolve_page_start(cursor, offset)
+    search_backend = get_search_backend()
 
+    # The page is checked against the cached number of results first, so searches without results and pages past
+    # the last one are not queried.
     try:
-        greetings = await fetch_greetings(db, db_query, True)
-        total_greetings = await count_greetings_with_conditions(db, conditions, query)
+        total_greetings = await cached_total(f"search:{category}:{query}", category,
+                                             lambda: search_backend.count(db, query, category), EXPIRATION_TIME)
+        if offset >= total_greetings:
+            raise HTTPException(status_code=404, detail='No greetings found match the search criteria.')
+        page = await search_backend.search(db, query, category, limit, offset, after)
+        # The page and its total come from the same results, the cached total may predate deletes.
+        total_greetings = page.total
 
     except (OperationalError, SQLAlchemyError):
         raise HTTPException(status_code=500, detail='Internal Server Error')
 
-    result = [Greeting(message=message, type=category) for (message, category) in greetings]
+    result = [Greeting(message=message, type=category, greeting_id=greeting_id)
+              for (message, category, greeting_id) in page.greetings]
     total_pages, offset_limit, current_page = calculateGreetingPagination(total_greetings, limit, offset)
 
     if not result:
@@ -270,19 +576,106 @@ async def get_greeting_by_search(request: Request,
                                    f"pages ({total_pages}). Please request a page number between"
                                    f" 1 and {total_pages}.")
 
+    last_keys = [result[-1].greeting_id]
+
     response = GreetingResponseModel(total_greetings=total_greetings,
                                      total_pages=total_pages,
                                      current_page=current_page,
-                                     greetings=[{
-                                         "message": greeting.message,
-                                         "type": greeting.type
-                                     } for greeting in result])
+                                     next_cursor=next_page_cursor(last_keys, offset, len(result), total_greetings),
+                                     greetings=[{"message": greeting.message, "type": greeting.type}
+                                                for greeting in result])
 
     return response
 
 
-@router.get('/recent_greetings', response_model=GreetingResponseModel)
-@cache(expire=EXPIRATION_TIME)
+async def export_lines(db: AsyncSession, query: Select, yield_per: int) -> AsyncGenerator[bytes, None]:
+    """
+    Streams the rows of a query as NDJSON, one chunk per batch of `yield_per` rows.
+
+    The rows are read through a server-side cursor, so only one batch is held in memory at a time.
+
+    Args:
+        db (AsyncSession): The database session, kept open by get_read_db until the response is sent.
+        query(Select): The query built by export_query.
+        yield_per(int): The number of rows fetched from the cursor at a time.
+    """
+    try:
+        result = await db.stream(query.execution_options(yield_per=yield_per))
+        async for partition in result.partitions():
+            yield "".join(json.dumps({"greeting_id": greeting_id, "message": message, "type": greeting_type,
+                                      "created_at": created_at.isoformat() if created_at else None}) + "\n"
+                          for greeting_id, message, greeting_type, created_at in partition).encode()
+
+    except (OperationalError, SQLAlchemyError):
+        # The status line is already sent, ending the stream early is the only way left to report the failure.
+        logger.exception("Export failed, the response is truncated.")
+
+
+# Dumps every greeting, or those of one category, as NDJSON: one greeting per line, in greeting_id order.
+@router.get('/export', response_class=StreamingResponse)
+@limiter.limit(EXPORT_RATE_LIMIT, burst=EXPORT_RATE_BURST)
+async def export_greetings(request: Request,
+                           category: Optional[str] = Query(None, description="Type of greeting, every type when "
+                                                                             "omitted",
+                                                           enum=list(GreetingType.__members__)),
+                           db: AsyncSession = Depends(get_read_db)):
+    if category:
+        category = validate_type(category)
+
+    return StreamingResponse(export_lines(db, export_query(category), EXPORT_YIELD_PER),
+                             media_type="application/x-ndjson")
+
+
+# Loads greetings streamed as NDJSON or CSV (a header row with message, type and optionally created_at). Rows whose
+# message is already stored are skipped. Requires the BULK_API_KEY in the X-API-Key header.
+@router.post('/bulk', response_model=BulkIngestResponse)
+@limiter.limit(BULK_RATE_LIMIT, burst=BULK_RATE_BURST)
+async def bulk_ingest(request: Request,
+                      data_format: Optional[str] = Query(None, alias="format", enum=list(FORMATS),
+                                                         description="Format of the body, taken from the "
+                                                                     "Content-Type header when omitted"),
+                      x_api_key: Optional[str] = Header(None),
+                      db: AsyncSession = Depends(get_db)):
+    if not BULK_API_KEY or x_api_key is None or not secrets.compare_digest(x_api_key, BULK_API_KEY):
+        raise HTTPException(status_code=403, detail="A valid API key is required to load greetings.")
+
+    if data_format is None:
+        data_format = "csv" if request.headers.get("content-type", "").startswith("text/csv") else "ndjson"
+
+    try:
+        report = await bulk_ingester.ingest(db, parse_rows(request.stream(), data_format))
+
+    except (OperationalError, SQLAlchemyError):
+        raise HTTPException(status_code=500, detail='Internal Server Error')
+
+    return BulkIngestResponse(**asdict(report))
+
+
+# Autocomplete for search boxes, completes the last word of `q` from the in-process suggestion index.
+@router.get('/suggest', response_model=SuggestResponse)
+@limiter.limit(SUGGEST_RATE_LIMIT, burst=SUGGEST_RATE_BURST)
+async def get_suggestions(request: Request,
+                          q: str = Query(..., description='The search phrase typed so far', min_length=1,
+                                         max_length=100),
+                          category: Optional[str] = Query(None, description="Type of greeting",
+                                                          enum=list(GreetingType.__members__)),
+                          limit: int = Query(10, description='Limit the number of suggestions returned', ge=1,
+                                             le=SUGGEST_MAX_RESULTS)):
+    if category:
+        category = validate_type(category)
+
+    if not suggestions.loaded:
+        raise HTTPException(status_code=503, detail='Suggestions are not available yet, please retry shortly.')
+
+    head, _, prefix = q.rpartition(" ")
+    words = suggestions.index.suggest(prefix.lower(), category, limit)
+    head = f"{head} " if head else ""
+
+    return SuggestResponse(query=q, suggestions=[head + word for word in words])
+
+
+@router.get('/recent_greetings', response_model=RecentGreetingResponseModel)
+@cache(expire=EXPIRATION_TIME, key_builder=monthly_key_builder)
 async def get_recent_greetings(request: Request,
                                category: Optional[str] = Query(None, description="Type of greeting",
                                                                enum=list(GreetingType.__members__)),
@@ -299,29 +692,27 @@ async def get_recent_greetings(request: Request,
                                                                "limit "
                                                                "of 5 "
                                                                "will retrieve records 11 through 15.", ge=0),
-                               db: AsyncSession = Depends(get_db)):
-
-    current_month = datetime.now().month
-    current_year = datetime.now().year
+                               cursor: Optional[str] = Query(None, description=CURSOR_DESCRIPTION),
+                               db: AsyncSession = Depends(get_read_db)):
 
-    conditions = [
-        extract('month', Greeting.created_at) == current_month,
-        extract('year', Greeting.created_at) == current_year
-    ]
+    # The clock is read once, so the month of the query and of the total always agree.
+    now = datetime.now()
 
     if category:
         category = validate_type(category)
-        conditions.append(Greeting.type == category)
 
-    query = select(Greeting.message, Greeting.type, Greeting.created_at) \
-        .filter(*conditions) \
-        .offset(offset) \
-        .limit(limit)
+    after, offset = resolve_page_start(cursor, offset, key_count=2)
+    if after is not None:
+        try:
+            after = (datetime.fromisoformat(after[0]), after[1])
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="The given cursor is invalid.")
 
+    # The page is checked against the cached total of the month first, so a page past the last one is not queried.
     try:
-        raw_result = await fetch_greetings(db, query, True)
-        total_greetings = await count_greetings_with_conditions(db, conditions)
-
+        total_greetings = await cached_total(f"recent:{category}:{month_key(now)}", category,
+                                             lambda: get_greeting_total(db, category, month_key(now)),
+                                             EXPIRATION_TIME)
     except (OperationalError, SQLAlchemyError):
         raise HTTPException(status_code=500, detail='Internal Server Error')
 
@@ -332,17 +723,28 @@ async def get_recent_greetings(request: Request,
                                                     f"total available pages ({total_pages}). Please request a "
                                                     f"page number between 1 and {total_pages}.")
 
+    query = recent_page_query(recent_conditions(now, category), limit, offset, after)
+
+    try:
+        raw_result = await fetch_greetings(db, query, True)
+
+    except (OperationalError, SQLAlchemyError):
+        raise HTTPException(status_code=500, detail='Internal Server Error')
+
     if not raw_result:
         raise HTTPException(status_code=404, detail='No new greetings have been added this month. Feel free to '
                                                     'explore our past greetings or check back later for new updates!')
 
-    response = GreetingResponseModel(total_greetings=total_greetings,
-                                     total_pages=total_pages,
-                                     current_page=current_page,
-                                     greetings=[{"message": message,
-                                                 "type": type_,
-                                                 "created_at": created_at.isoformat()} for message, type_, created_at
-                                                in raw_result])
+    last_created_at, last_id = raw_result[-1][2:]
+    last_keys = [last_created_at.isoformat(), last_id]
+
+    response = RecentGreetingResponseModel(total_greetings=total_greetings,
+                                           total_pages=total_pages,
+                                           current_page=current_page,
+                                           next_cursor=next_page_cursor(last_keys, offset, len(raw_result),
+                                                                        total_greetings),
+                                           greetings=[{"message": message, "type": type_, "created_at": created_at}
+                                                      for message, type_, created_at, _ in raw_result])
 
     return response
 
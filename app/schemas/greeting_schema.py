@@ -1,4 +1,4 @@
-from typing import List, Any, Dict
+from typing import List, Dict, Optional
 from pydantic import BaseModel
 from datetime import datetime
 from app.routers.greeting_types import GreetingType
@@ -17,22 +17,68 @@ class GreetingRequestModel(BaseModel):
     offset: int
 
 
+# A greeting as returned by the endpoints, type is the database value or the category name the client asked for.
+# Endpoints pass plain dicts for the items: pydantic-core validates them into GreetingItem faster than building each
+# item in Python.
+class GreetingItem(BaseModel):
+    message: str
+    type: str
+
+
+class RecentGreetingItem(GreetingItem):
+    created_at: datetime
+
+
 # Structures the data sent back to the user.
 class GreetingResponseModel(BaseModel):
     total_greetings: int
     total_pages: int
     current_page: int
-    greetings: List[Dict[str, Any]]
+    greetings: List[GreetingItem]
+    # Cursor of the following page, None on the last page.
+    next_cursor: Optional[str] = None
+
+
+class RecentGreetingResponseModel(GreetingResponseModel):
+    greetings: List[RecentGreetingItem]
 
 
 class GreetingResponse(BaseModel):
-    greeting: List[Dict[str, Any]]
+    greeting: List[GreetingItem]
 
 
 class TypeResponse(BaseModel):
     types: List[str]
 
 
+# Counts of a single greeting type, monthly_greetings maps "YYYY-MM" to the number of greetings of that month.
+class CategoryStats(BaseModel):
+    category: str
+    total_greetings: int
+    newest_created_at: Optional[datetime] = None
+    monthly_greetings: Dict[str, int]
+
+
+class StatsResponse(BaseModel):
+    total_greetings: int
+    categories: List[CategoryStats]
+
+
+# Outcome of a bulk load, errors describes the first rejected rows.
+class BulkIngestResponse(BaseModel):
+    received: int
+    inserted: int
+    duplicates: int
+    rejected: int
+    errors: List[str]
+
+
+# Completions of the search phrase typed so far, best first.
+class SuggestResponse(BaseModel):
+    query: str
+    suggestions: List[str]
+
+
 #  This defines my greeting table with the additional fields.
 class Greeting(GreetingBase):
     greeting_id: int
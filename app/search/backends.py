@@ -0,0 +1,305 @@
+from abc import ABC, abstractmethod
+from array import array
+from dataclasses import dataclass, field
+from typing import Any, List, Optional, Tuple
+from sqlalchemy import String, bindparam, select, func
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql.elements import ColumnElement
+from sqlalchemy.sql.selectable import Select
+from sqlalchemy.sql.visitors import InternalTraversal
+from app.database.connection import AsyncSessionLocal
+from app.database.events import GreetingChanges, on_greetings_committed
+from app.metrics import instrument_queries
+from app.models.greeting import Greeting
+from app.routers.config import SEARCH_BACKEND, SEARCH_INDEX_REFRESH_SECONDS, SEARCH_IDS_MAX
+from app.search.bm25 import BM25Index
+from app.search.indexer import GreetingIndexer
+from app.search.ranked import RankedIds, cached_ranked_ids, normalize_query
+
+
+@dataclass
+class SearchPage:
+    """
+    A page of search results.
+
+    Attributes:
+        greetings(List[Tuple[str, Optional[str], int]]): (message, type, greeting_id) of the greetings in the page.
+        total(int): The number of greetings matching the search, over all pages.
+    """
+    greetings: List[Tuple[str, Optional[str], int]] = field(default_factory=list)
+    total: int = 0
+
+
+class SearchBackend(ABC):
+    """Runs the full-text searches of the /search endpoint."""
+
+    @abstractmethod
+    async def search(self, db: AsyncSession, query: str, greeting_type: Optional[str], limit: int, offset: int = 0,
+                     after: Optional[List[Any]] = None) -> SearchPage:
+        """
+        Returns a page of the greetings matching a search phrase.
+
+        Args:
+            db (AsyncSession): The database session of the request.
+            query(str): The search phrase.
+            greeting_type(Optional[str]): The database value of the greeting type to search in, all types when None.
+            limit(int): The number of greetings in the page.
+            offset(int): The position of the page in the results, carried by the cursor when one is given.
+            after(Optional[List[Any]]): The cursor keys of the previous page, [greeting_id] of its last greeting.
+                Backends may look that greeting up to find the page again when the results moved, the page starts
+                at `offset` otherwise.
+        """
+
+    @abstractmethod
+    async def count(self, db: AsyncSession, query: str, greeting_type: Optional[str]) -> int:
+        """Returns the number of greetings matching a search phrase, over all pages."""
+
+    async def load(self, session_factory=AsyncSessionLocal) -> None:
+        """Prepares the backend at startup."""
+
+    def start(self, session_factory=AsyncSessionLocal) -> None:
+        """Starts the background work of the backend, if any."""
+
+    async def stop(self) -> None:
+        """Stops the background work of the backend."""
+
+
+class FullTextMatch(ColumnElement):
+    """
+    MATCH (column) AGAINST (phrase IN NATURAL LANGUAGE MODE) on MySQL.
+
+    Other databases have no FULLTEXT index, there it falls back to a case-insensitive test of the phrase being part
+    of the column, so the search endpoints and their tests also run on SQLite.
+    """
+    inherit_cache = True
+    _traverse_internals = [("column", InternalTraversal.dp_clauseelement),
+                           ("phrase", InternalTraversal.dp_clauseelement)]
+
+    def __init__(self, column: ColumnElement, phrase: ColumnElement):
+        self.column = column
+        self.phrase = phrase
+
+
+@compiles(FullTextMatch)
+def compile_full_text_match(element: FullTextMatch, compiler, **kw) -> str:
+    if compiler.dialect.name == "mysql":
+        return f"MATCH ({compiler.process(element.column, **kw)}) " \
+               f"AGAINST ({compiler.process(element.phrase, **kw)} IN NATURAL LANGUAGE MODE)"
+    return compiler.process(func.lower(element.column).contains(func.lower(element.phrase)), **kw)
+
+
+def search_score() -> FullTextMatch:
+    """
+    The relevance of a greeting to the search phrase bound as ':query', MySQL's natural-language score.
+
+    Used in the WHERE clause it keeps the greetings scoring above 0. Databases without a FULLTEXT index score every
+    match the same, their results are then ordered by greeting_id.
+    """
+    return FullTextMatch(Greeting.message, bindparam("query", type_=String))
+
+
+def search_conditions(greeting_type: Optional[str] = None) -> List:
+    """
+    Builds the conditions of a full-text search, the search phrase is bound as the ':query' parameter.
+
+    Args:
+        greeting_type(Optional[str]): The database value of the greeting type to search in, all types when None.
+    """
+    conditions = [search_score()]
+
+    if greeting_type:
+        conditions.append(Greeting.type == greeting_type)
+    return conditions
+
+
+def search_page_query(conditions: List, query: str, limit: int, offset: int = 0) -> Select:
+    """
+    Builds the query of a page of search results, ordered by relevance, then greeting_id.
+
+    Relevance is not a key a cursor can seek past, so pages are taken by position: a cursor of /search carries the
+    position of the next page as its offset.
+
+    Args:
+        conditions(List): The conditions built by search_conditions.
+        query(str): The search phrase.
+        limit(int): The number of greetings in the page.
+        offset(int): The number of greetings to skip.
+
+    Returns:
+        Select: The page query.
+    """
+    return select(Greeting.message, Greeting.type, Greeting.greeting_id) \
+        .select_from(Greeting) \
+        .filter(*conditions) \
+        .order_by(search_score().desc(), Greeting.greeting_id) \
+        .offset(offset) \
+        .limit(limit) \
+        .params(query=query)
+
+
+def search_count_query(conditions: List, query: str) -> Select:
+    """Builds the query counting the greetings matching a search, over all pages."""
+    return select(func.count(Greeting.message)).select_from(Greeting).filter(*conditions).params(query=query)
+
+
+def search_ids_query(conditions: List, query: str, limit: int) -> Select:
+    """
+    Builds the query of the greeting_ids matching a search, with their score, in the order of the results.
+
+    The score is selected and ordered by its label, so MySQL computes it once per row.
+    """
+    score = search_score().label("score")
+    return select(Greeting.greeting_id, score) \
+        .select_from(Greeting) \
+        .filter(*conditions) \
+        .order_by(score.desc(), Greeting.greeting_id) \
+        .limit(limit) \
+        .params(query=query)
+
+
+def greetings_by_id_query(ids: List[int]) -> Select:
+    """Builds the query loading the greetings of a page of search results by primary key."""
+    return select(Greeting.message, Greeting.type, Greeting.greeting_id).filter(Greeting.greeting_id.in_(ids))
+
+
+class FullTextSearch(SearchBackend):
+    """
+    Searches with the MySQL FULLTEXT index of greetings.message, results are ordered by relevance, then greeting_id.
+
+    The first request for a search stores the ids of its results, in that order, in the cache (see
+    app.search.ranked). Later pages and totals are sliced from them by position and only the greetings of the page are
+    loaded, by primary key. A search matching more than SEARCH_IDS_MAX greetings keeps that many ids, pages past them
+    run the full-text query. A page missing greetings deleted since its ids were stored computes them again.
+    """
+
+    async def ranked_ids(self, db: AsyncSession, query: str, greeting_type: Optional[str],
+                         refresh: bool = False) -> RankedIds:
+        """
+        Returns the ids of the greetings matching a normalized search phrase, from the cache unless `refresh` is set.
+        """
+        async def compute() -> RankedIds:
+            conditions = search_conditions(greeting_type)
+            result = await db.execute(search_ids_query(conditions, query, SEARCH_IDS_MAX + 1))
+            ids = array("I", (greeting_id for greeting_id, _ in result.all()))
+            if len(ids) <= SEARCH_IDS_MAX:
+                return RankedIds(ids=ids, total=len(ids))
+            total = await db.execute(search_count_query(conditions, query))
+            return RankedIds(ids=ids[:SEARCH_IDS_MAX], total=total.scalar_one())
+
+        return await cached_ranked_ids(query, greeting_type, compute, refresh)
+
+    @instrument_queries
+    async def search(self, db: AsyncSession, query: str, greeting_type: Optional[str], limit: int, offset: int = 0,
+                     after: Optional[List[Any]] = None) -> SearchPage:
+        query = normalize_query(query)
+        ranked = await self.ranked_ids(db, query, greeting_type)
+        greetings, complete = await self._page(db, ranked, query, greeting_type, limit, offset, after)
+        if not complete:
+            # Greetings were deleted since the ids were stored, and the total still counts them: the ids are computed
+            # again, so the page and the total agree.
+            ranked = await self.ranked_ids(db, query, greeting_type, refresh=True)
+            greetings, _ = await self._page(db, ranked, query, greeting_type, limit, offset, after)
+
+        return SearchPage(greetings=greetings, total=ranked.total)
+
+    @staticmethod
+    async def _page(db: AsyncSession, ranked: RankedIds, query: str, greeting_type: Optional[str], limit: int,
+                    offset: int, after: Optional[List[Any]]) -> Tuple[List[Tuple[str, str, int]], bool]:
+        """
+        Loads a page of results: by primary key from the ids of `ranked`, or with the full-text query past the ids
+        kept. Also returns whether every greeting of the ids was found.
+        """
+        page_ids = ranked.page(limit, offset, after)
+        if page_ids is None:
+            result = await db.execute(search_page_query(search_conditions(greeting_type), query, limit, offset))
+            return [(message, type_, greeting_id) for message, type_, greeting_id in result.all()], True
+        if not page_ids:
+            return [], True
+
+        result = await db.execute(greetings_by_id_query(page_ids))
+        rows = {greeting_id: (message, type_, greeting_id) for message, type_, greeting_id in result.all()}
+        greetings = [rows[greeting_id] for greeting_id in page_ids if greeting_id in rows]
+        return greetings, len(greetings) == len(page_ids)
+
+    @instrument_queries
+    async def count(self, db: AsyncSession, query: str, greeting_type: Optional[str]) -> int:
+        ranked = await self.ranked_ids(db, normalize_query(query), greeting_type)
+        return ranked.total
+
+
+class MemorySearch(GreetingIndexer[BM25Index], SearchBackend):
+    """
+    Searches an in-process BM25 index of every greeting, results are ordered by relevance.
+
+    Until the index has been built, searches go to the `fallback` backend.
+
+    Args:
+        fallback(SearchBackend): Used while the index is not built.
+        refresh_interval(int): The number of seconds between two rebuilds of the index.
+    """
+
+    def __init__(self, fallback: SearchBackend, refresh_interval: int = SEARCH_INDEX_REFRESH_SECONDS):
+        super().__init__("search-index-refresh", BM25Index, refresh_interval)
+        self.fallback = fallback
+
+    @instrument_queries
+    async def search(self, db: AsyncSession, query: str, greeting_type: Optional[str], limit: int, offset: int = 0,
+                     after: Optional[List[Any]] = None) -> SearchPage:
+        if not self._loaded:
+            return await self.fallback.search(db, query, greeting_type, limit, offset, after)
+
+        index = self.index
+        ranked = index.search(query, greeting_type)
+
+        # The cursor holds the last greeting of the previous page, the offset it carries is used if that greeting
+        # is no longer part of the results.
+        start = offset
+        if after is not None:
+            try:
+                start = ranked.index(after[0]) + 1
+            except ValueError:
+                pass
+
+        greetings = []
+        for greeting_id in ranked[start:start + limit]:
+            greeting_type_, message = index.document(greeting_id)
+            greetings.append((message, greeting_type_, greeting_id))
+        return SearchPage(greetings=greetings, total=len(ranked))
+
+    @instrument_queries
+    async def count(self, db: AsyncSession, query: str, greeting_type: Optional[str]) -> int:
+        if not self._loaded:
+            return await self.fallback.count(db, query, greeting_type)
+        return len(self.index.search(query, greeting_type))
+
+
+def create_search_backend(name: str) -> SearchBackend:
+    """
+    Creates the search backend selected by the SEARCH_BACKEND setting.
+
+    Args:
+        name(str): 'mysql' for the FULLTEXT index, 'memory' for the in-process BM25 index.
+
+    Raises:
+        ValueError: if the name is not a known backend.
+    """
+    if name == "mysql":
+        return FullTextSearch()
+    if name == "memory":
+        return MemorySearch(fallback=FullTextSearch())
+    raise ValueError(f"Unknown search backend {name!r}, expected 'mysql' or 'memory'.")
+
+
+search_backend = create_search_backend(SEARCH_BACKEND)
+
+
+def get_search_backend() -> SearchBackend:
+    """Returns the search backend in use."""
+    return search_backend
+
+
+@on_greetings_committed
+def update_search_index(changes: GreetingChanges) -> None:
+    if isinstance(search_backend, MemorySearch):
+        search_backend.apply(changes)
@@ -0,0 +1,116 @@
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+# Words shorter than this are not indexed, the same default as the InnoDB FULLTEXT index (innodb_ft_min_token_size).
+MIN_TOKEN_LENGTH = 3
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Splits a text into lower cased words, dropping the ones shorter than MIN_TOKEN_LENGTH."""
+    if not text:
+        return []
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if len(token) >= MIN_TOKEN_LENGTH]
+
+
+class BM25Index:
+    """
+    Inverted index of greeting messages, ranking matches with Okapi BM25.
+
+    Every word of a message maps to the greetings containing it and the number of times it occurs there. A greeting
+    matches a search when it contains at least one of the searched words, as in MySQL natural language mode.
+
+    Args:
+        k1(float): How quickly repeated occurrences of a word stop adding to the score.
+        b(float): How much the score is normalised by the length of the message, from 0 (not at all) to 1.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self._documents: Dict[int, Tuple[Optional[str], str, int]] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def __contains__(self, greeting_id: int) -> bool:
+        return greeting_id in self._documents
+
+    def add(self, greeting_id: int, greeting_type: Optional[str], message: Optional[str]) -> None:
+        """
+        Indexes a greeting, replacing the previous version of it if it was indexed already.
+
+        Args:
+            greeting_id(int): The id of the greeting.
+            greeting_type(Optional[str]): The database value of its type.
+            message(Optional[str]): Its message.
+        """
+        self.remove(greeting_id)
+
+        tokens = tokenize(message)
+        for token, frequency in Counter(tokens).items():
+            self._postings[token][greeting_id] = frequency
+
+        self._documents[greeting_id] = (greeting_type, message or "", len(tokens))
+        self._total_length += len(tokens)
+
+    def remove(self, greeting_id: int) -> None:
+        """Removes a greeting from the index, if it is indexed."""
+        document = self._documents.pop(greeting_id, None)
+        if document is None:
+            return
+
+        _, message, length = document
+        for token in set(tokenize(message)):
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.pop(greeting_id, None)
+                if not postings:
+                    del self._postings[token]
+        self._total_length -= length
+
+    def build(self) -> None:
+        """Nothing to precompute, the scores are computed by each search."""
+
+    def document(self, greeting_id: int) -> Tuple[Optional[str], str]:
+        """Returns the type and message of an indexed greeting."""
+        greeting_type, message, _ = self._documents[greeting_id]
+        return greeting_type, message
+
+    def search(self, query: str, greeting_type: Optional[str] = None) -> List[int]:
+        """
+        Finds the greetings matching a search phrase.
+
+        Args:
+            query(str): The search phrase.
+            greeting_type(Optional[str]): The database value of the greeting type to search in, all types when None.
+
+        Returns:
+            List[int]: The ids of the matching greetings, best match first and by greeting_id on equal scores.
+        """
+        document_count = len(self._documents)
+        if not document_count:
+            return []
+
+        average_length = self._total_length / document_count or 1
+        scores: Dict[int, float] = defaultdict(float)
+
+        for token in set(tokenize(query)):
+            postings = self._postings.get(token)
+            if not postings:
+                continue
+
+            idf = math.log(1 + (document_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for greeting_id, frequency in postings.items():
+                document_type, _, length = self._documents[greeting_id]
+                if greeting_type is not None and document_type != greeting_type:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * length / average_length)
+                scores[greeting_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+        return sorted(scores, key=lambda greeting_id: (-scores[greeting_id], greeting_id))
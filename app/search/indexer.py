@@ -0,0 +1,105 @@
+from typing import Callable, Generic, List, Optional, Protocol, TypeVar
+from sqlalchemy import select
+from app.background import PeriodicTask
+from app.database.connection import AsyncSessionLocal
+from app.database.events import GreetingChanges
+from app.models.greeting import Greeting
+from app.routers.config import SEARCH_INDEX_REFRESH_SECONDS
+
+
+class GreetingIndex(Protocol):
+    def add(self, greeting_id: int, greeting_type: Optional[str], message: Optional[str]) -> None: ...
+
+    def remove(self, greeting_id: int) -> None: ...
+
+    def build(self) -> None: ...
+
+
+IndexT = TypeVar("IndexT", bound=GreetingIndex)
+
+
+class GreetingIndexer(Generic[IndexT]):
+    """
+    Keeps an in-process index of every greeting up to date.
+
+    The index is filled from the greetings table by `load`, which then calls its `build` to precompute what its
+    lookups need, and is kept up to date with the greetings committed by this
+    worker through `apply`. A periodic rebuild picks up greetings written by other workers or outside the
+    application.
+
+    Args:
+        name(str): Name of the background rebuild task.
+        index_factory(Callable[[], IndexT]): Creates an empty index.
+        refresh_interval(int): The number of seconds between two rebuilds.
+    """
+
+    def __init__(self, name: str, index_factory: Callable[[], IndexT],
+                 refresh_interval: int = SEARCH_INDEX_REFRESH_SECONDS):
+        self.name = name
+        self.index_factory = index_factory
+        self.refresh_interval = refresh_interval
+        self.index: IndexT = index_factory()
+        self._loaded = False
+        self._changes_while_loading: Optional[List[GreetingChanges]] = None
+        self._refresher: Optional[PeriodicTask] = None
+
+    @property
+    def loaded(self) -> bool:
+        """True once the index has been built at least once."""
+        return self._loaded
+
+    async def load(self, session_factory=AsyncSessionLocal) -> None:
+        """
+        Builds (or rebuilds) the index from the greetings table.
+
+        The new index is built aside and swapped in at once. Changes committed while it is built are applied to it
+        before the swap, so none of them are lost.
+        """
+        index = self.index_factory()
+        self._changes_while_loading = []
+
+        try:
+            async with session_factory() as db:
+                result = await db.stream(select(Greeting.greeting_id, Greeting.type, Greeting.message)
+                                         .execution_options(yield_per=1000))
+                async for greeting_id, greeting_type, message in result:
+                    index.add(greeting_id, greeting_type, message)
+            index.build()
+
+            for changes in self._changes_while_loading:
+                self._apply(index, changes)
+        finally:
+            self._changes_while_loading = None
+
+        self.index = index
+        self._loaded = True
+
+    @staticmethod
+    def _apply(index: IndexT, changes: GreetingChanges) -> None:
+        for greeting_id in changes.removed:
+            index.remove(greeting_id)
+        for greeting_id, greeting_type, message in changes.added:
+            index.add(greeting_id, greeting_type, message)
+
+    def apply(self, changes: GreetingChanges) -> None:
+        """Updates the index with committed changes."""
+        if self._changes_while_loading is not None:
+            self._changes_while_loading.append(changes)
+        if self._loaded:
+            self._apply(self.index, changes)
+
+    def clear(self) -> None:
+        """Empties the index, until it is loaded again."""
+        self.index = self.index_factory()
+        self._loaded = False
+
+    def start(self, session_factory=AsyncSessionLocal) -> None:
+        """Starts the background rebuild task, if it is not running already."""
+        if self._refresher is None:
+            self._refresher = PeriodicTask(self.name, self.refresh_interval, lambda: self.load(session_factory))
+        self._refresher.start()
+
+    async def stop(self) -> None:
+        """Cancels the background rebuild task."""
+        if self._refresher is not None:
+            await self._refresher.stop()
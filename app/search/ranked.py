@@ -0,0 +1,120 @@
+import hashlib
+import logging
+import struct
+import sys
+import time
+from array import array
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional
+from fastapi_cache import FastAPICache
+from app.cache.versions import category_versions, GLOBAL_VERSION
+from app.routers.config import SEARCH_IDS_TTL
+from app.timing import add_cache_time
+
+logger = logging.getLogger(__name__)
+
+# Packed lists start with the number of matches, the ids follow as little-endian unsigned 32 bit integers.
+_HEADER = struct.Struct("<Q")
+_ID_TYPECODE = "I"
+
+
+def normalize_query(query: str) -> str:
+    """Lowercases a search phrase and collapses its whitespace, phrases differing only by those share their ids."""
+    return " ".join(query.lower().split())
+
+
+@dataclass
+class RankedIds:
+    """
+    The greeting_ids of the greetings matching a search, in the order of the results: by relevance, then greeting_id.
+
+    Attributes:
+        ids(array): The ids of the first results, all of them unless there are more than SEARCH_IDS_MAX.
+        total(int): The number of greetings matching the search, over all pages.
+    """
+    ids: array
+    total: int
+
+    def pack(self) -> bytes:
+        ids = self.ids
+        if sys.byteorder == "big":
+            ids = array(_ID_TYPECODE, ids)
+            ids.byteswap()
+        return _HEADER.pack(self.total) + ids.tobytes()
+
+    @classmethod
+    def unpack(cls, data: bytes) -> "RankedIds":
+        (total,) = _HEADER.unpack_from(data)
+        ids = array(_ID_TYPECODE)
+        ids.frombytes(data[_HEADER.size:])
+        if sys.byteorder == "big":
+            ids.byteswap()
+        return cls(ids=ids, total=total)
+
+    def page(self, limit: int, offset: int = 0, after: Optional[List[int]] = None) -> Optional[List[int]]:
+        """
+        Returns the ids of a page of results.
+
+        Args:
+            limit(int): The number of greetings in the page.
+            offset(int): The position of the page, used when `after` is None or no longer part of the results.
+            after(Optional[List[int]]): The cursor keys of the previous page, [greeting_id].
+
+        Returns:
+            Optional[List[int]]: The ids of the page, None when the page goes past the ids kept.
+        """
+        # Relevance is not ordered by id, so the last greeting of the previous page is looked up, not bisected.
+        start = offset
+        if after is not None:
+            try:
+                start = self.ids.index(after[0]) + 1
+            except ValueError:
+                pass
+        if start + limit > len(self.ids) and len(self.ids) < self.total:
+            return None
+        return self.ids[start:start + limit].tolist()
+
+
+async def cached_ranked_ids(query: str, greeting_type: Optional[str], compute: Callable[[], Awaitable[RankedIds]],
+                            refresh: bool = False) -> RankedIds:
+    """
+    Returns the ids matching a search from the cache, computing and storing them on a miss.
+
+    The ids are stored packed, 4 bytes per greeting. Like the page keys, the key holds the version of the category,
+    so writing greetings to it makes the next search compute its ids again.
+
+    Args:
+        query(str): The normalized search phrase.
+        greeting_type(Optional[str]): The database value of the greeting type searched in, all types when None.
+        compute(Callable): Runs the search.
+        refresh(bool): Runs the search even when its ids are cached, replacing them.
+
+    Returns:
+        RankedIds: The ids matching the search.
+    """
+    if not FastAPICache.get_enable():
+        return await compute()
+
+    backend = FastAPICache.get_backend()
+    start = time.perf_counter()
+    [version] = await category_versions.get([greeting_type or GLOBAL_VERSION])
+    digest = hashlib.md5(f"{greeting_type}:{query}".encode()).hexdigest()  # nosec
+    key = f"{FastAPICache.get_prefix()}:search-ids:v{version}:{digest}"
+    cached = None
+    if not refresh:
+        try:
+            cached = await backend.get(key)
+        except Exception:  # pylint: disable=broad-except
+            logger.warning("Error retrieving cache key '%s' from backend:", key, exc_info=True)
+    add_cache_time(time.perf_counter() - start)
+    if cached is not None:
+        return RankedIds.unpack(cached)
+
+    ranked = await compute()
+    start = time.perf_counter()
+    try:
+        await backend.set(key, ranked.pack(), SEARCH_IDS_TTL)
+    except Exception:  # pylint: disable=broad-except
+        logger.warning("Error setting cache key '%s' in backend:", key, exc_info=True)
+    add_cache_time(time.perf_counter() - start)
+    return ranked
@@ -0,0 +1,235 @@
+import bisect
+import heapq
+from typing import Dict, Iterator, List, Optional, Tuple
+from app.database.events import GreetingChanges, on_greetings_committed
+from app.routers.config import SUGGEST_MAX_RESULTS
+from app.search.bm25 import tokenize
+from app.search.indexer import GreetingIndexer
+
+# Prefixes shorter than this are only completed exactly, a typo in one or two letters matches almost any word.
+MIN_FUZZY_PREFIX_LENGTH = 3
+
+
+class TrieNode:
+    __slots__ = ("children", "count", "top")
+
+    def __init__(self):
+        self.children: Dict[str, "TrieNode"] = {}
+        # Number of greetings containing the word ending at this node.
+        self.count = 0
+        # The most frequent words starting with the prefix of this node as (-count, word), best first.
+        self.top: List[Tuple[int, str]] = []
+
+
+class WordTrie:
+    """
+    Trie of the words of the greetings of one scope, counting how many greetings contain each word.
+
+    Every node keeps the `max_results` most frequent words starting with its prefix, so completing a prefix costs
+    a walk down the trie. The lists are built bottom-up by `build` once the trie is filled, then kept up to date by
+    `update`: the new count of a word is merged into the lists along its path, and a list is only rebuilt from the
+    lists of its children when one of its words may have dropped out of it.
+
+    Args:
+        max_results(int): The number of completions kept per node.
+    """
+
+    def __init__(self, max_results: int = SUGGEST_MAX_RESULTS):
+        self.max_results = max_results
+        self.root = TrieNode()
+        # Whether the lists are built, until then updates only change the counts.
+        self.built = False
+
+    def update(self, word: str, count: int) -> None:
+        """Adds `count` (negative to remove) greetings containing `word`."""
+        path = [self.root]
+        for char in word:
+            path.append(path[-1].children.setdefault(char, TrieNode()))
+        old_count = path[-1].count
+        new_count = path[-1].count = max(old_count + count, 0)
+
+        if self.built and new_count != old_count:
+            # Children first, a list rebuilt from them needs theirs up to date.
+            for depth in range(len(word), -1, -1):
+                self._merge(path[depth], word[:depth], word, old_count, new_count)
+
+    def _merge(self, node: TrieNode, prefix: str, word: str, old_count: int, new_count: int) -> None:
+        """Moves `word` in the list of `node`, one of its prefixes, from `old_count` to `new_count`."""
+        top = node.top
+        full = len(top) >= self.max_results
+        listed = old_count > 0 and (-old_count, word) in top
+        if listed:
+            top.remove((-old_count, word))
+
+        if new_count > old_count:
+            if listed or not full or (-new_count, word) < top[-1]:
+                bisect.insort(top, (-new_count, word))
+                del top[self.max_results:]
+        elif listed:
+            if new_count:
+                bisect.insort(top, (-new_count, word))
+            # A word that is not listed may now rank above the last one, or fill the freed place.
+            if full and (not new_count or top[-1] == (-new_count, word)):
+                node.top = self._rebuilt(node, prefix)
+
+    def _rebuilt(self, node: TrieNode, prefix: str) -> List[Tuple[int, str]]:
+        """The list of `node` from the lists of its children, which hold every word that can make it."""
+        words = [entry for child in node.children.values() for entry in child.top]
+        if node.count:
+            words.append((-node.count, prefix))
+        return heapq.nsmallest(self.max_results, words)
+
+    def build(self) -> None:
+        """Builds the list of every node, children first."""
+        stack = [(self.root, "", False)]
+        while stack:
+            node, prefix, children_built = stack.pop()
+            if children_built:
+                node.top = self._rebuilt(node, prefix)
+            else:
+                stack.append((node, prefix, True))
+                stack.extend((child, prefix + char, False) for char, child in node.children.items())
+        self.built = True
+
+    def find(self, prefix: str) -> Optional[TrieNode]:
+        """Returns the node of a prefix, None if no word starts with it."""
+        node = self.root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node
+
+    def fuzzy_find(self, prefix: str) -> Iterator[Tuple[TrieNode, str]]:
+        """
+        Yields the nodes of every prefix within one edit of `prefix`: a letter deleted, inserted, replaced, or two
+        neighbouring letters swapped. Each node is yielded with its prefix.
+        """
+        # (node, path, position in prefix, edit still allowed)
+        stack = [(self.root, "", 0, True)]
+        while stack:
+            node, path, position, can_edit = stack.pop()
+            if position == len(prefix):
+                yield node, path
+                continue
+
+            char = prefix[position]
+            child = node.children.get(char)
+            if child is not None:
+                stack.append((child, path + char, position + 1, can_edit))
+
+            if not can_edit:
+                continue
+
+            # Deletion: the letter at `position` is a typo.
+            stack.append((node, path, position + 1, False))
+            for other, other_child in node.children.items():
+                # Insertion: a letter is missing from the prefix.
+                stack.append((other_child, path + other, position, False))
+                if other != char:
+                    # Substitution.
+                    stack.append((other_child, path + other, position + 1, False))
+
+            # Transposition of the letters at `position` and `position + 1`.
+            if position + 1 < len(prefix):
+                swapped = node.children.get(prefix[position + 1])
+                if swapped is not None and char in swapped.children:
+                    stack.append((swapped.children[char], path + prefix[position + 1] + char, position + 2, False))
+
+    def top(self, node: TrieNode) -> List[Tuple[int, str]]:
+        """Returns the most frequent words starting with the prefix of `node`, as (-count, word), best first."""
+        if not self.built:
+            self.build()
+        return node.top
+
+
+class SuggestionIndex:
+    """
+    Completes partial words with the words used in greeting messages, with one trie per greeting type and one over
+    every type.
+
+    Args:
+        max_results(int): The maximum number of suggestions that can be asked for.
+    """
+
+    def __init__(self, max_results: int = SUGGEST_MAX_RESULTS):
+        self.max_results = max_results
+        self._tries: Dict[Optional[str], WordTrie] = {}
+        self._greetings: Dict[int, Tuple[Optional[str], Tuple[str, ...]]] = {}
+        self._built = False
+
+    def _trie(self, scope: Optional[str]) -> WordTrie:
+        trie = self._tries.get(scope)
+        if trie is None:
+            trie = self._tries[scope] = WordTrie(self.max_results)
+            trie.built = self._built
+        return trie
+
+    def build(self) -> None:
+        """Builds the completion lists of every trie, once the greetings are added."""
+        for trie in self._tries.values():
+            trie.build()
+        self._built = True
+
+    def _update(self, greeting_type: Optional[str], words: Tuple[str, ...], count: int) -> None:
+        for scope in {None, greeting_type}:
+            trie = self._trie(scope)
+            for word in words:
+                trie.update(word, count)
+
+    def add(self, greeting_id: int, greeting_type: Optional[str], message: Optional[str]) -> None:
+        """Adds the words of a greeting, replacing the previous version of it if it was added already."""
+        self.remove(greeting_id)
+        words = tuple(set(tokenize(message)))
+        self._greetings[greeting_id] = (greeting_type, words)
+        self._update(greeting_type, words, 1)
+
+    def remove(self, greeting_id: int) -> None:
+        """Removes the words of a greeting, if it was added."""
+        greeting = self._greetings.pop(greeting_id, None)
+        if greeting is not None:
+            self._update(*greeting, -1)
+
+    def suggest(self, prefix: str, greeting_type: Optional[str] = None, limit: int = 10) -> List[str]:
+        """
+        Completes a partial word.
+
+        Words starting with `prefix` come first, most frequent first. When they are fewer than `limit`, the list is
+        topped up with completions of prefixes one typo away.
+
+        Args:
+            prefix(str): The partial word, lower cased.
+            greeting_type(Optional[str]): The database value of the greeting type to take words from, all types
+                when None.
+            limit(int): The maximum number of words returned, at most `max_results`.
+
+        Returns:
+            List[str]: The completed words.
+        """
+        trie = self._tries.get(greeting_type)
+        if trie is None or not prefix:
+            return []
+
+        limit = min(limit, self.max_results)
+        node = trie.find(prefix)
+        suggestions = [word for _, word in trie.top(node)[:limit]] if node is not None else []
+
+        if len(suggestions) < limit and len(prefix) >= MIN_FUZZY_PREFIX_LENGTH:
+            candidates = {}
+            for fuzzy_node, _ in trie.fuzzy_find(prefix):
+                for negative_count, word in trie.top(fuzzy_node):
+                    candidates[word] = negative_count
+            seen = set(suggestions)
+            fuzzy = heapq.nsmallest(limit - len(suggestions),
+                                    ((count, word) for word, count in candidates.items() if word not in seen))
+            suggestions += [word for _, word in fuzzy]
+
+        return suggestions
+
+
+suggestions = GreetingIndexer("suggestion-index-refresh", SuggestionIndex)
+
+
+@on_greetings_committed
+def update_suggestions(changes: GreetingChanges) -> None:
+    suggestions.apply(changes)
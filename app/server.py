@@ -0,0 +1,45 @@
+import asyncio
+import logging
+from types import FrameType
+from typing import Optional
+import uvicorn
+from app.lifecycle import lifecycle
+from app.routers.config import SHUTDOWN_DRAIN_SECONDS, SHUTDOWN_PRESTOP_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class Server(uvicorn.Server):
+    """
+    A uvicorn server that keeps serving for a while after the shutdown signal, reporting itself as draining.
+
+    uvicorn stops accepting connections as soon as it gets SIGTERM, so a load balancer only learns the worker is gone
+    from refused connections. This server first flips /healthz/ready to 503 and goes on serving for `prestop` seconds,
+    long enough for the load balancer to take it out of rotation, then shuts down like uvicorn: it stops accepting
+    connections, waits up to `timeout_graceful_shutdown` for the in-flight requests, and runs the lifespan shutdown.
+
+    A second signal, or a signal before the worker is ready, shuts it down at once.
+
+    Args:
+        config(uvicorn.Config): The configuration of the server.
+        prestop(float): The number of seconds to keep serving after the shutdown signal.
+    """
+
+    def __init__(self, config: uvicorn.Config, prestop: float = SHUTDOWN_PRESTOP_SECONDS):
+        super().__init__(config)
+        self.prestop = prestop
+
+    def handle_exit(self, sig: int, frame: Optional[FrameType]) -> None:
+        if not lifecycle.ready or self.prestop <= 0:
+            super().handle_exit(sig, frame)
+            return
+
+        logger.info("Draining for %.0f seconds before shutting down.", self.prestop)
+        lifecycle.start_draining()
+        asyncio.get_event_loop().call_later(self.prestop, super().handle_exit, sig, frame)
+
+
+def serve(host: str, port: int) -> None:
+    """Serves the API on one worker process, shutting down gracefully on SIGTERM."""
+    config = uvicorn.Config("app.main:app", host=host, port=port, timeout_graceful_shutdown=SHUTDOWN_DRAIN_SECONDS)
+    Server(config).run()
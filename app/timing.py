@@ -0,0 +1,144 @@
+import asyncio
+import json
+import logging
+import time
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Callable, Coroutine, Optional
+from fastapi.routing import APIRoute
+from starlette.datastructures import MutableHeaders
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.routers.config import SLOW_QUERY_SECONDS
+
+slow_query_logger = logging.getLogger("app.slow_queries")
+
+# Longest statement text and parameters written to the slow-query log, a multi-row INSERT can be megabytes long.
+MAX_LOGGED_LENGTH = 4096
+
+
+class RequestTimings:
+    """Time spent by the current request on the database, the cache and rendering the response, in seconds."""
+
+    __slots__ = ("db", "queries", "cache", "render")
+
+    def __init__(self):
+        self.db = 0.0
+        self.queries = 0
+        self.cache = 0.0
+        self.render = 0.0
+
+    def header(self, total: float) -> str:
+        """Formats the timings as a Server-Timing header value, durations in milliseconds."""
+        return f'db;dur={self.db * 1000:.2f};desc="{self.queries} queries", cache;dur={self.cache * 1000:.2f}, ' \
+               f'render;dur={self.render * 1000:.2f}, total;dur={total * 1000:.2f}'
+
+
+# Timings of the request being served, None outside of requests.
+_timings: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def add_cache_time(seconds: float) -> None:
+    """Adds time spent talking to the cache to the current request."""
+    timings = _timings.get()
+    if timings is not None:
+        timings.cache += seconds
+
+
+def add_render_time(seconds: float) -> None:
+    """Adds time spent validating and encoding the response to the current request."""
+    timings = _timings.get()
+    if timings is not None:
+        timings.render += seconds
+
+
+def _truncate(value: str) -> str:
+    return value if len(value) <= MAX_LOGGED_LENGTH else value[:MAX_LOGGED_LENGTH] + "..."
+
+
+def record_query(statement: str, parameters: Any, executemany: bool, elapsed: float, function: str) -> None:
+    """
+    Adds a statement to the timings of the current request, and writes it to the slow-query log when it took
+    SLOW_QUERY_SECONDS or more.
+
+    The log record is a JSON object with the duration, the function running the query, its SQL text and parameters.
+    """
+    timings = _timings.get()
+    if timings is not None:
+        timings.db += elapsed
+        timings.queries += 1
+
+    if SLOW_QUERY_SECONDS and elapsed >= SLOW_QUERY_SECONDS:
+        slow_query_logger.warning("%s", json.dumps({
+            "duration_ms": round(elapsed * 1000, 2),
+            "function": function,
+            "statement": _truncate(statement),
+            "parameters": _truncate(repr(parameters)),
+            "executemany": executemany,
+        }))
+
+
+class ServerTimingMiddleware:
+    """
+    Adds a Server-Timing header to every response, splitting the time spent on the request into db, cache and
+    render, with the total.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        timings = RequestTimings()
+        token = _timings.set(timings)
+
+        async def send_with_timings(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", timings.header(time.perf_counter() - start))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timings)
+        finally:
+            _timings.reset(token)
+
+
+class TimedRoute(APIRoute):
+    """
+    Route recording the time FastAPI spends validating and encoding the value returned by the endpoint, as the
+    render time of the Server-Timing header.
+
+    It is the time spent by the route outside of the endpoint function, the dependencies are included but they only
+    parse the request.
+    """
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        endpoint = self.dependant.call
+        if asyncio.iscoroutinefunction(endpoint):
+            @wraps(endpoint)
+            async def timed_endpoint(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await endpoint(*args, **kwargs)
+                finally:
+                    # Taken back from the render time below, which measures the whole route.
+                    add_render_time(start - time.perf_counter())
+
+            self.dependant.call = timed_endpoint
+
+        handler = super().get_route_handler()
+
+        async def timed_handler(request: Request) -> Response:
+            start = time.perf_counter()
+            try:
+                return await handler(request)
+            finally:
+                add_render_time(time.perf_counter() - start)
+
+        return timed_handler
@@ -0,0 +1,69 @@
+"""
+Measures what the Prometheus instrumentation adds to a request: the metrics middleware, the timing of one SQL
+statement and one cache lookup counter.
+
+Run with: python -m benchmarks.bench_metrics
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+from app.metrics import MetricsMiddleware, _after_cursor_execute, _before_cursor_execute, cache_counters
+
+ROUNDS = 20_000
+
+
+async def endpoint(scope, receive, send) -> None:
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def receive():
+    return {"type": "http.request", "body": b""}
+
+
+async def send(message) -> None:
+    pass
+
+
+async def per_request(app, route) -> float:
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        await app({"type": "http", "method": "GET", "path": "/v1/greetings/", "route": route}, receive, send)
+    return (time.perf_counter() - start) / ROUNDS
+
+
+def per_query() -> float:
+    conn = SimpleNamespace(info={})
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        _before_cursor_execute(conn, None, "SELECT 1", None, None, False)
+        _after_cursor_execute(conn, None, "SELECT 1", None, None, False)
+    return (time.perf_counter() - start) / ROUNDS
+
+
+def per_cache_lookup() -> float:
+    hits, _, _ = cache_counters("bench")
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        hits.inc()
+    return (time.perf_counter() - start) / ROUNDS
+
+
+def main() -> None:
+    route = SimpleNamespace(path="/v1/greetings/")
+    loop = asyncio.new_event_loop()
+    bare = min(loop.run_until_complete(per_request(endpoint, route)) for _ in range(5))
+    instrumented = min(loop.run_until_complete(per_request(MetricsMiddleware(endpoint), route)) for _ in range(5))
+    loop.close()
+
+    query = min(per_query() for _ in range(5))
+    cache_lookup = min(per_cache_lookup() for _ in range(5))
+
+    print(f"microseconds added (best of 5 x {ROUNDS}):")
+    print(f"  {'metrics middleware, per request':<35} {(instrumented - bare) * 1e6:8.2f}")
+    print(f"  {'statement timing, per query':<35} {query * 1e6:8.2f}")
+    print(f"  {'cache counter, per lookup':<35} {cache_lookup * 1e6:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
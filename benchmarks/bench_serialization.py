@@ -0,0 +1,93 @@
+"""
+Compares the cost of turning a page of 100 greetings into a response body, before and after the typed response
+models, ORJSONResponse and the encoded body cache.
+
+Run with: python -m benchmarks.bench_serialization
+"""
+import asyncio
+import timeit
+from typing import Any, Dict, List, Optional
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from fastapi_cache.coder import JsonCoder
+from pydantic import BaseModel
+from starlette.responses import Response
+from app.cache.coder import ResponseCoder
+from app.schemas.greeting_schema import GreetingResponseModel
+
+ITEMS = 100
+ROUNDS = 2000
+
+
+# The response model as it was, with untyped greetings.
+class UntypedGreetingResponseModel(BaseModel):
+    total_greetings: int
+    total_pages: int
+    current_page: int
+    greetings: List[Dict[str, Any]]
+    next_cursor: Optional[str] = None
+
+
+def page_values() -> Dict[str, Any]:
+    return {"total_greetings": 1000, "total_pages": 10, "current_page": 1, "next_cursor": "eyJhZnRlciI6WzEwMF19"}
+
+
+def messages() -> List[str]:
+    return [f"Happy birthday, dad! Wishing you a wonderful day number {i} full of joy and laughter." for i in
+            range(ITEMS)]
+
+
+async def render(field, content, response_class) -> bytes:
+    """What FastAPI does with the value returned by an endpoint: validate it against the response model, then
+    encode it with the response class."""
+    value = await serialize_response(field=field, response_content=content)
+    return response_class(value).body
+
+
+def main() -> None:
+    loop = asyncio.new_event_loop()
+    untyped_field = create_response_field("untyped", UntypedGreetingResponseModel)
+    typed_field = create_response_field("typed", GreetingResponseModel)
+    texts = messages()
+
+    def before_miss() -> bytes:
+        model = UntypedGreetingResponseModel(**page_values(), greetings=[
+            {"message": message, "type": "birthday-to-dad-messages"} for message in texts])
+        return loop.run_until_complete(render(untyped_field, model, JSONResponse))
+
+    def after_uncached() -> bytes:
+        model = GreetingResponseModel(**page_values(), greetings=[
+            {"message": message, "type": "birthday-to-dad-messages"} for message in texts])
+        return loop.run_until_complete(render(typed_field, model, ORJSONResponse))
+
+    def after_miss() -> bytes:
+        model = GreetingResponseModel(**page_values(), greetings=[
+            {"message": message, "type": "birthday-to-dad-messages"} for message in texts])
+        return Response(ResponseCoder.encode(model), media_type="application/json").body
+
+    stored_json = JsonCoder.encode(UntypedGreetingResponseModel(**page_values(), greetings=[
+        {"message": message, "type": "birthday-to-dad-messages"} for message in texts]))
+    stored_body = ResponseCoder.encode(GreetingResponseModel(**page_values(), greetings=[
+        {"message": message, "type": "birthday-to-dad-messages"} for message in texts]))
+
+    def before_hit() -> bytes:
+        return loop.run_until_complete(render(untyped_field, JsonCoder.decode(stored_json), JSONResponse))
+
+    def after_hit() -> bytes:
+        return Response(ResponseCoder.decode(stored_body), media_type="application/json").body
+
+    print(f"{ITEMS} greetings per response, microseconds per response (best of 5 x {ROUNDS}):")
+    for name, func in [("miss, before (dicts + JSONResponse)", before_miss),
+                       ("miss, typed items + ORJSONResponse", after_uncached),
+                       ("miss, typed items encoded once by the cache", after_miss),
+                       ("hit, before (decode + validate + encode)", before_hit),
+                       ("hit, encoded body", after_hit)]:
+        best = min(timeit.repeat(func, number=ROUNDS, repeat=5)) / ROUNDS
+        print(f"  {name:<45} {best * 1e6:8.1f}")
+
+    loop.close()
+
+
+if __name__ == "__main__":
+    main()
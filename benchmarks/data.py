@@ -0,0 +1,133 @@
+"""
+Generates synthetic greetings for the benchmarks.
+
+The greeting types follow a Zipf distribution, a few popular categories hold most of the greetings as they do in
+production, and the created_at dates spread over the past years with more greetings in the recent months, as a
+growing table would have.
+
+Fill a database with: python -m benchmarks.data --rows 1000000 --database-url mysql+aiomysql://...
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List
+
+# Words the generated messages are made of, also used by the load tests to build search and suggest queries.
+WORDS = ("happy", "birthday", "wishing", "wonderful", "morning", "sunshine", "love", "christmas", "merry", "family",
+         "friend", "brother", "sister", "laughter", "blessings", "memories", "special", "joyful", "celebrate",
+         "forever", "grateful", "dreams", "smile", "cheers", "warmest", "holiday", "sparkle", "adventure")
+
+# Exponent of the Zipf distribution of the greeting types, the most common type has about 6 times the greetings of
+# the least common one.
+TYPE_SKEW = 0.7
+
+
+def make_message(rng: random.Random, index: int) -> str:
+    """A message of 6 to 14 distinct words, made unique by its index so its message_hash is unique too."""
+    words = rng.sample(WORDS, rng.randint(6, 14))
+    return f"{' '.join(words).capitalize()} #{index}"
+
+
+def type_weights() -> Dict[str, float]:
+    """The share of the greetings of every greeting type, by database value."""
+    from app.routers.greeting_types import GreetingType
+
+    weights = {greeting_type.value: 1 / rank ** TYPE_SKEW for rank, greeting_type in enumerate(GreetingType, 1)}
+    total = sum(weights.values())
+    return {value: weight / total for value, weight in weights.items()}
+
+
+def generate_rows(count: int, first_index: int, years: float, seed: int) -> Iterator[Dict[str, Any]]:
+    """
+    Generates `count` greetings, as rows of the greetings table.
+
+    The created_at dates go back `years` years from now with a density growing linearly with time, so the last
+    month holds about twice the average share of greetings.
+
+    Args:
+        count(int): The number of greetings.
+        first_index(int): The index of the first message, indexes keep messages unique across calls.
+        years(float): How far back the created_at dates go.
+        seed(int): Seed of the random generator, the same seed and indexes give the same rows.
+    """
+    from app.database.ingest import hash_message
+
+    rng = random.Random(f"{seed}-{first_index}")
+    weights = type_weights()
+    types, cumulative = list(weights), []
+    running = 0.0
+    for weight in weights.values():
+        running += weight
+        cumulative.append(running)
+
+    now = datetime.now().replace(microsecond=0)
+    span = timedelta(days=365 * years)
+    for index in range(first_index, first_index + count):
+        message = make_message(rng, index)
+        # Inverse of the CDF t² of a density growing linearly from the oldest greeting to now.
+        created_at = now - span * (1 - rng.random() ** 0.5)
+        yield {"message": message, "type": rng.choices(types, cum_weights=cumulative)[0],
+               "created_at": created_at.replace(microsecond=0), "message_hash": hash_message(message)}
+
+
+async def fill(rows: int, batch_size: int = 10_000, years: float = 3, seed: int = 42) -> int:
+    """
+    Adds generated greetings to the greetings table until it holds `rows` greetings, then rebuilds greeting_stats.
+
+    Tables are created when missing, so an empty database can be used. Tables larger than `rows` are left as they
+    are, a benchmark over growing sizes calls this once per size.
+
+    Returns:
+        int: The number of greetings inserted.
+    """
+    from sqlalchemy import func, insert, select
+    from app.database.connection import AsyncSessionLocal, Base, engine
+    from app.database.stats import reconcile
+    from app.models.greeting import Greeting
+
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+
+    async with AsyncSessionLocal() as db:
+        existing = (await db.execute(select(func.count()).select_from(Greeting))).scalar_one()
+        last_id = (await db.execute(select(func.max(Greeting.greeting_id)))).scalar_one() or 0
+        missing = max(0, rows - existing)
+
+        batch: List[Dict[str, Any]] = []
+        for row in generate_rows(missing, last_id + 1, years, seed):
+            batch.append(row)
+            if len(batch) == batch_size:
+                await db.execute(insert(Greeting), batch)
+                await db.commit()
+                batch = []
+        if batch:
+            await db.execute(insert(Greeting), batch)
+            await db.commit()
+
+    if missing:
+        await reconcile()
+    return missing
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, required=True, help="Number of greetings the table should hold.")
+    parser.add_argument("--database-url", help="Defaults to the MAIN_DATABASE_URL setting.")
+    parser.add_argument("--batch-size", type=int, default=10_000, help="Rows per INSERT and transaction.")
+    parser.add_argument("--years", type=float, default=3, help="How far back the created_at dates go.")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ["MAIN_DATABASE_URL"] = args.database_url
+
+    started = time.perf_counter()
+    inserted = asyncio.run(fill(args.rows, args.batch_size, args.years, args.seed))
+    print(f"Inserted {inserted} greetings in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
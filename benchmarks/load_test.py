@@ -0,0 +1,280 @@
+"""
+Load tests every /v1/greetings endpoint and reports the p50, p95 and p99 latencies and the throughput as JSON.
+
+The app is started by benchmarks.server in a separate process, against a seeded local database and an in-process
+Redis stand-in, so the tests run offline. Requests are sent at a fixed rate, whether the previous ones have
+completed or not, in three modes:
+
+    cached:      the same requests again and again, after a warm-up request, so they are served by the cache.
+    uncached:    the same requests with 'Cache-Control: no-store', so every one of them reaches the database.
+    deep-offset: uncached requests for pages far from the first one.
+
+Run with: python -m benchmarks.load_test --rps 200 --duration 10 --output run.json
+Compare two runs with: python -m benchmarks.load_test compare before.json after.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import httpx
+from app.routers.greeting_types import GreetingType
+from benchmarks.data import WORDS
+
+MODES = ("cached", "uncached", "deep-offset")
+NO_STORE = {"Cache-Control": "no-store"}
+CATEGORIES = list(GreetingType.__members__)
+
+# Builds the path and query parameters of a request: (rng, mode, rows per type) -> (path, params).
+RequestFactory = Callable[[random.Random, str, int], Tuple[str, Dict[str, Any]]]
+
+
+def deep_offset(rng: random.Random, mode: str, total: int, limit: int) -> int:
+    """The offset of a page in the last tenth of `total` results in deep-offset mode, 0 otherwise."""
+    if mode != "deep-offset" or total <= limit:
+        return 0
+    return rng.randint(int(total * 0.9), total - limit)
+
+
+def greetings_page(rng, mode, rows):
+    return "/v1/greetings/", {"category": rng.choice(CATEGORIES), "limit": 10,
+                              "offset": deep_offset(rng, mode, rows, 10)}
+
+
+def random_greeting(rng, mode, rows):
+    return "/v1/greetings/random", {"category": rng.choice(CATEGORIES)}
+
+
+def random_batch(rng, mode, rows):
+    return "/v1/greetings/random/batch", {"category": rng.sample(CATEGORIES, 3), "count": 5}
+
+
+def greeting_types(rng, mode, rows):
+    return "/v1/greetings/types", {}
+
+
+def greeting_stats(rng, mode, rows):
+    return "/v1/greetings/stats", {}
+
+
+def search(rng, mode, rows):
+    # Seeded messages have about a third of the words, a quarter of the greetings is a safe bound of the matches.
+    return "/v1/greetings/search", {"query": rng.choice(WORDS), "limit": 10,
+                                    "offset": deep_offset(rng, mode, rows * len(CATEGORIES) // 4, 10)}
+
+
+def suggest(rng, mode, rows):
+    word = rng.choice(WORDS)
+    return "/v1/greetings/suggest", {"q": word[:rng.randint(2, len(word))]}
+
+
+def export(rng, mode, rows):
+    return "/v1/greetings/export", {"category": rng.choice(CATEGORIES)}
+
+
+def recent_greetings(rng, mode, rows):
+    # About half of the seeded greetings are from the current month, a safe bound is 40% of them.
+    return "/v1/greetings/recent_greetings", {"limit": 10,
+                                              "offset": deep_offset(rng, mode, rows * len(CATEGORIES) * 2 // 5, 10)}
+
+
+# POST /bulk is left out, it writes to the database and invalidates the cache of the other endpoints.
+ENDPOINTS: Dict[str, RequestFactory] = {
+    "/": greetings_page,
+    "/random": random_greeting,
+    "/random/batch": random_batch,
+    "/types": greeting_types,
+    "/stats": greeting_stats,
+    "/search": search,
+    "/suggest": suggest,
+    "/export": export,
+    "/recent_greetings": recent_greetings,
+}
+# Endpoints taking an offset, the deep-offset mode would repeat the uncached one for the others.
+PAGED_ENDPOINTS = ("/", "/search", "/recent_greetings")
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of already sorted values."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+async def send(client: httpx.AsyncClient, path: str, params: Dict[str, Any], headers: Dict[str, str],
+               latencies: List[float], errors: List[int]) -> None:
+    start = time.perf_counter()
+    try:
+        response = await client.get(path, params=params, headers=headers)
+        await response.aread()
+    except httpx.HTTPError:
+        errors.append(0)
+        return
+    latencies.append(time.perf_counter() - start)
+    if response.status_code >= 400:
+        errors.append(response.status_code)
+
+
+async def run_scenario(client: httpx.AsyncClient, factory: RequestFactory, mode: str, rps: float, duration: float,
+                       rows: int, seed: int) -> Dict[str, Any]:
+    """
+    Sends `rps` requests a second for `duration` seconds and measures their latencies.
+
+    In cached mode the requests are drawn from a small set, each sent once beforehand to fill the cache.
+    """
+    rng = random.Random(seed)
+    headers = {} if mode == "cached" else NO_STORE
+    requests = [factory(rng, mode, rows) for _ in range(8)] if mode == "cached" else None
+    if requests:
+        await asyncio.gather(*(client.get(path, params=params) for path, params in requests))
+
+    latencies: List[float] = []
+    errors: List[int] = []
+    tasks = []
+    interval = 1 / rps
+    start = time.perf_counter()
+    for sent in range(int(rps * duration)):
+        delay = start + sent * interval - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        path, params = rng.choice(requests) if requests else factory(rng, mode, rows)
+        tasks.append(asyncio.create_task(send(client, path, params, headers, latencies, errors)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": len(tasks),
+        "errors": len(errors),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+    }
+
+
+def start_server(args: argparse.Namespace) -> subprocess.Popen:
+    command = [sys.executable, "-m", "benchmarks.server", "--host", "127.0.0.1", "--port", str(args.port),
+               "--rows-per-type", str(args.rows_per_type), "--seed", str(args.seed)]
+    if args.database_url:
+        command += ["--database-url", args.database_url]
+    return subprocess.Popen(command, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+async def wait_until_ready(client: httpx.AsyncClient, server: subprocess.Popen, timeout: float = 120) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"The benchmark server exited with code {server.returncode}.")
+        try:
+            response = await client.get("/v1/greetings/types", headers=NO_STORE)
+            if response.status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("The benchmark server did not start in time.")
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    endpoints = args.endpoints or list(ENDPOINTS)
+    modes = args.modes or list(MODES)
+    server = start_server(args)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", limits=limits,
+                                     timeout=args.timeout) as client:
+            await wait_until_ready(client, server)
+            results: Dict[str, Dict[str, Any]] = {}
+            for endpoint in endpoints:
+                results[endpoint] = {}
+                for mode in modes:
+                    if mode == "deep-offset" and endpoint not in PAGED_ENDPOINTS:
+                        continue
+                    results[endpoint][mode] = await run_scenario(client, ENDPOINTS[endpoint], mode, args.rps,
+                                                                 args.duration, args.rows_per_type, args.seed)
+                    print(f"{endpoint:<20} {mode:<12} {json.dumps(results[endpoint][mode])}", file=sys.stderr)
+    finally:
+        server.terminate()
+        server.wait()
+
+    return {
+        "config": {"rps": args.rps, "duration": args.duration, "concurrency": args.concurrency,
+                   "rows_per_type": args.rows_per_type, "database": args.database_url or "sqlite",
+                   "python": platform.python_version(), "machine": platform.machine()},
+        "results": results,
+    }
+
+
+def percent_change(before: float, after: float) -> float:
+    return (after - before) / before * 100 if before else 0.0
+
+
+def compare(before: Dict[str, Any], after: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    Lists the scenarios whose p99 latency grew, or whose throughput fell, by more than `threshold` percent between two
+    runs, and those with more errors.
+    """
+    regressions = []
+    for endpoint, modes in after["results"].items():
+        for mode, result in modes.items():
+            baseline = before["results"].get(endpoint, {}).get(mode)
+            if baseline is None:
+                continue
+            change = percent_change(baseline["p99_ms"], result["p99_ms"])
+            throughput_change = percent_change(baseline["throughput_rps"], result["throughput_rps"])
+            print(f"{endpoint:<20} {mode:<12} p99 {baseline['p99_ms']:>8.2f} -> {result['p99_ms']:>8.2f} ms "
+                  f"({change:+.1f}%)  throughput {baseline['throughput_rps']} -> {result['throughput_rps']} rps")
+            if change > threshold or -throughput_change > threshold or result["errors"] > baseline["errors"]:
+                regressions.append(f"{endpoint} {mode}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "compare":
+        parser = argparse.ArgumentParser(prog="benchmarks.load_test compare",
+                                         description="Compares two load test reports.")
+        parser.add_argument("before")
+        parser.add_argument("after")
+        parser.add_argument("--threshold", type=float, default=10,
+                            help="Percent of p99 growth, or of throughput loss, reported as a regression.")
+        args = parser.parse_args(argv[1:])
+        with open(args.before) as before, open(args.after) as after:
+            regressions = compare(json.load(before), json.load(after), args.threshold)
+        if regressions:
+            print(f"Regressions: {', '.join(regressions)}")
+            sys.exit(1)
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rps", type=float, default=100, help="Requests sent per second, per scenario.")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds each scenario runs for.")
+    parser.add_argument("--concurrency", type=int, default=100, help="Maximum number of open connections.")
+    parser.add_argument("--timeout", type=float, default=30, help="Seconds before a request is counted as failed.")
+    parser.add_argument("--endpoints", nargs="*", choices=list(ENDPOINTS), help="Defaults to every endpoint.")
+    parser.add_argument("--modes", nargs="*", choices=MODES, help="Defaults to every mode.")
+    parser.add_argument("--rows-per-type", type=int, default=2000)
+    parser.add_argument("--database-url", help="Defaults to a new SQLite database.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Writes the report to this file instead of the standard output.")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Times the query shapes of the greetings endpoints, with their EXPLAIN plans, as the greetings table grows.
+
+For every size, the table is topped up with generated greetings (see benchmarks.data), then every query is run a
+few times and its median, fastest and slowest times are reported with its plan and the tables it scans in full. The
+queries are the ones the endpoints run, built by the same functions, plus the extract() shape /recent_greetings used
+before it switched to a created_at range.
+
+Run with: python -m benchmarks.query_shapes --database-url mysql+aiomysql://... --output shapes.json
+The default sizes go from 10k to 10M greetings, pass --sizes 10000 100000 for a quick run on SQLite.
+
+Searches use MATCH ... AGAINST on MySQL only, other databases time the LIKE fallback of FullTextMatch instead.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+from benchmarks.data import fill
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000, 10_000_000)
+
+
+def query_shapes(greeting_type: str, total: int, deep_id: Optional[int], phrase: str, now: datetime) -> Dict:
+    """
+    The queries to time, by name.
+
+    Args:
+        greeting_type(str): The category used by the queries, the most common one.
+        total(int): The number of greetings of that category, the deep pages start at 90% of it.
+        deep_id(Optional[int]): The greeting_id at that depth, where the cursor of the deep page points.
+        phrase(str): The search phrase.
+        now(datetime): The time the recent queries are relative to.
+    """
+    from sqlalchemy import extract, func, select
+    from app.cache.greeting_pool import pool_query
+    from app.models.greeting import Greeting
+    from app.routers.config import GREETING_POOL_MAX_SIZE, SEARCH_IDS_MAX
+    from app.routers.greeting_routes import greetings_page_query, random_candidates_query, recent_conditions, \
+        recent_page_query
+    from app.search.backends import search_conditions, search_count_query, search_page_query, search_ids_query, \
+        greetings_by_id_query
+
+    deep_offset = total * 9 // 10
+    extract_conditions = [extract('month', Greeting.created_at) == now.month,
+                          extract('year', Greeting.created_at) == now.year]
+    shapes = {
+        "list, first page": greetings_page_query(greeting_type, 10),
+        "list, deep OFFSET": greetings_page_query(greeting_type, 10, deep_offset),
+        "random, full category load": random_candidates_query(greeting_type),
+        "random, pool load": pool_query(greeting_type, GREETING_POOL_MAX_SIZE),
+        "search, page": search_page_query(search_conditions(), phrase, 10),
+        "search, deep OFFSET": search_page_query(search_conditions(), phrase, 10, deep_offset),
+        "search, total": search_count_query(search_conditions(), phrase),
+        "search, cached ids": search_ids_query(search_conditions(), phrase, SEARCH_IDS_MAX + 1),
+        "search, page by primary key": greetings_by_id_query(list(range(deep_offset + 1, deep_offset + 11))),
+        "recent, extract() page": select(Greeting.message, Greeting.type, Greeting.created_at)
+        .filter(*extract_conditions).limit(10),
+        "recent, extract() total": select(func.count()).select_from(Greeting).filter(*extract_conditions),
+        "recent, created_at range page": recent_page_query(recent_conditions(now), 10),
+        "recent, created_at range total": select(func.count()).select_from(Greeting)
+        .filter(*recent_conditions(now)),
+    }
+    if deep_id is not None:
+        shapes["list, cursor at the same depth"] = greetings_page_query(greeting_type, 10, after=[deep_id])
+    return shapes
+
+
+async def time_query(db, query, repeat: int) -> Dict[str, Any]:
+    """Runs a query once to warm the caches of the database, then `repeat` times, fetching every row."""
+    from app.database.explain import explain_query, full_scans
+
+    plan = await explain_query(db, query)
+    rows = len((await db.execute(query)).all())
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        (await db.execute(query)).all()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {"median_ms": round(statistics.median(timings), 3), "min_ms": round(min(timings), 3),
+            "max_ms": round(max(timings), 3), "rows": rows, "full_scans": full_scans(plan), "plan": plan}
+
+
+async def measure(repeat: int, phrase: str) -> Dict[str, Dict[str, Any]]:
+    """Times every query shape against the current content of the greetings table."""
+    from sqlalchemy import func, select
+    from sqlalchemy.exc import SQLAlchemyError
+    from app.database.connection import AsyncSessionLocal
+    from app.models.greeting import Greeting
+
+    results = {}
+    async with AsyncSessionLocal() as db:
+        greeting_type, total = (await db.execute(
+            select(Greeting.type, func.count()).group_by(Greeting.type).order_by(func.count().desc()).limit(1))).one()
+        deep_id = (await db.execute(select(Greeting.greeting_id).filter(Greeting.type == greeting_type)
+                                    .order_by(Greeting.greeting_id).offset(total * 9 // 10).limit(1))).scalar()
+
+        for name, query in query_shapes(greeting_type, total, deep_id, phrase, datetime.now()).items():
+            try:
+                results[name] = await time_query(db, query, repeat)
+            except SQLAlchemyError as error:
+                await db.rollback()
+                results[name] = {"error": str(getattr(error, "orig", None) or error)}
+    return results
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    from app.database.connection import engine
+
+    report = []
+    try:
+        for size in sorted(args.sizes):
+            started = time.perf_counter()
+            inserted = await fill(size, args.batch_size, seed=args.seed)
+            fill_seconds = time.perf_counter() - started
+            queries = await measure(args.repeat, args.query)
+            report.append({"rows": size, "inserted": inserted, "fill_seconds": round(fill_seconds, 1),
+                           "queries": queries})
+            for name, result in queries.items():
+                summary = result.get("error") or f"{result['median_ms']:>10.3f} ms  {result['rows']:>8} rows" + \
+                    (f"  full scan of {', '.join(result['full_scans'])}" if result["full_scans"] else "")
+                print(f"{size:>10} {name:<32} {summary}", file=sys.stderr)
+    finally:
+        await engine.dispose()
+    return {"config": {"repeat": args.repeat, "query": args.query, "seed": args.seed}, "sizes": report}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="Numbers of greetings to measure at, the table only grows.")
+    parser.add_argument("--database-url", help="Defaults to a new SQLite database. Greetings already in the "
+                                               "database count towards the sizes.")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs of every query.")
+    parser.add_argument("--query", default="happy birthday", help="Search phrase.")
+    parser.add_argument("--batch-size", type=int, default=10_000, help="Rows per INSERT while filling the table.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Writes the report to this file instead of the standard output.")
+    args = parser.parse_args()
+
+    os.environ["MAIN_DATABASE_URL"] = args.database_url or \
+        f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(prefix='greetings-shapes-'), 'greetings.db')}"
+
+    report = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2, default=str)
+    else:
+        print(json.dumps(report, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
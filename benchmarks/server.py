@@ -0,0 +1,115 @@
+"""
+Runs the app for the load tests: against a local SQLite database seeded with greetings, with an in-process Redis
+stand-in (fakeredis), and with rate limits too high to be reached. Nothing outside this machine is needed.
+
+Run with: python -m benchmarks.server --port 8765 --rows-per-type 2000
+
+The environment is set up before the app is imported, since its settings are read at import time. Pass
+--database-url to run against another database, which is seeded only while its greetings table is empty.
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+from datetime import datetime, timedelta
+from benchmarks.data import make_message
+
+# Rate limit settings of the app, raised so that the load is never throttled.
+RATE_LIMIT_SETTINGS = ("DEFAULT_RATE_LIMIT", "RANDOM_RATE_LIMIT", "SEARCH_RATE_LIMIT", "EXPORT_RATE_LIMIT",
+                       "BULK_RATE_LIMIT", "SUGGEST_RATE_LIMIT")
+UNLIMITED = "1000000/second"
+
+
+def configure_environment(database_url: str) -> None:
+    """Points the app at the benchmark database, the Redis stand-in and unreachable rate limits."""
+    os.environ["MAIN_DATABASE_URL"] = database_url
+    os.environ["REDIS_URL"] = "redis://benchmark-stand-in"
+    os.environ["RATE_LIMIT_STORAGE_URI"] = "memory://"
+    for name in RATE_LIMIT_SETTINGS:
+        os.environ[name] = UNLIMITED
+    # The FULLTEXT index only exists on MySQL, elsewhere searches would scan every message.
+    if database_url.startswith("sqlite"):
+        os.environ.setdefault("SEARCH_BACKEND", "memory")
+
+
+def install_redis_stand_in() -> None:
+    """Makes every Redis client of the app, cache and cache versions included, talk to one in-process fakeredis."""
+    import fakeredis.aioredis
+    from redis import asyncio as aioredis
+
+    server = fakeredis.FakeServer()
+    aioredis.from_url = lambda url, **kwargs: fakeredis.aioredis.FakeRedis(server=server, **kwargs)
+
+
+async def seed(rows_per_type: int, seed_value: int) -> int:
+    """
+    Creates the tables and fills them with `rows_per_type` greetings of every type, unless greetings already exist.
+
+    Half of the greetings are created in the current month, so /recent_greetings has pages to serve, the others
+    over the past year.
+
+    Returns:
+        int: The number of greetings inserted.
+    """
+    from sqlalchemy import func, insert, select
+    from app.database.connection import AsyncSessionLocal, Base, engine
+    from app.database.ingest import hash_message
+    from app.database.stats import reconcile
+    from app.models.greeting import Greeting
+    from app.routers.greeting_types import GreetingType
+
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+
+    inserted = 0
+    async with AsyncSessionLocal() as db:
+        existing = await db.execute(select(func.count()).select_from(Greeting))
+        if existing.scalar_one() == 0:
+            rng = random.Random(seed_value)
+            now = datetime.now().replace(microsecond=0)
+            month_start = now.replace(day=1, hour=0, minute=0, second=0)
+            for greeting_type in GreetingType:
+                rows = []
+                for _ in range(rows_per_type):
+                    message = make_message(rng, inserted)
+                    if rng.random() < 0.5:
+                        created_at = month_start + (now - month_start) * rng.random()
+                    else:
+                        created_at = now - timedelta(days=rng.uniform(31, 365))
+                    rows.append({"message": message, "type": greeting_type.value, "created_at": created_at,
+                                 "message_hash": hash_message(message)})
+                    inserted += 1
+                await db.execute(insert(Greeting), rows)
+            await db.commit()
+
+    await reconcile()
+    # Connections opened here belong to this event loop, the server runs its own.
+    await engine.dispose()
+    return inserted
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--database-url", help="Defaults to a new SQLite database in a temporary directory.")
+    parser.add_argument("--rows-per-type", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42, help="Seed of the generated messages.")
+    args = parser.parse_args()
+
+    database_url = args.database_url or \
+        f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(prefix='greetings-bench-'), 'greetings.db')}"
+    configure_environment(database_url)
+    install_redis_stand_in()
+
+    inserted = asyncio.run(seed(args.rows_per_type, args.seed))
+    print(f"Seeded {inserted} greetings into {database_url}", flush=True)
+
+    import uvicorn
+    from app.main import app
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import asyncio
+from logging.config import fileConfig
+from alembic import context
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.database.connection import Base, DATABASE_URL
+# Imported so their tables are part of Base.metadata.
+from app.models import greeting, greeting_stats  # noqa: F401 pylint: disable=unused-import
+
+config = context.config
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+# Another database can be migrated with: alembic -x url=<database url> upgrade head
+database_url = context.get_x_argument(as_dictionary=True).get("url", DATABASE_URL)
+
+
+def run_migrations_offline() -> None:
+    context.configure(url=database_url, target_metadata=target_metadata, literal_binds=True,
+                      dialect_opts={"paramstyle": "named"})
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def do_run_migrations(connection: Connection) -> None:
+    context.configure(connection=connection, target_metadata=target_metadata)
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+async def run_migrations_online() -> None:
+    engine = create_async_engine(database_url)
+
+    async with engine.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+
+    await engine.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    asyncio.run(run_migrations_online())
@@ -0,0 +1,38 @@
+"""Initial schema, the greetings table as it exists in production
+
+Existing databases already have this table, mark them as migrated with:  alembic stamp 0001_initial
+
+Revision ID: 0001_initial
+Revises:
+Create Date: 2023-11-20 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+revision = '0001_initial'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'greetings',
+        sa.Column('greeting_id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('message', sa.Text().with_variant(mysql.TEXT(collation='utf8mb4_0900_ai_ci'), 'mysql')),
+        sa.Column('type', sa.VARCHAR(255)),
+        sa.Column('created_at', sa.TIMESTAMP()),
+        sa.Column('message_hash', sa.CHAR(64)),
+    )
+    op.create_index('ix_greetings_greeting_id', 'greetings', ['greeting_id'])
+    op.create_index('ix_greetings_type', 'greetings', ['type'])
+    op.create_index('ix_greetings_message_hash', 'greetings', ['message_hash'])
+
+    if op.get_bind().dialect.name == 'mysql':
+        op.execute("ALTER TABLE greetings ADD FULLTEXT(message)")
+
+
+def downgrade() -> None:
+    op.drop_table('greetings')
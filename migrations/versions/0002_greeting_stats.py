@@ -0,0 +1,30 @@
+"""Add the greeting_stats table
+
+The application fills it on startup when it is empty.
+
+Revision ID: 0002_greeting_stats
+Revises: 0001_initial
+Create Date: 2023-11-20 00:00:01
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0002_greeting_stats'
+down_revision = '0001_initial'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'greeting_stats',
+        sa.Column('type', sa.VARCHAR(255), primary_key=True),
+        sa.Column('month', sa.CHAR(7), primary_key=True),
+        sa.Column('total', sa.Integer(), nullable=False),
+        sa.Column('newest_created_at', sa.TIMESTAMP(), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('greeting_stats')
@@ -0,0 +1,29 @@
+"""Add the composite indexes used by the endpoint queries
+
+The list and /random queries (type = ?, ordered by greeting_id) are served by ix_greetings_type, as InnoDB appends
+the primary key to every secondary index, and search uses the FULLTEXT index. The recent greetings query needs its
+created_at range scan in (created_at, greeting_id) order, with or without a type.
+
+Run `python -m app.cli explain` to check the plans after upgrading.
+
+Revision ID: 0003_query_indexes
+Revises: 0002_greeting_stats
+Create Date: 2023-11-20 00:00:02
+
+"""
+from alembic import op
+
+revision = '0003_query_indexes'
+down_revision = '0002_greeting_stats'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_greetings_type_created_at_id', 'greetings', ['type', 'created_at', 'greeting_id'])
+    op.create_index('ix_greetings_created_at_id', 'greetings', ['created_at', 'greeting_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_greetings_created_at_id', table_name='greetings')
+    op.drop_index('ix_greetings_type_created_at_id', table_name='greetings')
@@ -0,0 +1,33 @@
+"""Make greetings.message_hash unique, for the deduplication of bulk loads
+
+On MySQL the hash (SHA-256 of the message) is filled in for the existing greetings first. Where several greetings
+share a message, only the oldest one keeps its hash, no greeting is deleted.
+
+Revision ID: 0004_unique_message_hash
+Revises: 0003_query_indexes
+Create Date: 2023-11-20 00:00:03
+
+"""
+from alembic import op
+
+revision = '0004_unique_message_hash'
+down_revision = '0003_query_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == 'mysql':
+        op.execute("UPDATE greetings SET message_hash = SHA2(message, 256) "
+                   "WHERE message_hash IS NULL AND message IS NOT NULL")
+        op.execute("UPDATE greetings g JOIN greetings older "
+                   "ON older.message_hash = g.message_hash AND older.greeting_id < g.greeting_id "
+                   "SET g.message_hash = NULL")
+
+    op.drop_index('ix_greetings_message_hash', table_name='greetings')
+    op.create_index('ix_greetings_message_hash', 'greetings', ['message_hash'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_greetings_message_hash', table_name='greetings')
+    op.create_index('ix_greetings_message_hash', 'greetings', ['message_hash'])
@@ -1,25 +1,54 @@
 import asyncio
+import os
 from typing import Generator
 import pytest
 import pytest_asyncio
 from decouple import config
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
 from fastapi_cache.backends.redis import RedisBackend
 from redis import asyncio as aioredis
 from slowapi import Limiter
 from slowapi.util import get_remote_address
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 from httpx import AsyncClient
 
+# Hermetic mode runs the suite without MySQL or Redis: on an in-memory SQLite database per test process, with an
+# in-memory cache and rate limiter. The settings of the app are read when it is imported, so they are set first.
+HERMETIC = config('TEST_HERMETIC', default=False, cast=bool)
+if HERMETIC:
+    os.environ["MAIN_DATABASE_URL"] = "sqlite+aiosqlite://"
+    os.environ["RATE_LIMIT_STORAGE_URI"] = "memory://"
+
 from app.models.greeting import Greeting
-from app.routers.greeting_routes import get_db
+from app.routers.greeting_routes import get_db, get_read_db
 from app.database.connection import Base
 from app.main import app, configure_routes, configure_middleware, configure_exception_handler
-
-DATABASE_URL = config('TEST_DATABASE_URL')
-engine = create_async_engine(DATABASE_URL, echo=True)
+from app.routers.config import limiter
+from app.metrics import instrument_engine
+
+if HERMETIC:
+    # One connection shared by every session, so they all see the same in-memory database.
+    DATABASE_URL = "sqlite+aiosqlite://"
+    engine = create_async_engine(DATABASE_URL, poolclass=StaticPool)
+
+    # pysqlite, under aiosqlite, defers BEGIN and breaks SAVEPOINT, transactions are started explicitly instead.
+    @event.listens_for(engine.sync_engine, "connect")
+    def disable_implicit_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine.sync_engine, "begin")
+    def begin_transaction(connection):
+        connection.exec_driver_sql("BEGIN")
+else:
+    DATABASE_URL = config('TEST_DATABASE_URL')
+    engine = create_async_engine(DATABASE_URL, echo=True)
+instrument_engine(engine)
 AsyncTestSessionLocal = sessionmaker(bind=engine,
                                      expire_on_commit=False,
                                      class_=AsyncSession,
@@ -29,6 +58,11 @@ AsyncTestSessionLocal = sessionmaker(bind=engine,
 
 @pytest_asyncio.fixture(scope="session", autouse=True)
 async def initialize_cache():
+    if HERMETIC:
+        FastAPICache.init(InMemoryBackend(), prefix="fastapi-cache")
+        yield
+        return
+
     redis_url = config('REDIS_URL')
     async with aioredis.from_url(redis_url) as redis:
         FastAPICache.init(RedisBackend(redis), prefix="fastapi-cache")
@@ -38,6 +72,8 @@ async def initialize_cache():
 # # Test client allows you to send http requests to your fastapi application to recieve responses.
 @pytest_asyncio.fixture(scope="function")
 async def async_client_with_rate_limiter():
+    # The buckets live in Redis, start every test with full ones.
+    limiter.reset()
     async with AsyncClient(app=app, base_url="http://testserver") as client:
         yield client
 
@@ -50,7 +86,7 @@ def create_test_limiter():
 @pytest_asyncio.fixture(scope="function")
 async def async_client_no_rate_limit():
     # Create a new FastAPI application instance for testing
-    test_app = FastAPI()
+    test_app = FastAPI(default_response_class=ORJSONResponse)
 
     # Apply configurations
     configure_routes(test_app)
@@ -59,12 +95,15 @@ async def async_client_no_rate_limit():
 
     overide_database_dependency(test_app)
 
-    # Disable or modify the rate limiter
+    # Disable or modify the rate limiter, the limits set on the endpoints themselves are checked by the app's limiter.
     test_app.state.limiter = create_test_limiter()
+    limiter.enabled = False
 
     async with AsyncClient(app=test_app, base_url="http://testserver") as client:
         yield client
 
+    limiter.enabled = True
+
 
 # This is our test database, the following function defines a context manager function, which manages the lifecycle
 # of our database session.
@@ -73,9 +112,39 @@ async def override_get_db():
         yield session
 
 
-# Responsible for creating all tables and dropping all tables
+# Read sessions never commit, in hermetic mode they join the transaction of the test without a savepoint, so a
+# request runs the same statements as on MySQL.
+async def override_get_read_db():
+    async with AsyncTestSessionLocal(join_transaction_mode="conditional_savepoint") as session:
+        yield session
+
+
+# In hermetic mode the tables are created once, every test then runs in a transaction that is rolled back.
+@pytest_asyncio.fixture(scope="session", autouse=True)
+async def create_tables():
+    if HERMETIC:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    yield
+
+
+# Responsible for creating all tables and dropping all tables. In hermetic mode, it gives the test a transaction
+# that every session joins through a savepoint, and rolls it back afterwards. On MySQL the tables are recreated
+# instead, as InnoDB FULLTEXT indexes only see committed rows.
 @pytest_asyncio.fixture()
 async def test_db():
+    await FastAPICache.clear()
+    if HERMETIC:
+        async with engine.connect() as conn:
+            transaction = await conn.begin()
+            AsyncTestSessionLocal.configure(bind=conn, join_transaction_mode="create_savepoint")
+            try:
+                yield
+            finally:
+                AsyncTestSessionLocal.configure(bind=engine, join_transaction_mode="conditional_savepoint")
+                await transaction.rollback()
+        return
+
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
     yield
@@ -89,12 +158,29 @@ def get_greetings(greeting_type, count):
     return [Greeting(message=f"Test Message {i}", type=greeting_type) for i in range(count)]
 
 
-# adds list of greetings to database one by one.
+# Writes of concurrent tasks share the connection of the test in hermetic mode, their savepoints must not interleave.
+fixture_write_lock = asyncio.Lock()
+
+
+# adds list of greetings to database in a single flush, batched into multi-row INSERTs where the database allows.
 async def add_greetings_to_db(greetings):
-    async with AsyncTestSessionLocal() as db:
-        async with db.begin():
-            for greeting in greetings:
-                db.add(greeting)
+    async with fixture_write_lock:
+        async with AsyncTestSessionLocal() as db:
+            async with db.begin():
+                db.add_all(greetings)
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "redis: needs a Redis server, skipped in hermetic mode")
+
+
+def pytest_collection_modifyitems(config, items):
+    if not HERMETIC:
+        return
+    skip_redis = pytest.mark.skip(reason="needs a Redis server, TEST_HERMETIC is set")
+    for item in items:
+        if item.get_closest_marker("redis"):
+            item.add_marker(skip_redis)
 
 
 @pytest.fixture(scope="session")
@@ -106,6 +192,7 @@ def event_loop() -> Generator:
 
 def overide_database_dependency(app):
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_read_db
 
 
 overide_database_dependency(app)
@@ -0,0 +1,144 @@
+import json
+import pytest
+import app.routers.greeting_routes as greeting_routes
+from sqlalchemy import select
+from tests.unit.conftest import add_greetings_to_db, test_db, async_client_no_rate_limit, AsyncTestSessionLocal
+from app.database.events import _subscribers, on_greetings_committed
+from app.database.ingest import BloomFilter, BulkIngester, hash_message, parse_rows
+from app.models.greeting import Greeting
+from app.models.greeting_stats import ALL_TIME, GreetingStats
+
+API_KEY = {"X-API-Key": "test-key"}
+
+
+@pytest.fixture
+def bulk_api_key(monkeypatch):
+    monkeypatch.setattr(greeting_routes, "BULK_API_KEY", "test-key")
+
+
+async def chunks_of(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+async def parse(data: bytes, data_format: str, chunk_size: int = 7) -> list:
+    return [row async for row in parse_rows(chunks_of(data, chunk_size), data_format)]
+
+
+# Added hashes are always found, others only at about the configured false positive rate.
+def test_bloom_filter():
+    bloom_filter = BloomFilter(capacity=1000, error_rate=0.01)
+    added = [hash_message(f"message {i}") for i in range(1000)]
+    for message_hash in added:
+        bloom_filter.add(message_hash)
+
+    assert all(message_hash in bloom_filter for message_hash in added)
+    false_positives = sum(hash_message(f"other {i}") in bloom_filter for i in range(10_000))
+    assert false_positives < 300
+
+
+# The Bloom filter is only allocated by the first load, workers that never ingest do not hold it.
+@pytest.mark.asyncio
+async def test_bloom_filter_is_created_on_first_ingest(test_db):
+    ingester = BulkIngester(batch_size=10)
+    assert ingester.bloom_filter is None
+
+    data = b'{"message": "Good morning sunshine", "type": "Morning_Romantic"}\n'
+    async with AsyncTestSessionLocal() as db:
+        report = await ingester.ingest(db, parse_rows(chunks_of(data, 7), "ndjson"))
+
+    assert report.inserted == 1
+    assert hash_message("Good morning sunshine") in ingester.bloom_filter
+
+
+# A message stored by another worker after the Bloom filter was filled is skipped by the unique index, and is not
+# counted as inserted, in the report, the stats or the changes.
+@pytest.mark.asyncio
+async def test_messages_stored_meanwhile_are_duplicates(test_db):
+    ingester = BulkIngester(batch_size=10)
+    data = b'{"message": "First load", "type": "Morning_Romantic"}\n'
+    async with AsyncTestSessionLocal() as db:
+        await ingester.ingest(db, parse_rows(chunks_of(data, 7), "ndjson"))
+    await add_greetings_to_db([Greeting(message="Stored meanwhile", type="morning-romantic",
+                                        message_hash=hash_message("Stored meanwhile"))])
+    committed = []
+    on_greetings_committed(committed.append)
+
+    data = b'{"message": "Stored meanwhile", "type": "Morning_Romantic"}\n' \
+           b'{"message": "Really new", "type": "Morning_Romantic"}\n'
+    try:
+        async with AsyncTestSessionLocal() as db:
+            report = await ingester.ingest(db, parse_rows(chunks_of(data, 7), "ndjson"))
+            total = (await db.execute(select(GreetingStats.total).filter(GreetingStats.type == "morning-romantic",
+                                                                         GreetingStats.month == ALL_TIME)))
+    finally:
+        _subscribers.remove(committed.append)
+
+    assert (report.inserted, report.duplicates) == (1, 1)
+    assert total.scalar_one() == 3
+    assert [message for changes in committed for _, _, message in changes.added] == ["Really new"]
+
+
+# Lines and multi-byte characters split across chunks are put back together.
+@pytest.mark.asyncio
+async def test_parse_ndjson():
+    data = '{"message": "Joyeux Noël", "type": "Christmas_General"}\n\nnot json\n[1]\n'.encode()
+
+    assert await parse(data, "ndjson") == [(1, {"message": "Joyeux Noël", "type": "Christmas_General"}),
+                                           (3, "invalid JSON"),
+                                           (4, "expected a JSON object")]
+
+
+# Quoted CSV fields may hold commas, quotes and line breaks.
+@pytest.mark.asyncio
+async def test_parse_csv():
+    data = b'message,type\r\n"Hello, ""dad""",Birthday_Dad\r\n"Line one\r\nline two",Birthday_Mom\r\nshort\r\n'
+
+    assert await parse(data, "csv") == [(2, {"message": 'Hello, "dad"', "type": "Birthday_Dad"}),
+                                        (3, {"message": "Line one\nline two", "type": "Birthday_Mom"}),
+                                        (5, "expected 2 fields, got 1")]
+
+
+@pytest.mark.asyncio
+async def test_bulk_requires_api_key(bulk_api_key, async_client_no_rate_limit):
+    request = await async_client_no_rate_limit.post('/v1/greetings/bulk', content=b'')
+
+    assert request.status_code == 403
+
+
+# Messages already stored, or repeated in the input, are skipped and invalid rows are reported.
+@pytest.mark.asyncio
+async def test_bulk_ndjson(test_db, bulk_api_key, async_client_no_rate_limit):
+    await add_greetings_to_db([Greeting(message="Already here", type="birthday-to-dad-messages",
+                                        message_hash=hash_message("Already here"))])
+
+    rows = [{"message": "Already here", "type": "Birthday_Dad"},
+            {"message": "Happy birthday dad", "type": "Birthday_Dad"},
+            {"message": "Happy birthday dad", "type": "Birthday_Dad"},
+            {"message": "Best dad ever", "type": "birthday-to-dad-messages", "created_at": "2023-11-05T10:00:00"},
+            {"message": "No type"}]
+    body = "\n".join(json.dumps(row) for row in rows).encode()
+
+    request = await async_client_no_rate_limit.post('/v1/greetings/bulk', content=body, headers=API_KEY)
+
+    assert request.status_code == 200
+    assert request.json() == {"received": 5, "inserted": 2, "duplicates": 2, "rejected": 1,
+                              "errors": ["line 5: missing type"]}
+
+    request = await async_client_no_rate_limit.get('/v1/greetings/?category=Birthday_Dad')
+    assert request.json()["total_greetings"] == 3
+
+
+@pytest.mark.asyncio
+async def test_bulk_csv(test_db, bulk_api_key, async_client_no_rate_limit):
+    body = b'message,type\n"Merry Christmas, everyone",Christmas_General\nHo ho ho,Christmas_General\n'
+
+    request = await async_client_no_rate_limit.post('/v1/greetings/bulk', content=body,
+                                                    headers={**API_KEY, "Content-Type": "text/csv"})
+
+    assert request.status_code == 200
+    assert request.json()["inserted"] == 2
+
+    request = await async_client_no_rate_limit.get('/v1/greetings/?category=Christmas_General')
+    assert {greeting["message"] for greeting in request.json()["greetings"]} == {"Merry Christmas, everyone",
+                                                                                 "Ho ho ho"}
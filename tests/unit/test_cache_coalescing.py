@@ -0,0 +1,110 @@
+import asyncio
+import json
+import pytest
+from fastapi_cache import FastAPICache
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from tests.unit.conftest import AsyncTestSessionLocal
+from app.cache.decorator import cache
+from app.cache.keys import request_key_builder
+
+calls = []
+sessions = []
+
+
+@cache(expire=60)
+async def slow_lookup(name: str):
+    calls.append(name)
+    await asyncio.sleep(0.1)
+    return {"name": name, "call": len(calls)}
+
+
+@cache(expire=60, stale_while_revalidate=30)
+async def revalidated_lookup(name: str):
+    calls.append(name)
+    return {"name": name, "call": len(calls)}
+
+
+@cache(expire=60)
+async def session_lookup(name: str, db: AsyncSession):
+    sessions.append(db)
+    await asyncio.sleep(0.1)
+    return {"name": name, "one": (await db.execute(text("SELECT 1"))).scalar_one()}
+
+
+# Concurrent misses for the same key run the computation once and share its result.
+@pytest.mark.asyncio
+async def test_concurrent_misses_are_coalesced():
+    calls.clear()
+    await FastAPICache.clear()
+
+    results = await asyncio.gather(*(slow_lookup(name="coalesced") for _ in range(10)))
+
+    assert calls == ["coalesced"]
+    assert all(result.body == results[0].body for result in results)
+
+
+# Different keys are not coalesced with each other.
+@pytest.mark.asyncio
+async def test_different_keys_are_computed_separately():
+    calls.clear()
+    await FastAPICache.clear()
+
+    await asyncio.gather(slow_lookup(name="first"), slow_lookup(name="second"))
+
+    assert sorted(calls) == ["first", "second"]
+
+
+# The encoded body is cached, hits are sent as they are.
+@pytest.mark.asyncio
+async def test_cached_body_is_sent_as_is():
+    calls.clear()
+    await FastAPICache.clear()
+
+    miss = await slow_lookup(name="encoded")
+    hit = await slow_lookup(name="encoded")
+
+    assert hit.body == miss.body
+    assert json.loads(hit.body) == {"name": "encoded", "call": 1}
+    assert hit.media_type == "application/json"
+    assert hit.headers["Cache-Control"].startswith("max-age=")
+
+
+# A stale value is served at once while a single background task refreshes it.
+@pytest.mark.redis
+@pytest.mark.asyncio
+async def test_stale_while_revalidate():
+    calls.clear()
+    await FastAPICache.clear()
+
+    first = await revalidated_lookup(name="stale")
+    key = await request_key_builder(revalidated_lookup, "", args=(), kwargs={"name": "stale"})
+    await FastAPICache.get_backend().redis.expire(key, 10)
+
+    stale = await revalidated_lookup(name="stale")
+    await asyncio.sleep(0.1)
+    refreshed = await revalidated_lookup(name="stale")
+
+    assert stale.body == first.body
+    assert json.loads(refreshed.body)["call"] == 2
+    assert len(calls) == 2
+
+
+# The shared computation of coalesced misses runs with its own session, not one closed with the first request.
+@pytest.mark.asyncio
+async def test_coalesced_misses_do_not_borrow_request_sessions():
+    sessions.clear()
+    await FastAPICache.clear()
+    first_db, second_db = AsyncTestSessionLocal(), AsyncTestSessionLocal()
+
+    first = asyncio.create_task(session_lookup(name="sessions", db=first_db))
+    second = asyncio.create_task(session_lookup(name="sessions", db=second_db))
+    await asyncio.sleep(0.05)
+    first.cancel()
+    await first_db.close()
+    result = await second
+    await second_db.close()
+
+    assert json.loads(result.body) == {"name": "sessions", "one": 1}
+    assert len(sessions) == 1
+    assert sessions[0] is not first_db and sessions[0] is not second_db
@@ -0,0 +1,47 @@
+import pytest
+from tests.unit.conftest import async_client_no_rate_limit, test_db, get_greetings, add_greetings_to_db
+from app.cache.versions import category_versions, GLOBAL_VERSION
+
+
+# Adding greetings of a category replaces the cached pages of that category.
+@pytest.mark.asyncio
+async def test_insert_invalidates_category(test_db, async_client_no_rate_limit):
+    await add_greetings_to_db(get_greetings("birthday-to-brother-messages", 2))
+
+    request = await async_client_no_rate_limit.get('/v1/greetings/?category=Birthday_Brother')
+    assert request.json()['total_greetings'] == 2
+
+    await add_greetings_to_db(get_greetings("birthday-to-brother-messages", 1))
+
+    request = await async_client_no_rate_limit.get('/v1/greetings/?category=Birthday_Brother')
+    assert request.json()['total_greetings'] == 3
+
+
+# Only the written category and the global version move, other categories keep their cached pages.
+@pytest.mark.asyncio
+async def test_insert_keeps_other_categories(test_db):
+    before = await category_versions.get(["birthday-to-brother-messages", "birthday-to-dad-messages",
+                                          GLOBAL_VERSION])
+
+    await add_greetings_to_db(get_greetings("birthday-to-brother-messages", 1))
+
+    after = await category_versions.get(["birthday-to-brother-messages", "birthday-to-dad-messages",
+                                         GLOBAL_VERSION])
+
+    assert after[0] == before[0] + 1
+    assert after[1] == before[1]
+    assert after[2] == before[2] + 1
+
+
+# The types endpoint follows the global version.
+@pytest.mark.asyncio
+async def test_insert_invalidates_types(test_db, async_client_no_rate_limit):
+    await add_greetings_to_db(get_greetings("morning-romantic", 1))
+
+    request = await async_client_no_rate_limit.get('/v1/greetings/types')
+    assert request.json()['types'] == ['Morning_Romantic']
+
+    await add_greetings_to_db(get_greetings("christmas-messages", 1))
+
+    request = await async_client_no_rate_limit.get('/v1/greetings/types')
+    assert request.json()['types'] == ['Christmas_General', 'Morning_Romantic']
@@ -0,0 +1,40 @@
+import pytest
+from sqlalchemy.dialects import mysql
+from tests.unit.conftest import AsyncTestSessionLocal, test_db
+from app.database.explain import Explain, explain_query, full_scans
+from app.routers.greeting_routes import greetings_page_query
+
+
+# The EXPLAIN prefix is put in front of the statement, with its parameters left bound.
+def test_explain_compiles_statement():
+    compiled = Explain(greetings_page_query("morning-romantic", 10)).compile(dialect=mysql.dialect())
+
+    assert str(compiled).startswith("EXPLAIN SELECT")
+    assert "morning-romantic" in compiled.params.values()
+
+
+# MySQL plans with access type ALL are full table scans, index lookups are not.
+def test_full_scans_mysql_plan():
+    plan = [{"table": "greetings", "type": "ALL", "key": None},
+            {"table": "greeting_stats", "type": "ref", "key": "PRIMARY"}]
+
+    assert full_scans(plan) == ["greetings"]
+
+
+# SQLite plans scan a table in full when the SCAN step names no index.
+def test_full_scans_sqlite_plan():
+    plan = [{"detail": "SCAN greetings"},
+            {"detail": "SCAN greetings USING COVERING INDEX ix_greetings_type_created_at_id"},
+            {"detail": "SEARCH greetings USING INDEX ix_greetings_type (type=?)"}]
+
+    assert full_scans(plan) == ["greetings"]
+
+
+# The listing of a category is served by an index.
+@pytest.mark.asyncio
+async def test_list_query_uses_index(test_db):
+    async with AsyncTestSessionLocal() as db:
+        plan = await explain_query(db, greetings_page_query("morning-romantic", 10))
+
+    assert plan
+    assert full_scans(plan) == []
@@ -0,0 +1,39 @@
+import json
+import pytest
+import app.routers.greeting_routes as greeting_routes
+from tests.unit.conftest import add_greetings_to_db, test_db, async_client_no_rate_limit, get_greetings
+
+
+# Every greeting is exported once, in greeting_id order, across several cursor batches.
+@pytest.mark.asyncio
+async def test_export_all(test_db, async_client_no_rate_limit, monkeypatch):
+    monkeypatch.setattr(greeting_routes, "EXPORT_YIELD_PER", 2)
+    await add_greetings_to_db(get_greetings("birthday-to-dad-messages", 3))
+    await add_greetings_to_db(get_greetings("christmas-messages", 2))
+
+    request = await async_client_no_rate_limit.get('/v1/greetings/export')
+    lines = [json.loads(line) for line in request.text.splitlines()]
+
+    assert request.status_code == 200
+    assert request.headers["content-type"] == "application/x-ndjson"
+    assert len(lines) == 5
+    assert [line["greeting_id"] for line in lines] == sorted(line["greeting_id"] for line in lines)
+    assert set(lines[0]) == {"greeting_id", "message", "type", "created_at"}
+
+
+@pytest.mark.asyncio
+async def test_export_category(test_db, async_client_no_rate_limit):
+    await add_greetings_to_db(get_greetings("birthday-to-dad-messages", 3))
+    await add_greetings_to_db(get_greetings("christmas-messages", 2))
+
+    request = await async_client_no_rate_limit.get('/v1/greetings/export?category=Christmas_General')
+    lines = [json.loads(line) for line in request.text.splitlines()]
+
+    assert [line["type"] for line in lines] == ["christmas-messages", "christmas-messages"]
+
+
+@pytest.mark.asyncio
+async def test_export_invalid_category(async_client_no_rate_limit):
+    request = await async_client_no_rate_limit.get('/v1/greetings/export?category=hello')
+
+    assert request.status_code == 404
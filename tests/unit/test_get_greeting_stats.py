@@ -0,0 +1,193 @@
+import pytest
+from datetime import datetime
+from sqlalchemy import delete, select
+from sqlalchemy.dialects import mysql
+from sqlalchemy.orm import load_only
+from tests.unit.conftest import async_client_no_rate_limit, test_db, get_greetings, add_greetings_to_db, \
+    AsyncTestSessionLocal
+from app.cache.versions import category_versions
+from app.models.greeting import Greeting
+from app.database.stats import reconcile_greeting_stats, upsert_greeting_stats, StatsReconciler
+from app.models.greeting_stats import GreetingStats
+
+
+def generate_greetings(greeting_type, date, count):
+    return [Greeting(message=f"Test Message {i}", type=greeting_type, created_at=date) for i in range(count)]
+
+
+def category_stats(response, category):
+    return next(stats for stats in response['categories'] if stats['category'] == category)
+
+
+# Test for happy path, the stats follow the greetings added through the ORM.
+@pytest.mark.asyncio
+async def test_get_stats(test_db, async_client_no_rate_limit):
+    await add_greetings_to_db(generate_greetings("morning-romantic", datetime(2023, 11, 5).isoformat(), 2))
+    await add_greetings_to_db(generate_greetings("morning-romantic", datetime(2023, 12, 1).isoformat(), 1))
+    await add_greetings_to_db(get_greetings("christmas-messages", 4))
+
+    request = await async_client_no_rate_limit.get('/v1/greetings/stats')
+    response = request.json()
+
+    morning = category_stats(response, 'Morning_Romantic')
+    christmas = category_stats(response, 'Christmas_General')
+
+    assert request.status_code == 200
+    assert response['total_greetings'] == 7
+    assert morning['total_greetings'] == 3
+    assert morning['monthly_greetings'] == {'2023-11': 2, '2023-12': 1}
+    assert morning['newest_created_at'].startswith('2023-12-01')
+    assert christmas['total_greetings'] == 4
+    assert christmas['monthly_greetings'] == {}
+
+
+# Test that deleting greetings through the ORM lowers the counts used for pagination.
+@pytest.mark.asyncio
+async def test_stats_follow_deletes(test_db, async_client_no_rate_limit):
+    await add_greetings_to_db(get_greetings("birthday-to-brother-messages", 15))
+
+    async with AsyncTestSessionLocal() as db:
+        async with db.begin():
+            greetings = (await db.execute(select(Greeting).limit(5))).scalars().all()
+            for greeting in greetings:
+                await db.delete(greeting)
+
+    request = await async_client_no_rate_limit.get('/v1/greetings/?category=Birthday_Brother&limit=5')
+    response = request.json()
+
+    assert request.status_code == 200
+    assert response['total_greetings'] == 10
+    assert response['total_pages'] == 2
+
+
+# Test that the reconcile job repairs counts after greetings were removed behind the ORM's back.
+@pytest.mark.asyncio
+async def test_reconcile_stats(test_db, async_client_no_rate_limit):
+    await add_greetings_to_db(get_greetings("birthday-to-dad-messages", 6))
+
+    async with AsyncTestSessionLocal() as db:
+        async with db.begin():
+            await db.execute(delete(Greeting).where(Greeting.message == "Test Message 0"))
+
+    async with AsyncTestSessionLocal() as db:
+        await reconcile_greeting_stats(db)
+
+    request = await async_client_no_rate_limit.get('/v1/greetings/stats')
+    response = request.json()
+
+    assert request.status_code == 200
+    assert category_stats(response, 'Birthday_Dad')['total_greetings'] == 5
+
+
+# A count is written by a single upsert, so two writers creating the same row at once can not collide.
+def test_stats_rows_are_upserted():
+    statement = upsert_greeting_stats("mysql", lambda _: {"total": GreetingStats.total + 2}) \
+        .values(type="morning-romantic", month="all", total=2, newest_created_at=None)
+
+    assert str(statement.compile(dialect=mysql.dialect())).endswith(
+        "ON DUPLICATE KEY UPDATE total = (greeting_stats.total + %s)")
+
+
+# Greetings of a new month added in separate transactions add up in the same row.
+@pytest.mark.asyncio
+async def test_stats_of_a_new_month_add_up(test_db, async_client_no_rate_limit):
+    date = datetime(2021, 3, 4)
+    await add_greetings_to_db(generate_greetings("morning-romantic", date, 2))
+    await add_greetings_to_db(generate_greetings("morning-romantic", date, 3))
+
+    async with AsyncTestSessionLocal() as db:
+        total = (await db.execute(select(GreetingStats.total).filter(GreetingStats.type == "morning-romantic",
+                                                                     GreetingStats.month == "2021-03"))).scalar_one()
+    assert total == 5
+
+
+# Moving a greeting whose type and created_at were never loaded takes it off the counts of its old type and month.
+@pytest.mark.asyncio
+async def test_moving_unloaded_greetings_updates_both_rows(test_db):
+    await add_greetings_to_db(generate_greetings("morning-romantic", datetime(2021, 3, 4), 2))
+
+    async with AsyncTestSessionLocal() as db:
+        async with db.begin():
+            greeting = (await db.execute(select(Greeting).options(load_only(Greeting.greeting_id))
+                                         .filter(Greeting.message == "Test Message 0"))).scalar_one()
+            greeting.type = "birthday-to-dad-messages"
+            greeting.created_at = datetime(2022, 5, 6)
+
+    async with AsyncTestSessionLocal() as db:
+        totals = dict((await db.execute(select(GreetingStats.type + ":" + GreetingStats.month, GreetingStats.total)))
+                      .all())
+
+    assert totals["morning-romantic:all"] == 1
+    assert totals["morning-romantic:2021-03"] == 1
+    assert totals["birthday-to-dad-messages:all"] == 1
+    assert totals["birthday-to-dad-messages:2022-05"] == 1
+
+
+# Categories whose greetings are all gone are set to 0 by the reconcile job, the other rows are upserted in place.
+@pytest.mark.asyncio
+async def test_reconcile_zeroes_emptied_categories(test_db, async_client_no_rate_limit):
+    await add_greetings_to_db(get_greetings("birthday-to-dad-messages", 2))
+    await add_greetings_to_db(get_greetings("birthday-to-mom-messages", 3))
+
+    async with AsyncTestSessionLocal() as db:
+        async with db.begin():
+            await db.execute(delete(Greeting).where(Greeting.type == "birthday-to-dad-messages"))
+
+    async with AsyncTestSessionLocal() as db:
+        await reconcile_greeting_stats(db)
+
+    response = (await async_client_no_rate_limit.get('/v1/greetings/stats')).json()
+    assert category_stats(response, 'Birthday_Dad')['total_greetings'] == 0
+    assert category_stats(response, 'Birthday_Mom')['total_greetings'] == 3
+
+
+# The reconcile job bumps the cache versions of the types whose totals it changed, and only those, so cached totals
+# and ETags follow the repaired counts.
+@pytest.mark.asyncio
+async def test_reconcile_bumps_changed_categories(test_db):
+    await add_greetings_to_db(get_greetings("birthday-to-dad-messages", 2))
+    await add_greetings_to_db(get_greetings("birthday-to-mom-messages", 3))
+    async with AsyncTestSessionLocal() as db:
+        async with db.begin():
+            await db.execute(delete(Greeting).where(Greeting.message == "Test Message 0",
+                                                    Greeting.type == "birthday-to-dad-messages"))
+    await category_versions.flush()
+    categories = ["birthday-to-dad-messages", "birthday-to-mom-messages"]
+    before = await category_versions.get(categories)
+
+    async with AsyncTestSessionLocal() as db:
+        await reconcile_greeting_stats(db)
+    await category_versions.flush()
+    repaired = await category_versions.get(categories)
+    async with AsyncTestSessionLocal() as db:
+        await reconcile_greeting_stats(db)
+    await category_versions.flush()
+
+    assert repaired == [before[0] + 1, before[1]]
+    assert await category_versions.get(categories) == repaired
+
+
+class LockOnlyRedis:
+    """Stands in for Redis' SET NX, the only command the reconcile lock uses."""
+
+    def __init__(self):
+        self.keys = {}
+
+    async def set(self, key, value, nx=False, px=None):
+        if nx and key in self.keys:
+            return None
+        self.keys[key] = value
+        return True
+
+
+# Workers sharing the lock run the rebuild once per interval between them.
+@pytest.mark.asyncio
+async def test_reconcile_runs_in_one_worker(test_db):
+    redis = LockOnlyRedis()
+    workers = [StatsReconciler(interval=60, lock_key="test:reconcile-lock") for _ in range(3)]
+    for worker in workers:
+        worker.init(redis)
+
+    runs = [await worker.run_once(AsyncTestSessionLocal) for worker in workers]
+
+    assert runs == [True, False, False]
@@ -1,7 +1,8 @@
 import pytest
 import asyncio
 from tests.unit.conftest import add_greetings_to_db, test_db, get_greetings, async_client_no_rate_limit, \
-    async_client_with_rate_limiter
+    async_client_with_rate_limiter, AsyncTestSessionLocal
+from app.cache.greeting_pool import GreetingPool, greeting_pool
 
 
 # This test checks that a random message is selected and returned sucessfully
@@ -50,3 +51,63 @@ async def test_no_greeting_type_provided(test_db, async_client_no_rate_limit):
 
     assert request.status_code == 422
     assert response['detail'][0]['type'] == 'missing'
+
+
+# This test checks that once the pool is loaded, greetings are served from it instead of the database
+@pytest.mark.asyncio
+async def test_get_random_greeting_from_pool(test_db, async_client_no_rate_limit):
+    greetings = get_greetings("morning-romantic", 3)
+    await add_greetings_to_db(greetings)
+
+    pool = GreetingPool(max_size=2)
+    await pool.load(AsyncTestSessionLocal)
+
+    assert pool.loaded
+    assert pool.choice("morning-romantic") in {'Test Message 1', 'Test Message 2'}
+    assert pool.choice("birthday-to-dad-messages") is None
+
+    greeting_pool.clear()
+    await greeting_pool.load(AsyncTestSessionLocal)
+    try:
+        request = await async_client_no_rate_limit.get('/v1/greetings/random?category=Morning_Romantic')
+        response = request.json()
+
+        assert request.status_code == 200
+        assert response['greeting'][0]['message'] in {'Test Message 0', 'Test Message 1', 'Test Message 2'}
+
+        request = await async_client_no_rate_limit.get('/v1/greetings/random?category=Birthday_Dad')
+        assert request.status_code == 404
+    finally:
+        greeting_pool.clear()
+
+
+# The batch endpoint returns distinct greetings for every requested category, from the pool or the database.
+@pytest.mark.asyncio
+@pytest.mark.parametrize("from_pool", [False, True])
+async def test_get_random_greetings_batch(test_db, async_client_no_rate_limit, from_pool):
+    await add_greetings_to_db(get_greetings("morning-romantic", 4))
+    await add_greetings_to_db(get_greetings("birthday-to-dad-messages", 2))
+
+    if from_pool:
+        await greeting_pool.load(AsyncTestSessionLocal)
+    try:
+        request = await async_client_no_rate_limit.get(
+            '/v1/greetings/random/batch?category=Morning_Romantic&category=Birthday_Dad&category=Birthday_Mom&count=3')
+    finally:
+        greeting_pool.clear()
+    response = request.json()
+
+    morning = [greeting['message'] for greeting in response['greeting'] if greeting['type'] == "Morning_Romantic"]
+    dad = [greeting['message'] for greeting in response['greeting'] if greeting['type'] == "Birthday_Dad"]
+
+    assert request.status_code == 200
+    assert len(morning) == len(set(morning)) == 3
+    assert sorted(dad) == ['Test Message 0', 'Test Message 1']
+    assert len(response['greeting']) == 5
+
+
+@pytest.mark.asyncio
+async def test_get_random_greetings_batch_count_limit(async_client_no_rate_limit):
+    request = await async_client_no_rate_limit.get('/v1/greetings/random/batch?category=Morning_Romantic&count=1000')
+
+    assert request.status_code == 422
@@ -182,6 +182,46 @@ async def test_zero_limit_value(test_db,async_client_no_rate_limit):
     assert request.status_code == 422
     assert "Input should be greater than or equal to 1" in response["detail"][0]['msg']
 
+
+@pytest.mark.asyncio
+async def test_cursor_pagination_functionality(test_db, async_client_no_rate_limit):
+    date = datetime.now().isoformat()
+
+    greetings = generate_greetings('morning-romantic', date, 25)
+    await add_greetings_to_db(greetings)
+
+    request = await async_client_no_rate_limit.get("/v1/greetings/recent_greetings?limit=10")
+    response = request.json()
+    seen = len(response['greetings'])
+
+    while response['next_cursor']:
+        request = await async_client_no_rate_limit.get(
+            f"/v1/greetings/recent_greetings?limit=10&cursor={response['next_cursor']}")
+        response = request.json()
+
+        assert request.status_code == 200
+        seen += len(response['greetings'])
+
+    assert seen == 25
+    assert response['current_page'] == 3
+
+
+@pytest.mark.asyncio
+@freeze_time("2020-03-15")
+async def test_recent_greetings_newest_first(test_db, async_client_no_rate_limit):
+    await add_greetings_to_db(generate_greetings('morning-romantic', datetime(2020, 3, 1).isoformat(), 1))
+    await add_greetings_to_db(generate_greetings('morning-romantic', datetime(2020, 3, 31, 23, 59).isoformat(), 1))
+    await add_greetings_to_db(generate_greetings('morning-romantic', datetime(2020, 4, 1).isoformat(), 1))
+    await add_greetings_to_db(generate_greetings('morning-romantic', datetime(2020, 2, 29, 23, 59).isoformat(), 1))
+
+    request = await async_client_no_rate_limit.get("/v1/greetings/recent_greetings?category=Morning_Romantic")
+    response = request.json()
+
+    assert request.status_code == 200
+    assert response['total_greetings'] == 2
+    assert [greeting['created_at'][:10] for greeting in response['greetings']] == ['2020-03-31', '2020-03-01']
+
+
 # TODO ensure filters work together effectively. (Functional tests)
 # TODO ensure proper error handling is there for database connection issues.
 # TODO add documentation to tests.
@@ -2,6 +2,7 @@ import time
 import pytest
 from tests.unit.conftest import async_client_with_rate_limiter, test_db, get_greetings, add_greetings_to_db, \
     async_client_no_rate_limit
+from app.routers.greeting_routes import encode_cursor
 import asyncio
 
 
@@ -183,3 +184,42 @@ async def test_concurrent_request(test_db, async_client_no_rate_limit):
 
         assert requests.status_code == 200
         assert "Test" in response["greetings"][0]['message']
+
+
+@pytest.mark.asyncio
+async def test_cursor_pagination_get_greetings(test_db, async_client_no_rate_limit):
+    greetings = get_greetings("birthday-to-brother-messages", 5)
+    await add_greetings_to_db(greetings)
+
+    request = await async_client_no_rate_limit.get('/v1/greetings/?category=Birthday_Brother&limit=2')
+    response = request.json()
+    messages = [greeting['message'] for greeting in response['greetings']]
+
+    while response['next_cursor']:
+        request = await async_client_no_rate_limit.get(
+            f"/v1/greetings/?category=Birthday_Brother&limit=2&cursor={response['next_cursor']}")
+        response = request.json()
+
+        assert request.status_code == 200
+        messages += [greeting['message'] for greeting in response['greetings']]
+
+    assert response['current_page'] == 3
+    assert messages == [f"Test Message {i}" for i in range(5)]
+
+
+@pytest.mark.asyncio
+async def test_invalid_cursor_get_greetings(test_db, async_client_no_rate_limit):
+    request = await async_client_no_rate_limit.get('/v1/greetings/?category=Birthday_Brother&cursor=not-a-cursor')
+
+    assert request.status_code == 400
+    assert "cursor is invalid" in request.json()['detail']
+
+
+@pytest.mark.asyncio
+async def test_cursor_and_offset_get_greetings(test_db, async_client_no_rate_limit):
+    cursor = encode_cursor([1], 2)
+    request = await async_client_no_rate_limit.get(
+        f'/v1/greetings/?category=Birthday_Brother&offset=2&cursor={cursor}')
+
+    assert request.status_code == 400
+    assert "not both" in request.json()['detail']
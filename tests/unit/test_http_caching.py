@@ -0,0 +1,68 @@
+import pytest
+from fastapi_cache import FastAPICache
+from sqlalchemy import event
+from tests.unit.conftest import async_client_no_rate_limit, test_db, add_greetings_to_db, get_greetings, engine
+from app.routers.greeting_types import GreetingType
+
+
+# Responses carry an ETag, a Cache-Control with stale-while-revalidate and the Surrogate-Key of their category.
+@pytest.mark.asyncio
+async def test_cached_endpoints_send_http_caching_headers(test_db, async_client_no_rate_limit):
+    await add_greetings_to_db(get_greetings("birthday-to-brother-messages", 3))
+
+    request = await async_client_no_rate_limit.get('/v1/greetings/?category=Birthday_Brother')
+
+    assert request.status_code == 200
+    assert request.headers["ETag"].startswith('"')
+    assert "stale-while-revalidate=" in request.headers["Cache-Control"]
+    assert request.headers["Surrogate-Key"] == "greetings greetings:Birthday_Brother"
+
+
+# Responses covering every category can be purged by any of them.
+@pytest.mark.asyncio
+async def test_surrogate_keys_of_all_categories(test_db, async_client_no_rate_limit):
+    await add_greetings_to_db(get_greetings("birthday-to-brother-messages", 1))
+
+    request = await async_client_no_rate_limit.get('/v1/greetings/types')
+
+    keys = request.headers["Surrogate-Key"].split()
+    assert keys == ["greetings"] + [f"greetings:{name}" for name in GreetingType.__members__]
+
+
+# A matching If-None-Match is answered with a 304 without reading the database, even once the cache is emptied.
+@pytest.mark.asyncio
+async def test_not_modified_without_database_work(test_db, async_client_no_rate_limit):
+    await add_greetings_to_db(get_greetings("birthday-to-brother-messages", 3))
+    etag = (await async_client_no_rate_limit.get('/v1/greetings/?category=Birthday_Brother')).headers["ETag"]
+    await FastAPICache.clear()
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        request = await async_client_no_rate_limit.get('/v1/greetings/?category=Birthday_Brother',
+                                                       headers={"If-None-Match": f'W/{etag}, "other"'})
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+
+    assert request.status_code == 304
+    assert request.content == b""
+    assert request.headers["ETag"] == etag
+    assert statements == []
+
+
+# Writing greetings to the category changes the ETag, the old one gets the new page.
+@pytest.mark.asyncio
+async def test_write_changes_the_etag(test_db, async_client_no_rate_limit):
+    await add_greetings_to_db(get_greetings("birthday-to-brother-messages", 2))
+    etag = (await async_client_no_rate_limit.get('/v1/greetings/?category=Birthday_Brother')).headers["ETag"]
+
+    await add_greetings_to_db(get_greetings("birthday-to-brother-messages", 1))
+
+    request = await async_client_no_rate_limit.get('/v1/greetings/?category=Birthday_Brother',
+                                                   headers={"If-None-Match": etag})
+    assert request.status_code == 200
+    assert request.headers["ETag"] != etag
+    assert request.json()["total_greetings"] == 3
@@ -0,0 +1,95 @@
+import asyncio
+import signal
+import pytest
+import pytest_asyncio
+import uvicorn
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from tests.unit.conftest import async_client_no_rate_limit, async_client_with_rate_limiter, test_db, \
+    add_greetings_to_db, get_greetings
+from app.lifecycle import lifecycle, prime_cache, warm_pool
+from app.main import app
+from app.routers.greeting_types import GreetingType
+from app.server import Server
+
+
+# Puts the lifecycle back in its startup state after the test.
+@pytest_asyncio.fixture
+async def fresh_lifecycle():
+    yield lifecycle
+    lifecycle.ready = False
+    lifecycle.draining = False
+
+
+# A worker is not ready until its warm-up is over, and stops being ready once it drains.
+@pytest.mark.asyncio
+async def test_readiness_follows_the_lifecycle(fresh_lifecycle, async_client_no_rate_limit):
+    starting = await async_client_no_rate_limit.get("/healthz/ready")
+    lifecycle.ready = True
+    ready = await async_client_no_rate_limit.get("/healthz/ready")
+    lifecycle.start_draining()
+    draining = await async_client_no_rate_limit.get("/healthz/ready")
+
+    assert starting.status_code == 503 and starting.json()["status"] == "starting"
+    assert ready.status_code == 200
+    assert ready.json() == {"status": "ready", "checks": {"database": "ok", "redis": "not configured"}}
+    assert draining.status_code == 503 and draining.json()["status"] == "draining"
+
+
+# The shutdown signal flips readiness at once, the server keeps serving until the pre-stop delay is over.
+@pytest.mark.asyncio
+async def test_shutdown_signal_drains_before_exiting(fresh_lifecycle, async_client_no_rate_limit):
+    server = Server(uvicorn.Config(app), prestop=0.1)
+    lifecycle.ready = True
+
+    server.handle_exit(signal.SIGTERM, None)
+    draining = await async_client_no_rate_limit.get("/healthz/ready")
+
+    assert draining.status_code == 503 and draining.json()["status"] == "draining"
+    assert not server.should_exit
+
+    await asyncio.sleep(0.15)
+
+    assert server.should_exit
+
+
+# A second signal, or one arriving before the worker is ready, exits without waiting.
+@pytest.mark.asyncio
+async def test_shutdown_signal_exits_at_once_when_not_serving(fresh_lifecycle):
+    starting = Server(uvicorn.Config(app), prestop=5)
+    starting.handle_exit(signal.SIGTERM, None)
+
+    lifecycle.ready = True
+    serving = Server(uvicorn.Config(app), prestop=5)
+    serving.handle_exit(signal.SIGTERM, None)
+    serving.handle_exit(signal.SIGTERM, None)
+
+    assert starting.should_exit
+    assert serving.should_exit
+
+
+# The warmed connections are left open in the pool, no more than it keeps.
+@pytest.mark.asyncio
+async def test_warm_pool_fills_the_pool(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'warm.db'}", poolclass=AsyncAdaptedQueuePool,
+                                 pool_size=3)
+    try:
+        opened = await warm_pool(engine, 5)
+
+        assert opened == 3
+        assert engine.pool.checkedin() == 3
+    finally:
+        await engine.dispose()
+
+
+# /types and the first page of every category are cached, then served without querying the database.
+@pytest.mark.asyncio
+async def test_prime_cache_caches_first_pages(test_db, async_client_with_rate_limiter):
+    await add_greetings_to_db(get_greetings("birthday-to-brother-messages", 3))
+
+    primed = await prime_cache(app)
+    response = await async_client_with_rate_limiter.get("/v1/greetings/?category=Birthday_Brother")
+
+    assert primed == len(GreetingType) + 1
+    assert response.status_code == 200
+    assert 'desc="0 queries"' in response.headers["Server-Timing"]
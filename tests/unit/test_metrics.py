@@ -0,0 +1,85 @@
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from tests.unit.conftest import async_client_no_rate_limit, async_client_with_rate_limiter, test_db, \
+    add_greetings_to_db, get_greetings, engine
+from app.metrics import instrument_queries
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+# Requests are timed by route template, and the queries they run are counted by the function running them.
+@pytest.mark.asyncio
+async def test_requests_and_queries_are_recorded(test_db, async_client_no_rate_limit):
+    await add_greetings_to_db(get_greetings("birthday-to-brother-messages", 3))
+    route = "/v1/greetings/"
+    requests_before = sample("http_request_duration_seconds_count", method="GET", route=route, status="200")
+    queries_before = sample("db_queries_total", function="fetch_greetings")
+
+    response = await async_client_no_rate_limit.get("/v1/greetings/?category=Birthday_Brother")
+
+    assert response.status_code == 200
+    assert sample("http_request_duration_seconds_count", method="GET", route=route, status="200") == \
+           requests_before + 1
+    assert sample("db_queries_total", function="fetch_greetings") == queries_before + 1
+
+
+@instrument_queries
+async def failing_then_working_queries(connection):
+    with pytest.raises(DBAPIError):
+        await connection.execute(text("SELECT * FROM no_such_table"))
+    await connection.execute(text("SELECT 1"))
+
+
+# A statement that raises leaves no start time behind on the pooled connection, the next one is timed on its own.
+@pytest.mark.asyncio
+async def test_failed_queries_leave_no_timing_behind():
+    async with engine.connect() as connection:
+        await connection.execute(text("SELECT 1"))
+        queries_before = sample("db_queries_total", function="failing_then_working_queries")
+
+        await failing_then_working_queries(connection)
+
+        assert not connection.info.get("query_start")
+    assert sample("db_queries_total", function="failing_then_working_queries") == queries_before + 1
+
+
+# Cache lookups are counted as misses, then hits.
+@pytest.mark.asyncio
+async def test_cache_hits_and_misses_are_counted(test_db, async_client_no_rate_limit):
+    await add_greetings_to_db(get_greetings("birthday-to-brother-messages", 3))
+    misses_before = sample("cache_requests_total", function="get_greeting_types", result="miss")
+    hits_before = sample("cache_requests_total", function="get_greeting_types", result="hit")
+
+    for _ in range(3):
+        await async_client_no_rate_limit.get("/v1/greetings/types")
+
+    assert sample("cache_requests_total", function="get_greeting_types", result="miss") == misses_before + 1
+    assert sample("cache_requests_total", function="get_greeting_types", result="hit") == hits_before + 2
+
+
+# Requests refused by the rate limiter are counted by route, even though they never reach the router.
+@pytest.mark.asyncio
+async def test_rate_limit_rejections_are_counted(test_db, async_client_with_rate_limiter):
+    rejections_before = sample("rate_limit_rejections_total", route="/v1/greetings/types")
+
+    for _ in range(6):
+        await async_client_with_rate_limiter.get("/v1/greetings/types")
+
+    assert sample("rate_limit_rejections_total", route="/v1/greetings/types") == rejections_before + 1
+
+
+# The metrics are exposed in the Prometheus text format.
+@pytest.mark.asyncio
+async def test_metrics_endpoint(async_client_no_rate_limit):
+    await async_client_no_rate_limit.get("/v1/greetings/types")
+
+    response = await async_client_no_rate_limit.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "# TYPE http_request_duration_seconds histogram" in response.text
+    assert 'route="/v1/greetings/types"' in response.text
@@ -0,0 +1,54 @@
+import pytest
+from prometheus_client import REGISTRY
+from tests.unit.conftest import async_client_no_rate_limit, test_db, add_greetings_to_db, get_greetings
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+# A page past the last one is refused from the total, without running the page query, and the 404 is cached.
+@pytest.mark.asyncio
+async def test_page_past_the_last_one_is_not_queried(test_db, async_client_no_rate_limit):
+    await add_greetings_to_db(get_greetings("birthday-to-brother-messages", 3))
+    pages_before = sample("db_queries_total", function="fetch_greetings")
+    hits_before = sample("cache_requests_total", function="get_greetings", result="hit")
+
+    for _ in range(2):
+        request = await async_client_no_rate_limit.get('/v1/greetings/?category=Birthday_Brother&offset=30')
+        assert request.status_code == 404
+        assert "exceeds the total available pages" in request.json()['detail']
+
+    assert sample("db_queries_total", function="fetch_greetings") == pages_before
+    assert sample("cache_requests_total", function="get_greetings", result="hit") == hits_before + 1
+
+
+# Searches without results are answered from the cache while the 404 is cached.
+@pytest.mark.asyncio
+async def test_search_without_results_is_cached(test_db, async_client_no_rate_limit):
+    await add_greetings_to_db(get_greetings("birthday_love_message", 3))
+    hits_before = sample("cache_requests_total", function="get_greeting_by_search", result="hit")
+
+    first = await async_client_no_rate_limit.get('/v1/greetings/search?query=Nothing_matches')
+    second = await async_client_no_rate_limit.get('/v1/greetings/search?query=Nothing_matches')
+
+    assert first.status_code == second.status_code == 404
+    assert first.json() == second.json() == {"detail": "No greetings found match the search criteria."}
+    assert second.headers["Cache-Control"].startswith("max-age=")
+    assert sample("cache_requests_total", function="get_greeting_by_search", result="hit") == hits_before + 1
+
+
+# Cached 404s are keyed like the pages, so adding greetings to the category makes the page available at once.
+@pytest.mark.asyncio
+async def test_cached_404_is_replaced_by_a_write(test_db, async_client_no_rate_limit):
+    await add_greetings_to_db(get_greetings("birthday-to-dad-messages", 10))
+
+    request = await async_client_no_rate_limit.get('/v1/greetings/?category=Birthday_Dad&offset=10')
+    assert request.status_code == 404
+
+    await add_greetings_to_db(get_greetings("birthday-to-dad-messages", 5))
+
+    request = await async_client_no_rate_limit.get('/v1/greetings/?category=Birthday_Dad&offset=10')
+    assert request.status_code == 200
+    assert request.json()['total_greetings'] == 15
+    assert len(request.json()['greetings']) == 5
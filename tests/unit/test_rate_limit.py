@@ -0,0 +1,116 @@
+import socket
+import time
+import pytest
+from decouple import config
+from fastapi import FastAPI
+from httpx import AsyncClient
+from limits import parse
+from limits.storage import MemoryStorage, storage_from_string
+from redis.exceptions import ConnectionError as RedisConnectionError
+from slowapi.middleware import SlowAPIMiddleware
+from slowapi.util import get_remote_address
+from starlette.requests import Request
+from tests.unit.conftest import async_client_with_rate_limiter, test_db
+from app.rate_limit import MemoryTokenBucket, RedisTokenBucket, TokenBucketLimiter, TokenBucketRateLimiter
+from app.routers.config import limiter
+
+
+def redis_bucket(burst):
+    storage = storage_from_string(config('REDIS_URL'))
+    storage.reset()
+    return RedisTokenBucket(storage, lambda scope: burst)
+
+
+def memory_bucket(burst):
+    return MemoryTokenBucket(MemoryStorage(), lambda scope: burst)
+
+
+# A client may send a burst of requests at once, then one more per refilled token.
+@pytest.mark.parametrize("bucket_factory", [pytest.param(redis_bucket, marks=pytest.mark.redis), memory_bucket])
+def test_token_bucket_allows_bursts_then_refills(bucket_factory):
+    bucket = bucket_factory(3)
+    limit = parse("10/second")
+
+    assert [bucket.hit(limit, "client", "endpoint") for _ in range(4)] == [True, True, True, False]
+    assert bucket.hit(limit, "other-client", "endpoint")
+    assert bucket.get_window_stats(limit, "client", "endpoint").remaining == 0
+
+    time.sleep(0.15)
+
+    assert bucket.test(limit, "client", "endpoint")
+    assert bucket.hit(limit, "client", "endpoint")
+    assert not bucket.hit(limit, "client", "endpoint")
+
+
+# Without a burst, the bucket holds the amount of the limit.
+@pytest.mark.parametrize("bucket_factory", [pytest.param(redis_bucket, marks=pytest.mark.redis), memory_bucket])
+def test_token_bucket_defaults_to_the_limit_amount(bucket_factory):
+    bucket = bucket_factory(0)
+    limit = parse("2/minute")
+
+    assert [bucket.hit(limit, "client", "endpoint") for _ in range(3)] == [True, True, False]
+
+
+# Token buckets must say how they take their tokens.
+def test_token_bucket_storages_implement_take():
+    class NoTake(TokenBucketRateLimiter):
+        pass
+
+    with pytest.raises(TypeError):
+        NoTake(MemoryStorage(), lambda scope: 0)
+
+
+# Bursts are set per endpoint, the others get the default burst.
+def test_bursts_are_set_per_endpoint():
+    endpoint_limiter = TokenBucketLimiter(key_func=get_remote_address, default_burst=2)
+
+    @endpoint_limiter.limit("1/minute", burst=5)
+    async def limited(request: Request):
+        return None
+
+    assert endpoint_limiter.burst_for(f"{__name__}.limited") == 5
+    assert endpoint_limiter.burst_for("app.routers.greeting_routes.get_greeting_types") == 2
+
+
+# Requests are still limited, in process, while Redis is unreachable.
+@pytest.mark.asyncio
+async def test_falls_back_to_local_buckets(test_db, async_client_with_rate_limiter, monkeypatch):
+    def unreachable(*args, **kwargs):
+        raise RedisConnectionError("Redis is down")
+
+    monkeypatch.setattr(limiter, "_storage_dead", False)
+    monkeypatch.setattr(limiter._limiter, "hit", unreachable)
+    monkeypatch.setattr(limiter._storage, "check", lambda: False)
+
+    statuses = [(await async_client_with_rate_limiter.get('/v1/greetings/types')).status_code for _ in range(6)]
+
+    assert 429 not in statuses[:5]
+    assert statuses[5] == 429
+    assert limiter._storage_dead
+
+
+# A Redis that accepts connections but never answers costs each request the storage timeout, not a hung worker.
+@pytest.mark.asyncio
+async def test_falls_back_quickly_when_redis_hangs():
+    with socket.socket() as hung_redis:
+        hung_redis.bind(("127.0.0.1", 0))
+        hung_redis.listen()
+        host, port = hung_redis.getsockname()
+        hung_limiter = TokenBucketLimiter(key_func=get_remote_address, default_limits=["5/minute"],
+                                          storage_uri=f"redis://{host}:{port}", storage_timeout=0.2)
+        app = FastAPI()
+        app.state.limiter = hung_limiter
+        app.add_middleware(SlowAPIMiddleware)
+
+        @app.get("/limited")
+        async def limited():
+            return {}
+
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            start = time.perf_counter()
+            statuses = [(await client.get("/limited")).status_code for _ in range(6)]
+            elapsed = time.perf_counter() - start
+
+    assert statuses == [200] * 5 + [429]
+    assert hung_limiter._storage_dead
+    assert elapsed < 2
@@ -0,0 +1,51 @@
+import pytest
+import pytest_asyncio
+from sqlalchemy import text
+from tests.unit.conftest import AsyncTestSessionLocal, DATABASE_URL, engine
+from app.database.replicas import ReplicaSet
+
+
+# Two replicas pointing at the test database, with the test database as primary.
+@pytest_asyncio.fixture
+async def replica_set():
+    replicas = ReplicaSet([DATABASE_URL, DATABASE_URL], primary=AsyncTestSessionLocal)
+    yield replicas
+    await replicas.stop()
+
+
+# Reads go to the replicas in turn.
+@pytest.mark.asyncio
+async def test_replicas_are_used_round_robin(replica_set):
+    first, second = replica_set.replicas
+
+    assert [replica_set.choose() for _ in range(4)] == [first, second, first, second]
+
+    async with replica_set.session() as session:
+        assert session.bind is first.engine
+
+
+# A replica that is down is skipped, and reads go to the primary when every replica is down.
+@pytest.mark.asyncio
+async def test_down_replicas_are_skipped(replica_set):
+    first, second = replica_set.replicas
+
+    replica_set.mark_down(first)
+    assert [replica_set.choose() for _ in range(3)] == [second, second, second]
+
+    replica_set.mark_down(second)
+    assert replica_set.choose() is None
+    async with replica_set.session() as session:
+        assert session.bind is engine
+        assert (await session.execute(text("SELECT 1"))).scalar() == 1
+
+
+# The health check puts a replica back into the rotation once it answers.
+@pytest.mark.asyncio
+async def test_health_check_restores_replicas(replica_set):
+    for replica in replica_set.replicas:
+        replica_set.mark_down(replica)
+
+    await replica_set.check()
+
+    assert all(replica.healthy for replica in replica_set.replicas)
+    assert replica_set.choose() is not None
@@ -0,0 +1,171 @@
+from array import array
+import pytest
+import pytest_asyncio
+from sqlalchemy import delete, event
+from sqlalchemy.dialects import mysql, sqlite
+import app.search.backends as search_backends
+from tests.unit.conftest import AsyncTestSessionLocal, add_greetings_to_db, test_db, async_client_no_rate_limit, \
+    get_greetings, engine
+from app.models.greeting import Greeting
+from app.search.backends import MemorySearch, FullTextSearch, search_conditions, search_page_query, \
+    search_ids_query
+from app.search.bm25 import BM25Index
+from app.search.ranked import RankedIds
+
+
+# Replaces the configured backend with an in-memory index built from the test database.
+@pytest_asyncio.fixture
+async def memory_search(test_db, monkeypatch):
+    backend = MemorySearch(fallback=FullTextSearch())
+    monkeypatch.setattr(search_backends, "search_backend", backend)
+    await backend.load(AsyncTestSessionLocal)
+    yield backend
+
+
+# A message using the searched word more often, relative to its length, ranks first.
+def test_bm25_ranks_by_relevance():
+    index = BM25Index()
+    index.add(1, "morning-romantic", "Good morning my love, have a lovely day")
+    index.add(2, "morning-romantic", "Morning, morning, morning!")
+    index.add(3, "christmas-messages", "Merry Christmas")
+
+    assert index.search("morning") == [2, 1]
+    assert index.search("christmas morning") == [3, 2, 1]
+
+
+# Searches can be limited to one type, words shorter than three letters are not indexed.
+def test_bm25_filters_by_type():
+    index = BM25Index()
+    index.add(1, "morning-romantic", "Good morning to you")
+    index.add(2, "christmas-messages", "Good christmas to you")
+
+    assert index.search("good", "christmas-messages") == [2]
+    assert index.search("to") == []
+
+
+# Removed and updated greetings leave no trace in the index.
+def test_bm25_remove_and_update():
+    index = BM25Index()
+    index.add(1, "morning-romantic", "Good morning")
+    index.add(1, "morning-romantic", "Good night")
+    index.add(2, "morning-romantic", "Good morning")
+    index.remove(2)
+
+    assert index.search("morning") == []
+    assert index.search("night") == [1]
+    assert len(index) == 1
+
+
+# The endpoint is served from the index, greetings committed after it was built are found too.
+@pytest.mark.asyncio
+async def test_search_with_memory_backend(memory_search, async_client_no_rate_limit):
+    assert memory_search.loaded
+
+    await add_greetings_to_db(get_greetings("birthday-to-dad-messages", 3))
+    await add_greetings_to_db([Greeting(message="A Christmas wish", type="christmas-messages")])
+
+    request = await async_client_no_rate_limit.get('/v1/greetings/search?category=Birthday_Dad&query=Message')
+    response = request.json()
+
+    assert request.status_code == 200
+    assert response["total_greetings"] == 3
+    assert all(greeting["type"] == "birthday-to-dad-messages" for greeting in response["greetings"])
+
+    request = await async_client_no_rate_limit.get('/v1/greetings/search?query=christmas')
+    assert request.json()["greetings"] == [{"message": "A Christmas wish", "type": "christmas-messages"}]
+
+
+# The cursor continues after the last greeting of the previous page, in order of relevance.
+@pytest.mark.asyncio
+async def test_search_cursor_with_memory_backend(memory_search, async_client_no_rate_limit):
+    await add_greetings_to_db(get_greetings("birthday-to-dad-messages", 5))
+
+    first = (await async_client_no_rate_limit.get('/v1/greetings/search?query=Message&limit=3')).json()
+    second = (await async_client_no_rate_limit.get(
+        f'/v1/greetings/search?query=Message&limit=3&cursor={first["next_cursor"]}')).json()
+
+    messages = [greeting["message"] for greeting in first["greetings"] + second["greetings"]]
+    assert sorted(messages) == sorted(f"Test Message {i}" for i in range(5))
+    assert second["next_cursor"] is None
+
+
+# The search is a MATCH on the FULLTEXT index on MySQL, and a LIKE on databases without one.
+def test_full_text_match_compiles_per_dialect():
+    query = search_page_query(search_conditions("morning-romantic"), "good morning", 10)
+
+    assert "MATCH (greetings.message) AGAINST (%s IN NATURAL LANGUAGE MODE) AND" in \
+           str(query.compile(dialect=mysql.dialect()))
+    assert "lower(greetings.message) LIKE '%' || lower(?) || '%' AND" in str(query.compile(dialect=sqlite.dialect()))
+
+
+# Search results are ordered by relevance, the greeting_id only breaks ties.
+def test_search_page_is_ordered_by_relevance():
+    query = search_page_query(search_conditions(), "good morning", 10, 20)
+
+    assert "ORDER BY MATCH (greetings.message) AGAINST (%s IN NATURAL LANGUAGE MODE) DESC, greetings.greeting_id" \
+           in str(query.compile(dialect=mysql.dialect()))
+    assert query.compile(dialect=mysql.dialect()).params["query"] == "good morning"
+
+
+# The cached ids are selected with their score, in relevance order.
+def test_search_ids_are_ordered_by_relevance():
+    query = search_ids_query(search_conditions(), "good morning", 100)
+    sql = str(query.compile(dialect=mysql.dialect()))
+
+    assert "MATCH (greetings.message) AGAINST (%s IN NATURAL LANGUAGE MODE) AS score" in sql
+    assert "ORDER BY score DESC, greetings.greeting_id" in sql
+    assert query.compile(dialect=mysql.dialect()).params["query"] == "good morning"
+
+
+# Cached ids survive packing, pages are sliced by offset or cursor, and pages past the ids kept are not sliced.
+def test_ranked_ids_pages():
+    ranked = RankedIds.unpack(RankedIds(ids=array("I", [13, 5, 21, 3, 8]), total=7).pack())
+
+    assert ranked.total == 7
+    assert ranked.page(2, offset=1) == [5, 21]
+    assert ranked.page(2, after=[21]) == [3, 8]
+    assert ranked.page(2, offset=2, after=[4]) == [21, 3]
+    assert ranked.page(2, offset=4) is None
+    assert RankedIds(ids=array("I", [3, 5]), total=2).page(10, offset=2) == []
+
+
+# Greetings deleted since their ids were cached make the ids be computed again, so the page and the total agree.
+@pytest.mark.asyncio
+async def test_deleted_greetings_refresh_the_cached_ids(test_db):
+    await add_greetings_to_db(get_greetings("birthday-to-dad-messages", 12))
+    backend = FullTextSearch()
+    async with AsyncTestSessionLocal() as db:
+        first = await backend.search(db, "Message", None, 10)
+    async with AsyncTestSessionLocal() as db:
+        async with db.begin():
+            await db.execute(delete(Greeting).where(
+                Greeting.greeting_id.in_([greeting_id for _, _, greeting_id in first.greetings])))
+
+    async with AsyncTestSessionLocal() as db:
+        page = await backend.search(db, "Message", None, 10)
+
+    assert first.total == 12
+    assert (len(page.greetings), page.total) == (2, 2)
+
+
+# Paging through a search runs the full-text query once, the pages are loaded by primary key.
+@pytest.mark.asyncio
+async def test_search_pages_run_the_full_text_query_once(test_db, async_client_no_rate_limit):
+    await add_greetings_to_db(get_greetings("birthday-to-dad-messages", 25))
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        messages = []
+        for offset in (0, 10, 20):
+            request = await async_client_no_rate_limit.get(f'/v1/greetings/search?query=Message&offset={offset}')
+            assert request.json()["total_greetings"] == 25
+            messages += [greeting["message"] for greeting in request.json()["greetings"]]
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+
+    assert sorted(messages) == sorted(f"Test Message {i}" for i in range(25))
+    assert len([statement for statement in statements if "LIKE" in statement or "MATCH" in statement]) == 1
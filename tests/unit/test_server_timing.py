@@ -0,0 +1,60 @@
+import json
+import logging
+import re
+import pytest
+import app.timing as timing
+from tests.unit.conftest import async_client_no_rate_limit, test_db, add_greetings_to_db, get_greetings
+
+
+def server_timing(response):
+    """Parses a Server-Timing header into {name: (duration, description)}."""
+    entries = {}
+    for entry in response.headers["Server-Timing"].split(", "):
+        name, *params = entry.split(";")
+        values = dict(param.split("=", 1) for param in params)
+        entries[name] = (float(values["dur"]), values.get("desc", "").strip('"'))
+    return entries
+
+
+# Responses break their time down into db, cache and render, a cache hit runs no query.
+@pytest.mark.asyncio
+async def test_server_timing_header(test_db, async_client_no_rate_limit):
+    await add_greetings_to_db(get_greetings("birthday-to-brother-messages", 3))
+
+    miss = server_timing(await async_client_no_rate_limit.get("/v1/greetings/?category=Birthday_Brother"))
+    hit = server_timing(await async_client_no_rate_limit.get("/v1/greetings/?category=Birthday_Brother"))
+
+    assert set(miss) == {"db", "cache", "render", "total"}
+    assert miss["db"][0] > 0
+    assert re.fullmatch(r"[1-9]\d* queries", miss["db"][1])
+    assert miss["render"][0] > 0
+    assert hit["db"] == (0.0, "0 queries")
+    assert hit["cache"][0] > 0
+    assert hit["total"][0] >= hit["cache"][0]
+
+
+# Queries over the threshold are logged as JSON, with their SQL text and parameters.
+@pytest.mark.asyncio
+async def test_slow_queries_are_logged(test_db, async_client_no_rate_limit, monkeypatch, caplog):
+    await add_greetings_to_db(get_greetings("birthday-to-brother-messages", 3))
+    monkeypatch.setattr(timing, "SLOW_QUERY_SECONDS", 1e-9)
+
+    with caplog.at_level(logging.WARNING, logger="app.slow_queries"):
+        await async_client_no_rate_limit.get("/v1/greetings/?category=Birthday_Brother")
+
+    records = [json.loads(record.getMessage()) for record in caplog.records if record.name == "app.slow_queries"]
+    page_query = next(record for record in records if record["function"] == "fetch_greetings")
+    assert page_query["statement"].startswith("SELECT")
+    assert "birthday-to-brother-messages" in page_query["parameters"]
+    assert page_query["duration_ms"] >= 0
+
+
+# Fast queries are not logged.
+@pytest.mark.asyncio
+async def test_fast_queries_are_not_logged(test_db, async_client_no_rate_limit, monkeypatch, caplog):
+    monkeypatch.setattr(timing, "SLOW_QUERY_SECONDS", 60)
+
+    with caplog.at_level(logging.WARNING, logger="app.slow_queries"):
+        await async_client_no_rate_limit.get("/v1/greetings/?category=Birthday_Brother")
+
+    assert not [record for record in caplog.records if record.name == "app.slow_queries"]
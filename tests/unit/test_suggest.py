@@ -0,0 +1,115 @@
+import heapq
+import random
+import pytest
+import pytest_asyncio
+from tests.unit.conftest import AsyncTestSessionLocal, add_greetings_to_db, test_db, async_client_no_rate_limit
+from app.models.greeting import Greeting
+from app.search.suggest import SuggestionIndex, WordTrie, suggestions
+
+
+# Builds the suggestion index from the test database, and empties it again after the test.
+@pytest_asyncio.fixture
+async def loaded_suggestions(test_db):
+    await suggestions.load(AsyncTestSessionLocal)
+    yield suggestions
+    suggestions.clear()
+
+
+def build_index() -> SuggestionIndex:
+    index = SuggestionIndex()
+    index.add(1, "birthday-to-dad-messages", "Happy birthday dad")
+    index.add(2, "birthday-to-mom-messages", "Happy birthday mom, happy day")
+    index.add(3, "birthday-to-mom-messages", "Have a happy birth day")
+    index.add(4, "christmas-messages", "Merry Christmas and a happy new year")
+    return index
+
+
+def walk(trie: WordTrie):
+    """Yields every node of a trie with its prefix and the words below it, counted by walking the subtree."""
+    stack = [(trie.root, "")]
+    while stack:
+        node, prefix = stack.pop()
+        words, below = [], [(node, prefix)]
+        while below:
+            current, word = below.pop()
+            if current.count:
+                words.append((-current.count, word))
+            below.extend((child, word + char) for char, child in current.children.items())
+        yield node, prefix, heapq.nsmallest(trie.max_results, words)
+        stack.extend((child, prefix + char) for char, child in node.children.items())
+
+
+# The lists built by load, then updated word by word, stay those of a full walk, also when listed words drop out.
+def test_top_lists_follow_updates():
+    rng = random.Random(7)
+    words = ["".join(rng.choice("abc") for _ in range(rng.randint(1, 4))) for _ in range(40)]
+    trie = WordTrie(max_results=3)
+    for word in words:
+        trie.update(word, rng.randint(1, 5))
+    trie.build()
+
+    for _ in range(500):
+        trie.update(rng.choice(words), rng.choice([-3, -1, 1, 2]))
+        for node, prefix, expected in walk(trie):
+            assert node.top == expected, prefix
+
+
+# Completions are ordered by the number of greetings using them.
+def test_prefix_completions():
+    index = build_index()
+
+    assert index.suggest("ha") == ["happy", "have"]
+    assert index.suggest("bir") == ["birthday", "birth"]
+    assert index.suggest("xyz") == []
+
+
+# Completions only come from the greetings of the requested type.
+def test_completions_per_type():
+    index = build_index()
+
+    assert index.suggest("bir", "birthday-to-dad-messages") == ["birthday"]
+    assert index.suggest("mer", "birthday-to-dad-messages") == []
+    assert index.suggest("mer", "christmas-messages") == ["merry"]
+
+
+# A prefix with one typo still finds the word, exact completions are listed first.
+def test_typo_tolerance():
+    index = build_index()
+
+    assert index.suggest("brithday") == ["birthday"]
+    assert index.suggest("hapy") == ["happy"]
+    assert index.suggest("chirstmas") == ["christmas"]
+    assert index.suggest("bitrhday") == ["birthday"]
+    assert index.suggest("merr") == ["merry"]
+
+
+# Removed greetings no longer contribute words.
+def test_remove_greeting():
+    index = build_index()
+    index.remove(4)
+
+    assert index.suggest("mer") == []
+    assert index.suggest("hap", limit=1) == ["happy"]
+
+
+@pytest.mark.asyncio
+async def test_suggest_endpoint(loaded_suggestions, async_client_no_rate_limit):
+    await add_greetings_to_db([Greeting(message="Happy birthday to the best dad", type="birthday-to-dad-messages"),
+                               Greeting(message="Merry Christmas", type="christmas-messages")])
+
+    request = await async_client_no_rate_limit.get('/v1/greetings/suggest?q=happy bir')
+
+    assert request.status_code == 200
+    assert request.json() == {"query": "happy bir", "suggestions": ["happy birthday"]}
+
+    request = await async_client_no_rate_limit.get('/v1/greetings/suggest?q=mer&category=Birthday_Dad')
+    assert request.json()["suggestions"] == []
+
+
+@pytest.mark.asyncio
+async def test_suggest_before_index_is_built(async_client_no_rate_limit):
+    suggestions.clear()
+
+    request = await async_client_no_rate_limit.get('/v1/greetings/suggest?q=hap')
+
+    assert request.status_code == 503
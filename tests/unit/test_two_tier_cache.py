@@ -0,0 +1,66 @@
+import asyncio
+import pytest
+import pytest_asyncio
+from decouple import config
+from fastapi_cache.backends.redis import RedisBackend
+from redis import asyncio as aioredis
+from app.cache.backends import TwoTierBackend
+
+pytestmark = pytest.mark.redis
+
+
+@pytest_asyncio.fixture()
+async def redis_client():
+    async with aioredis.from_url(config('REDIS_URL')) as redis:
+        await redis.delete("two-tier:a", "two-tier:b", "two-tier:c")
+        yield redis
+
+
+# Once read, a value is served from worker memory without going back to Redis.
+@pytest.mark.asyncio
+async def test_hit_served_from_memory(redis_client):
+    backend = TwoTierBackend(RedisBackend(redis_client), channel="two-tier-test")
+
+    await backend.set("two-tier:a", "first", expire=60)
+    await redis_client.set("two-tier:a", "changed behind the cache")
+
+    ttl, value = await backend.get_with_ttl("two-tier:a")
+
+    assert value == "first"
+    assert 0 < ttl <= 60
+
+
+# The local layer keeps to its entry count and byte budget, dropping the least recently used keys first.
+@pytest.mark.asyncio
+async def test_lru_bounds(redis_client):
+    backend = TwoTierBackend(RedisBackend(redis_client), max_entries=2, max_bytes=10, channel="two-tier-test")
+
+    await backend.set("two-tier:a", "aaaa", expire=60)
+    await backend.set("two-tier:b", "bbbb", expire=60)
+    await backend.get("two-tier:a")
+    await backend.set("two-tier:c", "cccc", expire=60)
+
+    assert backend.local_size == (2, 8)
+    assert "two-tier:b" not in backend._entries
+
+    await backend.set("two-tier:c", "c" * 11, expire=60)
+    assert "two-tier:c" not in backend._entries
+
+
+# A write on one worker evicts the stale local copy held by another worker.
+@pytest.mark.asyncio
+async def test_invalidation_between_workers(redis_client):
+    first = TwoTierBackend(RedisBackend(redis_client), channel="two-tier-test")
+    second = TwoTierBackend(RedisBackend(redis_client), channel="two-tier-test")
+    second.start()
+    try:
+        await asyncio.sleep(0.1)
+        await first.set("two-tier:a", "old", expire=60)
+        assert await second.get("two-tier:a") == b"old"
+
+        await first.set("two-tier:a", "new", expire=60)
+        await asyncio.sleep(0.1)
+
+        assert await second.get("two-tier:a") == b"new"
+    finally:
+        await second.stop()